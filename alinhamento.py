@@ -0,0 +1,490 @@
+# alinhamento.py — Alinhamento forçado palavra a palavra (roteiro perfeito x palavras do Whisper)
+# Programação dinâmica em faixa (banded Needleman-Wunsch) vetorizada por linha com NumPy:
+# tempo O(n·W) e memória O(n·W) (linear no tamanho do roteiro para uma faixa W fixa).
+# Rodar `python alinhamento.py` executa o benchmark de precisão e tempo (10k palavras).
+import re
+import json
+import time
+import wave
+import base64
+import random
+import subprocess
+import unicodedata
+from io import BytesIO
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MATCH_SCORE = 2.0
+PARTIAL_SCORE = 1.0   # Mesmo radical (Whisper erra acentos/terminações)
+MISMATCH_SCORE = -1.0
+GAP_SCORE = -1.0
+NEG_INF = -1e18
+
+MAX_WORDS_PER_CUE = 4
+MIN_WORD_DUR = 0.08
+FALLBACK_WORD_DUR = 0.35
+CUE_HOLD_MAX = 0.5  # Mantém a legenda na tela até a próxima se a pausa for curta
+
+
+# =========================
+# Texto
+# =========================
+def normalize_token(word: str) -> str:
+    base = unicodedata.normalize("NFKD", word).encode("ascii", "ignore").decode().lower()
+    return re.sub(r"[^a-z0-9]+", "", base)
+
+
+def roteiro_words(full_roteiro_text: str) -> List[str]:
+    """Palavras do roteiro sem as marcações '--- BLOCO ---'."""
+    clean = re.sub(r'--- [A-ZÁÉÍÓÚÂÊÔÃÕÇ ]+ ---\n?', '', full_roteiro_text or "").strip()
+    return re.sub(r'\s+', ' ', clean).split()
+
+
+def words_from_segments(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Extrai palavras com tempo dos segmentos (word_timestamps=True); sem elas, divide o segmento por caracteres."""
+    out = []
+    for seg in segments or []:
+        ws = seg.get("words")
+        if ws:
+            for w in ws:
+                text = (w.get("word") or "").strip()
+                if text: out.append({"word": text, "start": float(w["start"]), "end": float(w["end"])})
+            continue
+        toks = (seg.get("text") or "").split()
+        if not toks: continue
+        s0, s1 = float(seg["start"]), float(seg["end"])
+        total = sum(len(t) for t in toks) or 1
+        t = s0
+        for tok in toks:
+            d = (s1 - s0) * len(tok) / total
+            out.append({"word": tok, "start": t, "end": t + d}); t += d
+    return out
+
+
+# =========================
+# Alinhamento em faixa
+# =========================
+def _token_ids(ref: List[str], hyp: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    vocab: Dict[str, int] = {}
+    stems: Dict[str, int] = {}
+    def ids(tokens):
+        a = np.empty(len(tokens), dtype=np.int64); b = np.empty(len(tokens), dtype=np.int64)
+        for i, t in enumerate(tokens):
+            a[i] = vocab.setdefault(t, len(vocab))
+            # Radical: 4 primeiras letras (palavras curtas não ganham crédito parcial)
+            b[i] = stems.setdefault(t[:4], len(stems)) if len(t) >= 4 else -1 - i
+        return a, b
+    r_id, r_st = ids(ref); h_id, h_st = ids(hyp)
+    return r_id, r_st, h_id, h_st
+
+
+def banded_align(ref: List[str], hyp: List[str], band: Optional[int] = None) -> List[Optional[int]]:
+    """
+    Alinha duas sequências de tokens normalizados. Retorna, para cada índice de `ref`,
+    o índice pareado em `hyp` (acerto ou substituição) ou None (palavra não reconhecida).
+    """
+    n, m = len(ref), len(hyp)
+    if n == 0: return []
+    if m == 0: return [None] * n
+    if band is None: band = max(50, min(400, int(0.03 * max(n, m))))
+    band = max(band, int(np.ceil(m / n)) + 2)  # a faixa precisa cobrir o salto da diagonal por linha
+    width = 2 * band + 1
+    r_id, r_st, h_id, h_st = _token_ids(ref, hyp)
+
+    centers = np.rint(np.arange(n + 1) * (m / n)).astype(np.int64)
+    js = centers - band                        # coluna absoluta do primeiro elemento da faixa
+    ptr = np.zeros((n + 1, width), dtype=np.int8)  # 0 = diagonal, 1 = cima, 2 = esquerda
+    k = np.arange(width)
+
+    cols = js[0] + k
+    prev = np.where((cols >= 0) & (cols <= m), cols * GAP_SCORE, NEG_INF)
+    ptr[0, :] = 2
+    for i in range(1, n + 1):
+        cols = js[i] + k
+        valid = (cols >= 0) & (cols <= m)
+        shift = js[i] - js[i - 1]
+        # Vizinhos na linha anterior: (i-1, j-1) e (i-1, j)
+        up_idx = k + shift; dg_idx = up_idx - 1
+        up = np.where((up_idx >= 0) & (up_idx < width), prev[np.clip(up_idx, 0, width - 1)], NEG_INF)
+        dg = np.where((dg_idx >= 0) & (dg_idx < width), prev[np.clip(dg_idx, 0, width - 1)], NEG_INF)
+        hj = np.clip(cols - 1, 0, m - 1)
+        sub = np.where(h_id[hj] == r_id[i - 1], MATCH_SCORE, np.where(h_st[hj] == r_st[i - 1], PARTIAL_SCORE, MISMATCH_SCORE))
+        dg = np.where(cols >= 1, dg + sub, NEG_INF)
+        up = up + GAP_SCORE
+        best = np.maximum(dg, up)
+        p = np.where(dg >= up, 0, 1).astype(np.int8)
+        best = np.where(valid, best, NEG_INF)
+        # Lacunas horizontais: H[k] = max(best[k], H[k-1] + gap) = k·g + cummax(best - k·g)
+        h = np.maximum.accumulate(best - k * GAP_SCORE) + k * GAP_SCORE
+        p = np.where(h > best + 1e-9, 2, p)
+        ptr[i] = p
+        prev = np.where(valid, h, NEG_INF)
+
+    out: List[Optional[int]] = [None] * n
+    i, j = n, m
+    while i > 0 or j > 0:
+        kk = j - js[i]
+        d = 2 if i == 0 else (ptr[i, kk] if 0 <= kk < width else 1)
+        if d == 0: out[i - 1] = j - 1; i -= 1; j -= 1
+        elif d == 1: i -= 1
+        else: j -= 1
+    return out
+
+
+# =========================
+# Tempos e SRT
+# =========================
+def _fill_gap(words: List[str], idxs: List[int], t0: float, t1: float, timings: List[List[float]]):
+    """Distribui palavras sem âncora entre t0 e t1 proporcionalmente ao número de caracteres."""
+    weights = [max(1, len(words[i])) for i in idxs]
+    total = float(sum(weights))
+    span = max(0.0, t1 - t0)
+    t = t0
+    for i, w in zip(idxs, weights):
+        d = span * w / total
+        timings[i] = [t, t + d]; t += d
+
+
+def align_word_timings(ref_words: List[str], hyp_words: List[Dict[str, Any]], band: Optional[int] = None,
+                       prior: Optional[List[Tuple[float, float]]] = None) -> List[Tuple[float, float]]:
+    """
+    Tempo (início, fim) de cada palavra do roteiro. Palavras pareadas herdam o tempo do Whisper;
+    as demais são interpoladas entre as âncoras vizinhas (ou usam `prior`, quando fornecido).
+    """
+    n = len(ref_words)
+    if n == 0: return []
+    ref_tok = [normalize_token(w) for w in ref_words]
+    hyp_tok = [normalize_token(w["word"]) for w in hyp_words]
+    pairs = banded_align(ref_tok, hyp_tok, band)
+
+    timings: List[Optional[List[float]]] = [None] * n
+    for i, j in enumerate(pairs):
+        if j is not None: timings[i] = [hyp_words[j]["start"], hyp_words[j]["end"]]
+
+    audio_start = hyp_words[0]["start"] if hyp_words else 0.0
+    audio_end = hyp_words[-1]["end"] if hyp_words else 0.0
+    i = 0
+    while i < n:
+        if timings[i] is not None: i += 1; continue
+        g0 = i
+        while i < n and timings[i] is None: i += 1
+        idxs = list(range(g0, i))
+        if prior is not None:
+            for x in idxs: timings[x] = list(prior[x])
+            continue
+        t0 = timings[g0 - 1][1] if g0 > 0 else audio_start
+        if i < n: t1 = timings[i][0]
+        else: t1 = max(audio_end, t0 + FALLBACK_WORD_DUR * len(idxs)) if g0 > 0 else audio_end
+        if t1 <= t0: t1 = t0 + MIN_WORD_DUR * len(idxs)
+        _fill_gap(ref_words, idxs, t0, t1, timings)
+
+    # Monotonicidade e duração mínima
+    last = 0.0
+    for t in timings:
+        t[0] = max(t[0], last)
+        t[1] = max(t[1], t[0] + MIN_WORD_DUR)
+        last = t[0]
+    return [(t[0], t[1]) for t in timings]
+
+
+def srt_timestamp(seconds: float) -> str:
+    ms = int(round(max(0.0, seconds) * 1000))
+    h, ms = divmod(ms, 3600000); m, ms = divmod(ms, 60000); s, ms = divmod(ms, 1000)
+    return f"{h:02}:{m:02}:{s:02},{ms:03}"
+
+
+def build_cues(words: List[str], timings: List[Tuple[float, float]], max_words: int = MAX_WORDS_PER_CUE) -> List[Dict[str, Any]]:
+    """Agrupa em blocos de até `max_words` palavras (quebra também no fim de frase)."""
+    cues, cur = [], []
+    for i, w in enumerate(words):
+        cur.append(i)
+        if len(cur) >= max_words or re.search(r"[.!?;:]$", w) or i == len(words) - 1:
+            cues.append({"start": timings[cur[0]][0], "end": timings[cur[-1]][1], "text": " ".join(words[x] for x in cur), "words": list(cur)})
+            cur = []
+    for a, b in zip(cues, cues[1:]):
+        if b["start"] > a["end"]: a["end"] = min(b["start"], a["end"] + CUE_HOLD_MAX)
+        else: a["end"] = max(a["start"] + MIN_WORD_DUR, min(a["end"], b["start"]))
+    return cues
+
+
+def cues_to_srt(cues: List[Dict[str, Any]]) -> str:
+    return "".join(f"{n}\n{srt_timestamp(c['start'])} --> {srt_timestamp(c['end'])}\n{c['text']}\n\n" for n, c in enumerate(cues, 1))
+
+
+def align_roteiro_to_segments(segments: List[Dict[str, Any]], full_roteiro_text: str, max_words: int = MAX_WORDS_PER_CUE) -> str:
+    """Roteiro perfeito + segmentos do Whisper -> SRT em blocos curtos."""
+    words = roteiro_words(full_roteiro_text)
+    hyp = words_from_segments(segments)
+    if not words or not hyp: return ""
+    return cues_to_srt(build_cues(words, align_word_timings(words, hyp), max_words))
+
+
+# =========================
+# Tempo sem Whisper: duração conhecida de cada bloco de áudio do job
+# =========================
+PAUSE_WEIGHTS = [(r"[.!?]+[\"'»)]*$", 2.0), (r"[;:]$", 1.5), (r"[,—–-]$", 1.0)]  # em "sílabas" de silêncio
+
+
+def count_syllables(word: str) -> int:
+    """Estimativa de sílabas em português: grupos de vogais (ditongos contam como um)."""
+    w = normalize_token(word)
+    if not w: return 0
+    if w.isdigit(): return 2 * len(w)  # números são lidos por extenso
+    return max(1, len(re.findall(r"[aeiouy]+", w)))
+
+
+def word_weights(words: List[str]) -> Tuple[List[float], List[float]]:
+    """Peso de fala (sílabas) e peso da pausa depois de cada palavra (pontuação)."""
+    speech, pause = [], []
+    for w in words:
+        speech.append(float(max(1, count_syllables(w))))
+        pause.append(next((wt for pat, wt in PAUSE_WEIGHTS if re.search(pat, w)), 0.0))
+    return speech, pause
+
+
+def distribute_words(words: List[str], t0: float, t1: float) -> List[Tuple[float, float]]:
+    """Distribui as palavras em [t0, t1] por sílabas, reservando tempo para as pausas de pontuação."""
+    if not words: return []
+    speech, pause = word_weights(words)
+    pause[-1] = 0.0  # a pausa final do bloco é o silêncio de fim do áudio
+    total = sum(speech) + sum(pause)
+    unit = max(0.0, t1 - t0) / total if total else 0.0
+    out, t = [], t0
+    for sp, pa in zip(speech, pause):
+        out.append((t, t + sp * unit)); t += (sp + pa) * unit
+    return out
+
+
+def timing_from_blocks(blocks: List[Dict[str, Any]], lead_in: float = 0.0) -> Tuple[List[str], List[Tuple[float, float]]]:
+    """
+    blocks: [{"text": ..., "duration": s, "words"?: [{"word", "start", "end"}]}, ...] na ordem em que foram
+    concatenados no vídeo. Retorna as palavras do roteiro e o tempo de cada uma (sem inferência de ASR):
+    exato quando o bloco traz "words", senão estimado por sílabas.
+    """
+    all_words, timings, offset = [], [], 0.0
+    for b in blocks:
+        dur = float(b.get("duration") or 0.0)
+        if b.get("words"):  # Tempos exatos registrados pelo TTS (tts_adapter): só desloca pelo início do bloco
+            all_words.extend(w["word"] for w in b["words"])
+            timings.extend((offset + w["start"], offset + w["end"]) for w in b["words"])
+            offset += dur; continue
+        words = re.sub(r"\s+", " ", b.get("text") or "").split()
+        if words and dur > 0:
+            all_words.extend(words)
+            timings.extend(distribute_words(words, offset + min(lead_in, dur / 4), offset + dur))
+        offset += dur
+    return all_words, timings
+
+
+SENTENCE_MAX_CHARS = 100  # Limite por requisição do gTTS: cada trecho vira exatamente uma síntese
+
+
+def split_sentences(text: str, max_chars: int = SENTENCE_MAX_CHARS) -> List[str]:
+    """Frases (fim em . ! ? ; :); as longas são quebradas na última vírgula ou espaço antes de `max_chars`."""
+    out = []
+    for sent in re.split(r"(?<=[.!?;:])\s+", re.sub(r"\s+", " ", text or "").strip()):
+        while len(sent) > max_chars:
+            comma = sent.rfind(", ", 0, max_chars) + 1
+            cut = comma if comma > max_chars // 3 else sent.rfind(" ", 0, max_chars)
+            if cut <= 0: cut = max_chars
+            out.append(sent[:cut].strip()); sent = sent[cut:].strip()
+        if sent: out.append(sent)
+    return out
+
+
+def blocks_to_srt(blocks: List[Dict[str, Any]], segments: Optional[List[Dict[str, Any]]] = None,
+                  max_words: int = MAX_WORDS_PER_CUE) -> str:
+    """SRT a partir das durações dos blocos; com `segments` do Whisper, refina as palavras reconhecidas."""
+    words, timings = timing_from_blocks(blocks)
+    if not words: return ""
+    if segments and not has_word_timings(blocks):
+        hyp = words_from_segments(segments)
+        if hyp: timings = align_word_timings(words, hyp, prior=timings)
+    return cues_to_srt(build_cues(words, timings, max_words))
+
+
+# =========================
+# Roteiro e blocos do job (payload do GAS)
+# =========================
+# Mesma ordem de concatenação da Montagem (blocos sem imagem ou sem áudio ficam fora do vídeo)
+BLOCK_ORDER = ["hook", "leitura", "reflexao", "aplicacao", "oracao"]
+
+
+def get_full_roteiro_text(roteiro_data: Dict[str, Any]) -> str:
+    """Extrai e formata o texto completo do roteiro JSON, ignorando marcações."""
+    if not roteiro_data or 'roteiro' not in roteiro_data:
+        return ""
+        
+    full_text = ""
+    roteiro = roteiro_data.get('roteiro', {})
+    
+    # Adiciona os blocos principais
+    if 'hook' in roteiro and 'text' in roteiro['hook']:
+        full_text += "--- HOOK ---\n" + roteiro['hook']['text'] + "\n\n"
+    if 'leitura' in roteiro and 'text' in roteiro['leitura']:
+        full_text += "--- LEITURA ---\n" + roteiro['leitura']['text'] + "\n\n"
+    if 'reflexao' in roteiro and 'text' in roteiro['reflexao']:
+        full_text += "--- REFLEXÃO ---\n" + roteiro['reflexao']['text'] + "\n\n"
+    if 'aplicacao' in roteiro and 'text' in roteiro['aplicacao']:
+        full_text += "--- APLICAÇÃO ---\n" + roteiro['aplicacao']['text'] + "\n\n"
+    if 'oracao' in roteiro and 'text' in roteiro['oracao']:
+        full_text += "--- ORAÇÃO ---\n" + roteiro['oracao']['text'] + "\n\n"
+    
+    return full_text.strip()
+
+
+_MP3_BITRATES = {1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],   # MPEG-1 Layer III
+                 2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]}       # MPEG-2/2.5 Layer III
+_MP3_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def mp3_duration(raw: bytes) -> float:
+    """Duração de um MP3 (Layer III) somando os quadros; 0.0 se não for MP3. Sem ffprobe e exata para VBR."""
+    pos, n, samples = 0, len(raw), 0
+    if raw[:3] == b"ID3" and n >= 10:
+        pos = 10 + ((raw[6] & 0x7F) << 21 | (raw[7] & 0x7F) << 14 | (raw[8] & 0x7F) << 7 | (raw[9] & 0x7F))
+    rate = 0
+    while pos + 4 <= n:
+        h = raw[pos:pos + 4]
+        if h[0] != 0xFF or (h[1] & 0xE0) != 0xE0 or (h[1] >> 1) & 3 != 1:  # sem sincronismo ou não é Layer III
+            pos += 1; continue
+        ver, br_i, sr_i = (h[1] >> 3) & 3, h[2] >> 4, (h[2] >> 2) & 3
+        if ver == 1 or br_i in (0, 15) or sr_i == 3:
+            pos += 1; continue
+        rate = _MP3_RATES[ver][sr_i]
+        bitrate = _MP3_BITRATES[1 if ver == 3 else 2][br_i] * 1000
+        per_frame = 1152 if ver == 3 else 576
+        size = (144 if ver == 3 else 72) * bitrate // rate + ((h[2] >> 1) & 1)
+        frame = raw[pos:pos + size]
+        if b"Xing" not in frame[:64] and b"Info" not in frame[:64]: samples += per_frame  # quadro de cabeçalho VBR não tem áudio
+        pos += size
+    return samples / rate if rate else 0.0
+
+
+def audio_duration_from_bytes(raw: bytes) -> float:
+    """Duração de um áudio em memória: cabeçalho WAV ou quadros MP3 direto, senão ffprobe via pipe."""
+    try:
+        with wave.open(BytesIO(raw)) as w: return w.getnframes() / float(w.getframerate())
+    except Exception: pass
+    dur = mp3_duration(raw)
+    if dur > 0: return dur
+    try:
+        r = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", "-i", "pipe:0"],
+                           input=raw, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+        return float(r.stdout.decode().strip())
+    except Exception: return 0.0
+
+
+def has_block_audio(roteiro_data: Optional[Dict[str, Any]]) -> bool:
+    return bool(roteiro_data) and any(a.get("type") == "audio" and a.get("data_b64") for a in roteiro_data.get("assets", []) or [])
+
+
+def has_tts_timings(roteiro_data: Optional[Dict[str, Any]]) -> bool:
+    """Cada áudio do job tem o asset de tempos por palavra (sem decodificar nada)."""
+    assets = (roteiro_data or {}).get("assets", []) or []
+    audio = {a.get("block_id") for a in assets if a.get("type") == "audio" and a.get("data_b64")}
+    return bool(audio) and audio <= {a.get("block_id") for a in assets if a.get("type") == "timings" and a.get("data_b64")}
+
+
+def has_word_timings(timeline: List[Dict[str, Any]]) -> bool:
+    """Todos os blocos com tempos por palavra do TTS: o Whisper não acrescenta nada."""
+    return bool(timeline) and all(b.get("words") for b in timeline)
+
+
+def parse_timings_asset(b64: str) -> Optional[List[Dict[str, Any]]]:
+    """data_b64 do asset "timings" (contrato em tts_adapter.timings_asset) -> palavras, ou None se fora do contrato."""
+    try:
+        words = json.loads(base64.b64decode(b64).decode("utf-8"))
+        out = [{"word": str(w["word"]), "start": float(w["start"]), "end": float(w["end"])} for w in words]
+    except Exception: return None
+    if not out or any(w["start"] < 0 or w["end"] < w["start"] for w in out): return None
+    if any(b["start"] < a["start"] for a, b in zip(out, out[1:])): return None
+    return out
+
+
+def get_job_block_timeline(roteiro_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Blocos na ordem do vídeo com texto e duração exata do áudio gerado (assets do job)."""
+    roteiro = roteiro_data.get("roteiro", {}) or {}
+    audios, images, words = {}, set(), {}
+    for a in roteiro_data.get("assets", []) or []:
+        bid, atype, b64 = a.get("block_id"), a.get("type"), a.get("data_b64")
+        if not bid or not b64: continue
+        if atype == "image": images.add(bid)
+        elif atype == "audio":
+            try: audios[bid] = audio_duration_from_bytes(base64.b64decode(b64))
+            except Exception: continue
+        elif atype == "timings":  # tts_adapter.timings_asset
+            parsed = parse_timings_asset(b64)
+            if parsed: words[bid] = parsed
+    timeline = []
+    for bid in BLOCK_ORDER:
+        if bid not in audios or (images and bid not in images): continue
+        block = {"id": bid, "text": (roteiro.get(bid) or {}).get("text", ""), "duration": audios[bid]}
+        if words.get(bid): block["words"] = words[bid]
+        timeline.append(block)
+    return timeline
+
+
+# =========================
+# Benchmark (precisão e tempo)
+# =========================
+def _proportional_baseline(segments, words, max_words=MAX_WORDS_PER_CUE):
+    """Heurística antiga (proporção de caracteres por segmento), para comparação."""
+    total_chars = sum(len(s["text"]) for s in segments) or 1
+    starts, idx = [], 0
+    for seg in segments:
+        cnt = max(1, round(len(seg["text"].strip()) / total_chars * len(words)))
+        chunk = list(range(idx, min(idx + cnt, len(words))))
+        if not chunk: break
+        dur = seg["end"] - seg["start"]; t = seg["start"]; done = 0
+        while done < len(chunk):
+            bs = min(max_words, len(chunk) - done)
+            starts.append((chunk[done], t))
+            t += dur * bs / (len(chunk) - done) if len(chunk) - done else 0
+            done += bs
+        idx += len(chunk)
+    return starts
+
+
+def benchmark(n_words: int = 10000, seed: int = 7) -> Dict[str, float]:
+    rnd = random.Random(seed)
+    vocab = ["senhor", "palavra", "disse", "jesus", "discípulos", "naquele", "tempo", "povo", "reino", "céu", "amor",
+             "pai", "filho", "espírito", "graça", "fé", "caminho", "vida", "luz", "mundo", "e", "o", "a", "de", "que",
+             "em", "para", "com", "não", "se", "os", "as", "um", "uma", "salvação", "glória", "oração", "amém"]
+    ref = [rnd.choice(vocab) + ("." if rnd.random() < 0.06 else "") for _ in range(n_words)]
+    truth, t = [], 0.3
+    for w in ref:
+        d = 0.05 + 0.055 * len(w); truth.append((t, t + d)); t += d + (0.35 if w.endswith(".") else 0.04)
+    hyp = []
+    for w, (s, e) in zip(ref, truth):
+        r = rnd.random()
+        if r < 0.05: continue                                    # palavra não reconhecida
+        word = w if r > 0.15 else rnd.choice(vocab)              # erro de reconhecimento
+        hyp.append({"word": word, "start": s + rnd.gauss(0, 0.02), "end": e + rnd.gauss(0, 0.02)})
+        if rnd.random() < 0.03: hyp.append({"word": "é", "start": e, "end": e + 0.05})  # inserção
+    segments = [{"start": hyp[i]["start"], "end": hyp[min(i + 11, len(hyp) - 1)]["end"],
+                 "text": " " + " ".join(w["word"] for w in hyp[i:i + 12]), "words": hyp[i:i + 12]} for i in range(0, len(hyp), 12)]
+
+    t0 = time.perf_counter()
+    timings = align_word_timings(ref, words_from_segments(segments))
+    cues = build_cues(ref, timings)
+    elapsed = time.perf_counter() - t0
+
+    word_err = np.abs(np.array([a[0] for a in timings]) - np.array([b[0] for b in truth]))
+    cue_err = np.abs(np.array([c["start"] - truth[c["words"][0]][0] for c in cues]))
+    base = _proportional_baseline(segments, ref)
+    base_err = np.abs(np.array([st - truth[i][0] for i, st in base]))
+    return {
+        "words": n_words, "runtime_s": round(elapsed, 3),
+        "word_start_mae_ms": round(float(word_err.mean()) * 1000, 1),
+        "word_start_p95_ms": round(float(np.percentile(word_err, 95)) * 1000, 1),
+        "cue_start_mae_ms": round(float(cue_err.mean()) * 1000, 1),
+        "baseline_cue_start_mae_ms": round(float(base_err.mean()) * 1000, 1),
+        "baseline_cue_start_p95_ms": round(float(np.percentile(base_err, 95)) * 1000, 1),
+    }
+
+
+if __name__ == "__main__":
+    for n in (1000, 10000):
+        print(benchmark(n))
@@ -4,21 +4,26 @@ import os
 import re
 import json
 import time
-import tempfile
 import traceback
 import subprocess
 import urllib.parse
 import random
-import textwrap
 from io import BytesIO
 from datetime import date
 from typing import List, Optional, Tuple, Dict
 import base64
 
 import requests
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import streamlit as st
 
+from cache_llm import cached_chat_completion, clear_llm_cache, llm_cache_stats, CACHE_MODES, CACHE_MODE_USE
+from workspaces import current_session_workspace, scratch_dir, remove_dir, reserve, estimate_render_mb
+from alinhamento import audio_duration_from_bytes, build_cues, distribute_words
+from legenda_render import ass_filter, build_ass, font_family_name
+from tts_adapter import TTS_ENGINES, available_engines, synthesize
+from fontes import WRAP_OPTIMAL, load_font, register_upload, text_width, wrap_lines, wrap_text
+
 # Force ffmpeg path for imageio if needed (Streamlit Cloud)
 os.environ.setdefault("IMAGEIO_FFMPEG_EXE", "/usr/bin/ffmpeg")
 
@@ -26,6 +31,11 @@ os.environ.setdefault("IMAGEIO_FFMPEG_EXE", "/usr/bin/ffmpeg")
 CONFIG_FILE = "overlay_config.json"
 SAVED_MUSIC_FILE = "saved_bg_music.mp3"
 
+GROQ_MODEL = "llama-3.3-70b-versatile"
+# Versões dos templates de prompt (altere ao mudar o texto para invalidar o cache do LLM)
+PROMPT_VERSION_PERSONAGENS = "personagens-v1"
+PROMPT_VERSION_ROTEIRO = "roteiro-prompts-v1"
+
 # =========================
 # Page config
 # =========================
@@ -57,6 +67,8 @@ def load_config():
         "sub_color": "#FFFFFF",
         "sub_outline_color": "#000000",
         "sub_karaoke": False, # Efeito Wipe
+        "sub_karaoke_color": "#FFFF00", # Cor da palavra já falada
+        "sub_words": 5, # Palavras por legenda
         "sub_bg_box": False
     }
     
@@ -120,6 +132,9 @@ def inicializar_groq():
             st.stop()
     return _client
 
+def llm_cache_mode() -> str:
+    return st.session_state.get("llm_cache_mode", CACHE_MODE_USE)
+
 # =========================
 # Inicializar banco de personagens
 # =========================
@@ -197,27 +212,14 @@ def sanitize_text_for_ffmpeg(text: str) -> str:
     return t
 
 def wrap_text_ffmpeg(text: str, font_path: str, font_size: int, max_width: int) -> str:
-    """Quebra o texto em linhas para caber na largura"""
+    """Quebra o texto em linhas que cabem na largura (medida pelos glifos da fonte, linhas equilibradas)"""
     if not text: return ""
-    try:
-        font = ImageFont.truetype(font_path, font_size) if font_path and os.path.exists(font_path) else ImageFont.load_default()
-    except:
-        font = ImageFont.load_default()
-    
-    # Estimativa de caracteres por linha
-    # A largura média de um caractere é aprox 0.6 * tamanho da fonte (para fontes normais)
-    avg_char_width = font_size * 0.5 
-    chars_per_line = int(max_width / avg_char_width)
-    
-    wrapper = textwrap.TextWrapper(width=chars_per_line)
-    lines = wrapper.wrap(text)
-    return "\n".join(lines) # FFmpeg drawtext aceita \n
+    return wrap_text(text, font_path, font_size, max_width, WRAP_OPTIMAL)  # FFmpeg drawtext/ASS aceitam \n
 
 # =========================
 # Groq Logic
 # =========================
 def analisar_personagens_groq(texto_evangelho: str, banco_personagens: dict):
-    client = inicializar_groq()
     system_prompt = (
         "Você é especialista em análise bíblica.\n"
         "Analise o texto e identifique TODOS os personagens bíblicos mencionados.\n\n"
@@ -230,12 +232,11 @@ def analisar_personagens_groq(texto_evangelho: str, banco_personagens: dict):
         "NOVOS: Mulher Samaritana|mulher de 35 anos, pele morena, véu colorido, jarro d'água, expressão curiosa, túnica tradicional\n"
     )
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        resultado = cached_chat_completion(
+            inicializar_groq, model=GROQ_MODEL,
             messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": f"TEXTO: {texto_evangelho[:1500]}"}],
-            temperature=0.3, max_tokens=400,
+            temperature=0.3, max_tokens=400, prompt_version=PROMPT_VERSION_PERSONAGENS, mode=llm_cache_mode(),
         )
-        resultado = resp.choices[0].message.content
         personagens_detectados = {}
         m = re.search(r"PERSONAGENS:\s*(.+)", resultado)
         if m:
@@ -258,7 +259,6 @@ def analisar_personagens_groq(texto_evangelho: str, banco_personagens: dict):
     except Exception: return {}
 
 def gerar_roteiro_com_prompts_groq(texto_evangelho: str, referencia_liturgica: str, personagens: dict):
-    client = inicializar_groq()
     texto_limpo = limpar_texto_evangelho(texto_evangelho)
     personagens_str = json.dumps(personagens, ensure_ascii=False)
     system_prompt = f"""Crie roteiro + 6 prompts visuais CATÓLICOS para vídeo devocional.
@@ -280,12 +280,12 @@ PROMPT_ORACAO: [prompt visual]
 PROMPT_LEITURA: [prompt visual]
 PROMPT_GERAL: [prompt thumbnail]"""
     try:
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        texto_gerado = cached_chat_completion(
+            inicializar_groq, model=GROQ_MODEL,
             messages=[{"role": "system", "content": system_prompt}, {"role": "user", "content": f"Evangelho: {referencia_liturgica}\n\n{texto_limpo[:2000]}"}],
-            temperature=0.7, max_tokens=1200,
+            temperature=0.7, max_tokens=1200, prompt_version=PROMPT_VERSION_ROTEIRO, mode=llm_cache_mode(),
+            validate=lambda t: bool(re.search(r"HOOK:", t, re.IGNORECASE)),
         )
-        texto_gerado = resp.choices[0].message.content
         partes = {}
         def ext(l):
             m = re.search(rf"{l}:\s*(.*?)(?=\n[A-ZÁÉÍÓÚÃÕÇ]{{3,}}:\s*|\nPROMPT_|$)", texto_gerado, re.DOTALL | re.IGNORECASE)
@@ -364,16 +364,12 @@ def obter_evangelho_com_fallback(data_str: str):
 # =========================
 # Mídia Generation
 # =========================
-def gerar_audio_gtts(texto: str) -> Optional[BytesIO]:
-    if not texto or not texto.strip(): return None
-    mp3_fp = BytesIO()
-    try:
-        from gtts import gTTS  # type: ignore
-        tts = gTTS(text=texto, lang="pt", slow=False)
-        tts.write_to_fp(mp3_fp)
-        mp3_fp.seek(0)
-        return mp3_fp
-    except Exception as e: raise RuntimeError(f"Erro gTTS: {e}")
+def gcp_credentials_info() -> Optional[Dict]:
+    """Conta de serviço dos secrets (mesmas chaves gcp_service_account_* da Montagem); None usa as credenciais do ambiente."""
+    keys = ["type", "project_id", "private_key_id", "private_key", "client_email", "client_id", "auth_uri", "token_uri", "auth_provider_x509_cert_url", "client_x509_cert_url", "universe_domain"]
+    try: info = {k: st.secrets.get("gcp_service_account_" + k) for k in keys}
+    except Exception: return None
+    return info if all(v is not None for v in info.values()) else None
 
 def get_resolution_params(choice: str) -> dict:
     if "9:16" in choice: return {"w": 720, "h": 1280, "ratio": "9:16"}
@@ -438,8 +434,7 @@ def get_audio_duration_seconds(path: str) -> Optional[float]:
 
 def resolve_font_path(font_choice: str, uploaded_font: Optional[BytesIO]) -> Optional[str]:
     if font_choice == "Upload Personalizada" and uploaded_font:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".ttf") as tmp:
-            tmp.write(uploaded_font.getvalue()); return tmp.name
+        return register_upload(uploaded_font)  # Caminho por hash do conteúdo: gravado uma vez só
     system_fonts = {
         "Padrão (Sans)": ["/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", "arial.ttf"],
         "Serif": ["/usr/share/fonts/truetype/dejavu/DejaVuSerif-Bold.ttf", "times.ttf"],
@@ -450,8 +445,11 @@ def resolve_font_path(font_choice: str, uploaded_font: Optional[BytesIO]) -> Opt
         if os.path.exists(font): return font
     return None
 
-def criar_preview_overlay(width: int, height: int, texts: List[Dict], global_upload: Optional[BytesIO], subtitle_preview: Dict = None) -> BytesIO:
-    """Gera preview com Overlay e Legenda"""
+PREVIEW_CACHE_ENTRIES = 32  # Combinações de preview guardadas em memória (sliders indo e voltando)
+
+@st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+def _render_preview_overlay(width: int, height: int, texts: List[Dict], subtitle_preview: Optional[Dict]) -> bytes:
+    """PNG do preview. Só recebe valores (fontes já resolvidas para caminhos por conteúdo): a chave do cache é a entrada inteira."""
     img = Image.new("RGB", (width, height), "black")
     draw = ImageDraw.Draw(img)
     
@@ -462,33 +460,28 @@ def criar_preview_overlay(width: int, height: int, texts: List[Dict], global_upl
         size = item.get("size", 30)
         y = item.get("y", 0)
         color = item.get("color", "white")
-        font_style = item.get("font_style", "Padrão (Sans)")
-        font_path = resolve_font_path(font_style, global_upload)
-        try: font = ImageFont.truetype(font_path, size) if font_path and os.path.exists(font_path) else ImageFont.load_default()
-        except: font = ImageFont.load_default()
-        try: length = draw.textlength(text, font=font)
-        except: length = len(text) * size * 0.5
-        x = (width - length) / 2
+        font_path = item.get("font_path")
+        font = load_font(font_path, size)
+        x = (width - text_width(text, font_path, size)) / 2
         draw.text((x, y), text, fill=color, font=font)
     
     # 2. Legenda (Preview)
     if subtitle_preview and subtitle_preview.get("enabled"):
-        text = "Exemplo de legenda do vídeo...\nQuebra de linha automática."
+        text = "Exemplo de legenda do vídeo com quebra de linha automática pela largura real do texto."
         size = subtitle_preview.get("size", 40)
-        font_path = resolve_font_path(subtitle_preview.get("font", "Padrão (Sans)"), global_upload)
+        font_path = subtitle_preview.get("font_path")
         color = subtitle_preview.get("color", "#FFFFFF")
         stroke_color = subtitle_preview.get("outline", "#000000")
         
-        try: font = ImageFont.truetype(font_path, size) if font_path and os.path.exists(font_path) else ImageFont.load_default()
-        except: font = ImageFont.load_default()
+        font = load_font(font_path, size)
         
         # Posição (Bottom)
-        # Margem de 10%
-        margin = int(width * 0.1)
+        # Mesma margem lateral do render (50px de cada lado, em escala)
+        margin = subtitle_preview.get("margin", 50)
         max_w = width - (2 * margin)
         
-        # Simples wrap para preview
-        lines = text.split("\n")
+        # Mesma quebra do render: largura real dos glifos
+        lines = wrap_lines(text, font_path, size, max_w, WRAP_OPTIMAL)
         
         # Calcular altura total
         total_h = len(lines) * (size + 5)
@@ -496,15 +489,19 @@ def criar_preview_overlay(width: int, height: int, texts: List[Dict], global_upl
         y_pos = height - subtitle_preview.get("y", 100) - total_h
         
         for i, line in enumerate(lines):
-            try: length = draw.textlength(line, font=font)
-            except: length = len(line) * size * 0.5
-            x = (width - length) / 2
+            x = (width - text_width(line, font_path, size)) / 2
             draw.text((x, y_pos + (i * (size + 5))), line, fill=color, font=font, stroke_width=2, stroke_fill=stroke_color)
 
     bio = BytesIO()
     img.save(bio, format="PNG")
-    bio.seek(0)
-    return bio
+    return bio.getvalue()
+
+def criar_preview_overlay(width: int, height: int, texts: List[Dict], global_upload: Optional[BytesIO], subtitle_preview: Dict = None) -> BytesIO:
+    """Gera preview com Overlay e Legenda (memoizado: rerun sem mudança no preview não redesenha)"""
+    texts = [dict(t, font_path=resolve_font_path(t.get("font_style", "Padrão (Sans)"), global_upload)) for t in texts]
+    if subtitle_preview and subtitle_preview.get("enabled"):
+        subtitle_preview = dict(subtitle_preview, font_path=resolve_font_path(subtitle_preview.get("font", "Padrão (Sans)"), global_upload))
+    return BytesIO(_render_preview_overlay(width, height, texts, subtitle_preview))
 
 def get_text_alpha_expr(anim_type: str, duration: float) -> str:
     if anim_type == "Fade In": return f"alpha='min(1,t/1)'"
@@ -525,13 +522,22 @@ st.sidebar.markdown("---")
 st.sidebar.markdown("### 🅰️ Fonte Global (Upload)")
 font_choice = st.sidebar.selectbox("Estilo da Fonte Padrão", ["Padrão (Sans)", "Serif", "Monospace", "Upload Personalizada"], index=0)
 uploaded_font_file = st.sidebar.file_uploader("Arquivo .ttf (para opção 'Upload Personalizada')", type=["ttf"])
+_engines = available_engines()
+motor_voz = st.sidebar.selectbox("🔊 Motor de Voz", _engines, format_func=lambda k: TTS_ENGINES[k]["label"])
+voz_escolhida = st.sidebar.selectbox("Voz", TTS_ENGINES[motor_voz]["voices"])
 st.sidebar.info(f"Modo: {motor_escolhido}\nFormato: {resolucao_escolhida}")
+st.sidebar.markdown("---")
+st.sidebar.radio("🧠 Cache IA (Groq)", CACHE_MODES, key="llm_cache_mode", help="Respostas repetidas vêm do disco, sem custo de tokens.")
+_llm_stats = llm_cache_stats()
+st.sidebar.caption(f"💾 {_llm_stats['entries']} respostas em cache ({_llm_stats['bytes'] // 1024} KB)")
+if st.sidebar.button("Limpar Cache IA"): clear_llm_cache(); st.rerun()
 
 if "personagens_biblicos" not in st.session_state: st.session_state.personagens_biblicos = inicializar_personagens()
 if "roteiro_gerado" not in st.session_state: st.session_state["roteiro_gerado"] = None
 if "leitura_montada" not in st.session_state: st.session_state["leitura_montada"] = ""
 if "generated_images_blocks" not in st.session_state: st.session_state["generated_images_blocks"] = {}
 if "generated_audios_blocks" not in st.session_state: st.session_state["generated_audios_blocks"] = {}
+if "generated_audio_words" not in st.session_state: st.session_state["generated_audio_words"] = {}  # bid -> [{"word", "start", "end"}] do TTS
 if "video_final_bytes" not in st.session_state: st.session_state["video_final_bytes"] = None
 if "meta_dados" not in st.session_state: st.session_state["meta_dados"] = {"data": "", "ref": ""}
 if "overlay_settings" not in st.session_state: st.session_state["overlay_settings"] = load_config()
@@ -602,10 +608,13 @@ with tab3:
                     ov_sets["sub_color"] = st.color_picker("Cor Texto", ov_sets.get("sub_color", "#FFFFFF"))
                     ov_sets["sub_font"] = st.selectbox("Fonte Legenda", font_options, index=0)
                     ov_sets["sub_karaoke"] = st.checkbox("Efeito Karaoke (Wipe)", value=ov_sets.get("sub_karaoke", False))
+                    if ov_sets["sub_karaoke"]:
+                        ov_sets["sub_karaoke_color"] = st.color_picker("Cor Palavra Falada", ov_sets.get("sub_karaoke_color", "#FFFF00"))
                 with c2:
                     ov_sets["sub_outline_color"] = st.color_picker("Cor Borda", ov_sets.get("sub_outline_color", "#000000"))
                     ov_sets["sub_size"] = st.slider("Tamanho", 20, 100, ov_sets.get("sub_size", 45))
                     ov_sets["sub_y"] = st.slider("Posição (do fundo)", 0, 500, ov_sets.get("sub_y", 100))
+                    ov_sets["sub_words"] = st.slider("Palavras por legenda", 2, 10, ov_sets.get("sub_words", 5))
                 
                 ov_sets["sub_bg_box"] = st.checkbox("Fundo Escuro (Box)", value=ov_sets.get("sub_bg_box", False))
 
@@ -651,7 +660,8 @@ with tab3:
             "font": ov_sets["sub_font"],
             "color": ov_sets["sub_color"],
             "outline": ov_sets["sub_outline_color"],
-            "y": int(ov_sets["sub_y"] * scale)
+            "y": int(ov_sets["sub_y"] * scale),
+            "margin": int(50 * scale)
         }
         
         prev_img = criar_preview_overlay(pw, ph, texts, uploaded_font_file, sub_preview)
@@ -684,7 +694,7 @@ with tab4:
                     txt = roteiro.get(b["text_key"]) if bid != "leitura" else st.session_state.get("leitura_montada", "")
                     if txt:
                         st.write(f"Gerando {b['label']}...")
-                        try: st.session_state["generated_audios_blocks"][bid] = gerar_audio_gtts(txt)
+                        try: st.session_state["generated_audios_blocks"][bid], st.session_state["generated_audio_words"][bid] = synthesize(txt, motor_voz, voz_escolhida, gcp_credentials_info())
                         except Exception as e: st.error(f"Erro {bid}: {e}")
                 s.update(label="Áudios prontos!", state="complete"); st.rerun()
     with cb2:
@@ -727,6 +737,7 @@ with tab4:
 
     if st.button("Renderizar Vídeo Final", type="primary"):
         with st.status("Renderizando...", expanded=True) as status:
+            tmp = None
             try:
                 if not shutil_which("ffmpeg"): st.error("FFmpeg ausente"); st.stop()
                 blocks = [b for b in blocos_config if b["id"] != "thumbnail"]
@@ -744,11 +755,18 @@ with tab4:
                 sub_size = sets.get("sub_size", 45)
                 sub_col = sets.get("sub_color", "#FFFFFF")
                 sub_out = sets.get("sub_outline_color", "#000000")
-                sub_y = h - sets.get("sub_y", 100) # Inverter Y para FFmpeg (y=h-val)
+                sub_y = sets.get("sub_y", 100) # MarginV do ASS: distância do fundo
                 sub_karaoke = sets.get("sub_karaoke", False)
+                sub_hl = sets.get("sub_karaoke_color", "#FFFF00")
                 sub_bg = sets.get("sub_bg_box", False)
 
-                tmp = tempfile.mkdtemp(); clips = []
+                sid, _ = current_session_workspace()
+                # Cotas da sessão/globais: entradas gravadas + estimativa dos clipes pela duração dos áudios
+                pares = [(st.session_state["generated_images_blocks"].get(b["id"]), st.session_state["generated_audios_blocks"].get(b["id"])) for b in blocks]
+                pares = [(im, au) for im, au in pares if im and au]
+                reserve(sid, estimate_render_mb(sum(audio_duration_from_bytes(au.getvalue()) for _, au in pares),
+                                                sum(len(im.getvalue()) + len(au.getvalue()) for im, au in pares)))
+                tmp = scratch_dir(sid, "render_"); clips = []
                 map_t = {"hook": "EVANGELHO", "leitura": "EVANGELHO", "reflexão": "REFLEXÃO", "aplicação": "APLICAÇÃO", "oração": "ORAÇÃO"}
                 meta = st.session_state.get("meta_dados", {})
 
@@ -796,29 +814,23 @@ with tab4:
                         vf.append(f"drawtext=fontfile='{font_p}':text='{t2}':fontcolor=white:fontsize={sets['line2_size']}:x=(w-text_w)/2:y={sets['line2_y']}:shadowcolor=black:shadowx=2:shadowy=2:{a2}")
                         vf.append(f"drawtext=fontfile='{font_p}':text='{t3}':fontcolor=white:fontsize={sets['line3_size']}:x=(w-text_w)/2:y={sets['line3_y']}:shadowcolor=black:shadowx=2:shadowy=2:{a3}")
 
-                    # Legendas
+                    # Legendas (ASS temporizado; com karaoke, cada palavra acende no seu tempo via \\k)
                     if sub_on and sub_font_p:
-                        # Obter texto do bloco e preparar
-                        raw_text = roteiro.get(b["text_key"]) if bid != "leitura" else st.session_state.get("leitura_montada", "")
-                        if raw_text:
-                            # Quebrar texto para caber na largura (margem de 100px)
-                            wrapped_text = wrap_text_ffmpeg(raw_text, sub_font_p, sub_size, w - 100)
-                            safe_text = sanitize_text_for_ffmpeg(wrapped_text)
-                            
-                            # Opções de estilo
-                            box_cmd = ":box=1:boxcolor=black@0.6:boxborderw=10" if sub_bg else ""
-                            # Karaoke Effect (Wipe Color)
-                            # Se ativo, cor muda de Amarelo para Branco (ou inverso) baseado no tempo
-                            # fontcolor_expr=if(lt(x,w*t/dur), 'Yellow', 'White') -> Difícil em drawtext bloco.
-                            # Usaremos highlight simples: Cor muda ao longo do tempo se karaoke on
-                            color_cmd = f"fontcolor={sub_col}"
-                            if sub_karaoke:
-                                # Simples efeito de cor pulsante ou mudança gradual para simular atividade
-                                pass # FFmpeg drawtext complexo para karaoke real sem SRT. Manter estático limpo é melhor.
-                            
-                            # Adicionar filtro
-                            # y=h-150 (exemplo)
-                            vf.append(f"drawtext=fontfile='{sub_font_p}':text='{safe_text}':fontsize={sub_size}:{color_cmd}:borderw=2:bordercolor={sub_out}:x=(w-text_w)/2:y={sub_y}{box_cmd}")
+                        tts_words = st.session_state["generated_audio_words"].get(bid)
+                        if tts_words:  # Tempos registrados na síntese (fronteiras/marcas do TTS ou duração de cada frase)
+                            words, timings = [x["word"] for x in tts_words], [(x["start"], x["end"]) for x in tts_words]
+                        else:  # Áudio sem trechos (gerado antes): estimativa sobre a duração total do bloco
+                            raw_text = roteiro.get(b["text_key"]) if bid != "leitura" else st.session_state.get("leitura_montada", "")
+                            words = (raw_text or "").split()
+                            timings = distribute_words(words, 0.0, dur)
+                        if words:
+                            cues = build_cues(words, timings, max_words=sets.get("sub_words", 5))
+                            ass = build_ass(cues, words, timings, w, h, font_family_name(sub_font_p), sub_size, sub_col, sub_out, sub_y,
+                                            karaoke=sub_karaoke, highlight=sub_hl, box=sub_bg,
+                                            wrap=lambda t: wrap_text_ffmpeg(t, sub_font_p, sub_size, w - 100))
+                            p_ass = os.path.join(tmp, f"{bid}.ass")
+                            with open(p_ass, "w", encoding="utf-8") as f: f.write(ass)
+                            vf.append(ass_filter(p_ass, os.path.dirname(sub_font_p)))
 
                     fc = ",".join(vf)
                     run_cmd(["ffmpeg", "-y", "-loop", "1", "-i", p_im, "-i", p_au, "-vf", fc, "-c:v", "libx264", "-t", f"{dur}", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest", p_out])
@@ -847,6 +859,7 @@ with tab4:
                     status.update(label="Pronto!", state="complete")
             
             except Exception as e: status.update(label="Erro!", state="error"); st.error(f"{e}")
+            finally: remove_dir(tmp)  # O vídeo final já está em memória
 
     if st.session_state.get("video_final_bytes"):
         st.success("Vídeo Gerado!"); st.video(st.session_state["video_final_bytes"])
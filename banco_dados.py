@@ -0,0 +1,280 @@
+# banco_dados.py — Armazenamento SQLite (personagens, histórico, leituras, roteiros)
+# Substitui characters_db.json / history_db.json. Modo WAL + busy_timeout permitem
+# leituras concorrentes e escritas transacionais seguras entre sessões do Streamlit.
+import os
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+DB_FILE = os.getenv("MONETIZA_DB_FILE", "monetiza_studio.db")
+LEGACY_CHARACTERS_FILE = "characters_db.json"
+LEGACY_HISTORY_FILE = "history_db.json"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS characters (
+    name TEXT PRIMARY KEY,
+    description TEXT NOT NULL DEFAULT '',
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS history (
+    d_iso TEXT PRIMARY KEY,
+    sent_at TEXT
+);
+CREATE TABLE IF NOT EXISTS readings (
+    d_iso TEXT NOT NULL,
+    type TEXT NOT NULL,
+    ref TEXT,
+    text TEXT NOT NULL,
+    source TEXT,
+    fetched_at TEXT,
+    PRIMARY KEY (d_iso, type)
+);
+CREATE TABLE IF NOT EXISTS scripts (
+    d_iso TEXT NOT NULL,
+    type TEXT NOT NULL,
+    ref TEXT,
+    roteiro TEXT NOT NULL,
+    chars TEXT NOT NULL DEFAULT '[]',
+    created_at TEXT,
+    PRIMARY KEY (d_iso, type)
+);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id TEXT PRIMARY KEY,
+    mode TEXT,
+    d_ini TEXT,
+    d_fim TEXT,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    batch_id TEXT NOT NULL,
+    d_iso TEXT NOT NULL,
+    type TEXT NOT NULL,
+    step INTEGER NOT NULL DEFAULT 0,
+    prompts TEXT,
+    job TEXT,
+    updated_at TEXT,
+    PRIMARY KEY (batch_id, d_iso, type)
+);
+CREATE TABLE IF NOT EXISTS batch_missing (
+    batch_id TEXT NOT NULL,
+    d_iso TEXT NOT NULL,
+    PRIMARY KEY (batch_id, d_iso)
+);
+"""
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized: Set[str] = set()
+
+
+def _now() -> str: return datetime.now().isoformat(timespec="seconds")
+
+
+def get_conn(db_file: Optional[str] = None) -> sqlite3.Connection:
+    """Uma conexão por thread e por arquivo; o esquema é criado/migrado uma vez por processo."""
+    path = os.path.abspath(db_file or DB_FILE)
+    conns = getattr(_local, "conns", None)
+    if conns is None: conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=10000")
+        conns[path] = conn
+    if path not in _initialized:
+        with _init_lock:
+            if path not in _initialized:
+                conn.executescript(SCHEMA)
+                _migrate_legacy_json(conn)
+                _initialized.add(path)
+    return conn
+
+
+@contextmanager
+def _write(conn: sqlite3.Connection):
+    """Transação de escrita (BEGIN IMMEDIATE): serializa escritores sem bloquear leitores."""
+    conn.execute("BEGIN IMMEDIATE")
+    try: yield conn
+    except BaseException: conn.execute("ROLLBACK"); raise
+    else: conn.execute("COMMIT")
+
+
+def _migrate_legacy_json(conn: sqlite3.Connection):
+    """Importa os arquivos JSON antigos uma única vez."""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'legacy_json_migrated'").fetchone(): return
+    chars, hist = {}, []
+    try:
+        if os.path.exists(LEGACY_CHARACTERS_FILE):
+            with open(LEGACY_CHARACTERS_FILE, "r", encoding="utf-8") as f: chars = json.load(f) or {}
+    except Exception: chars = {}
+    try:
+        if os.path.exists(LEGACY_HISTORY_FILE):
+            with open(LEGACY_HISTORY_FILE, "r", encoding="utf-8") as f: hist = json.load(f) or []
+    except Exception: hist = []
+    with _write(conn):
+        if isinstance(chars, dict):
+            conn.executemany("INSERT OR IGNORE INTO characters (name, description, updated_at) VALUES (?, ?, ?)",
+                             [(str(n), str(d), _now()) for n, d in chars.items()])
+        if isinstance(hist, list):
+            conn.executemany("INSERT OR IGNORE INTO history (d_iso, sent_at) VALUES (?, NULL)", [(str(d),) for d in hist])
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_json_migrated', ?)", (_now(),))
+
+
+# =========================
+# Personagens
+# =========================
+def get_characters() -> Dict[str, str]:
+    return {r["name"]: r["description"] for r in get_conn().execute("SELECT name, description FROM characters ORDER BY name")}
+
+
+def get_character(name: str) -> Optional[str]:
+    row = get_conn().execute("SELECT description FROM characters WHERE name = ?", (name,)).fetchone()
+    return row["description"] if row else None
+
+
+def upsert_characters(chars: Dict[str, str]):
+    if not chars: return
+    conn = get_conn()
+    with _write(conn):
+        conn.executemany("INSERT INTO characters (name, description, updated_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET description = excluded.description, updated_at = excluded.updated_at",
+                         [(n, d, _now()) for n, d in chars.items()])
+
+
+def count_characters() -> int:
+    return get_conn().execute("SELECT COUNT(*) FROM characters").fetchone()[0]
+
+
+# =========================
+# Histórico de envios
+# =========================
+def add_history(dates: Iterable[str]):
+    conn = get_conn()
+    with _write(conn):
+        conn.executemany("INSERT OR IGNORE INTO history (d_iso, sent_at) VALUES (?, ?)", [(d, _now()) for d in dates])
+
+
+def history_contains(dates: Iterable[str]) -> Set[str]:
+    """Retorna quais das datas já foram enviadas (busca pelo índice da chave primária)."""
+    dates = list(dates)
+    if not dates: return set()
+    q = f"SELECT d_iso FROM history WHERE d_iso IN ({','.join('?' * len(dates))})"
+    return {r["d_iso"] for r in get_conn().execute(q, dates)}
+
+
+def history_between(d_ini: str, d_fim: str) -> Set[str]:
+    return {r["d_iso"] for r in get_conn().execute("SELECT d_iso FROM history WHERE d_iso BETWEEN ? AND ?", (d_ini, d_fim))}
+
+
+def last_history() -> Optional[str]:
+    row = get_conn().execute("SELECT MAX(d_iso) FROM history").fetchone()
+    return row[0] if row else None
+
+
+def clear_history():
+    conn = get_conn()
+    with _write(conn): conn.execute("DELETE FROM history")
+
+
+# =========================
+# Leituras e roteiros
+# =========================
+def save_readings(readings: List[Dict[str, Any]], source: str = "api"):
+    if not readings: return
+    conn = get_conn()
+    with _write(conn):
+        conn.executemany("INSERT OR REPLACE INTO readings (d_iso, type, ref, text, source, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                         [(r["d_iso"], r["type"], r.get("ref"), r["text"], source, _now()) for r in readings])
+
+
+def get_readings(d_iso: str) -> List[Dict[str, Any]]:
+    rows = get_conn().execute("SELECT d_iso, type, ref, text FROM readings WHERE d_iso = ? ORDER BY rowid", (d_iso,)).fetchall()
+    return [dict(r) for r in rows]
+
+
+def save_script(meta: Dict[str, Any], roteiro: Dict[str, Any], chars: List[str]):
+    conn = get_conn()
+    with _write(conn):
+        conn.execute("INSERT OR REPLACE INTO scripts (d_iso, type, ref, roteiro, chars, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                     (meta["d_iso"], meta["type"], meta.get("ref"), json.dumps(roteiro, ensure_ascii=False), json.dumps(chars, ensure_ascii=False), _now()))
+
+
+def get_script(d_iso: str, reading_type: str) -> Optional[Dict[str, Any]]:
+    row = get_conn().execute("SELECT roteiro, chars FROM scripts WHERE d_iso = ? AND type = ?", (d_iso, reading_type)).fetchone()
+    if not row: return None
+    return {"roteiro": json.loads(row["roteiro"]), "chars": json.loads(row["chars"])}
+
+
+# =========================
+# Checkpoints de lote (retomada após queda/reinício)
+# =========================
+STEP_FETCHED, STEP_SCRIPTED, STEP_PROMPTED, STEP_SENT = 1, 2, 3, 4
+
+
+def batch_start(batch_id: str, mode: str, d_ini: str, d_fim: str):
+    conn = get_conn()
+    with _write(conn):
+        conn.execute("INSERT INTO batches (batch_id, mode, d_ini, d_fim, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+                     "ON CONFLICT(batch_id) DO UPDATE SET updated_at = excluded.updated_at",
+                     (batch_id, mode, d_ini, d_fim, _now(), _now()))
+
+
+def batch_mark(batch_id: str, items: List[Dict[str, Any]], step: int, prompts: Optional[Dict] = None, job: Optional[Any] = None):
+    """Avança o passo dos itens (nunca retrocede). Cada chamada é uma transação durável."""
+    if not items: return
+    conn = get_conn()
+    p = json.dumps(prompts, ensure_ascii=False) if prompts is not None else None
+    j = json.dumps(job, ensure_ascii=False) if job is not None else None
+    with _write(conn):
+        conn.executemany("INSERT INTO batch_items (batch_id, d_iso, type, step, prompts, job, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?) "
+                         "ON CONFLICT(batch_id, d_iso, type) DO UPDATE SET step = MAX(step, excluded.step), "
+                         "prompts = COALESCE(excluded.prompts, prompts), job = COALESCE(excluded.job, job), updated_at = excluded.updated_at",
+                         [(batch_id, it["d_iso"], it["type"], step, p, j, _now()) for it in items])
+        conn.execute("UPDATE batches SET updated_at = ? WHERE batch_id = ?", (_now(), batch_id))
+
+
+def batch_latest(mode: str) -> Optional[str]:
+    row = get_conn().execute("SELECT batch_id FROM batches WHERE mode = ? ORDER BY updated_at DESC LIMIT 1", (mode,)).fetchone()
+    return row["batch_id"] if row else None
+
+
+def batch_set_missing(batch_id: str, d_isos: Iterable[str], resolved: bool = False):
+    conn = get_conn()
+    with _write(conn):
+        if resolved: conn.executemany("DELETE FROM batch_missing WHERE batch_id = ? AND d_iso = ?", [(batch_id, d) for d in d_isos])
+        else: conn.executemany("INSERT OR IGNORE INTO batch_missing (batch_id, d_iso) VALUES (?, ?)", [(batch_id, d) for d in d_isos])
+
+
+def batch_state(batch_id: str) -> Optional[Dict[str, Any]]:
+    """Estado salvo do lote: itens (leitura + passo + roteiro/prompts/job) e datas na fila manual."""
+    conn = get_conn()
+    if not conn.execute("SELECT 1 FROM batches WHERE batch_id = ?", (batch_id,)).fetchone(): return None
+    rows = conn.execute(
+        "SELECT i.d_iso, i.type, i.step, i.prompts, i.job, r.ref, r.text, s.roteiro, s.chars "
+        "FROM batch_items i JOIN readings r ON r.d_iso = i.d_iso AND r.type = i.type "
+        "LEFT JOIN scripts s ON s.d_iso = i.d_iso AND s.type = i.type "
+        "WHERE i.batch_id = ? ORDER BY i.d_iso, r.rowid", (batch_id,)).fetchall()
+    items = []
+    for r in rows:
+        items.append({
+            "d_iso": r["d_iso"], "type": r["type"], "ref": r["ref"], "text": r["text"], "step": r["step"],
+            "prompts": json.loads(r["prompts"]) if r["prompts"] else None,
+            "job": json.loads(r["job"]) if r["job"] else None,
+            "roteiro": json.loads(r["roteiro"]) if r["roteiro"] else None,
+            "chars": json.loads(r["chars"]) if r["chars"] else [],
+        })
+    missing = [r["d_iso"] for r in conn.execute("SELECT d_iso FROM batch_missing WHERE batch_id = ? ORDER BY d_iso", (batch_id,))]
+    return {"items": items, "missing": missing}
+
+
+def batch_reset(batch_id: str):
+    conn = get_conn()
+    with _write(conn):
+        for t in ("batch_items", "batch_missing", "batches"): conn.execute(f"DELETE FROM {t} WHERE batch_id = ?", (batch_id,))
@@ -0,0 +1,90 @@
+# cache_disco.py — Cache persistente em disco (um arquivo JSON por chave)
+# Compartilhado entre sessões e reinícios do Streamlit. Escritas atômicas e despejo LRU.
+import os
+import json
+import time
+import hashlib
+import tempfile
+from typing import Any, Optional, Dict
+
+
+def make_key(*parts: Any) -> str:
+    """Gera uma chave estável (sha256) a partir de partes serializáveis em JSON."""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _entry_path(cache_dir: str, key: str) -> str:
+    # Subpastas por prefixo evitam diretórios com milhares de arquivos
+    return os.path.join(cache_dir, key[:2], f"{key}.json")
+
+
+def cache_get(cache_dir: str, key: str, ttl_seconds: Optional[float] = None) -> Optional[Any]:
+    """Retorna o valor salvo ou None. Atualiza o mtime (usado como LRU)."""
+    path = _entry_path(cache_dir, key)
+    if not os.path.exists(path): return None
+    try:
+        if ttl_seconds and time.time() - os.path.getmtime(path) > ttl_seconds:
+            os.remove(path); return None
+        with open(path, "r", encoding="utf-8") as f: entry = json.load(f)
+        os.utime(path, None)
+        return entry.get("value")
+    except Exception: return None
+
+
+def cache_set(cache_dir: str, key: str, value: Any, max_entries: Optional[int] = None, meta: Optional[Dict] = None) -> bool:
+    """Salva o valor de forma atômica (tmp + os.replace) e aplica o limite de entradas."""
+    path = _entry_path(cache_dir, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"value": value, "meta": meta or {}, "created_at": time.time()}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+    except Exception: return False
+    if max_entries: evict(cache_dir, max_entries)
+    return True
+
+
+def cache_delete(cache_dir: str, key: str) -> bool:
+    path = _entry_path(cache_dir, key)
+    if os.path.exists(path): os.remove(path); return True
+    return False
+
+
+def _list_entries(cache_dir: str):
+    entries = []
+    if not os.path.isdir(cache_dir): return entries
+    for sub in os.scandir(cache_dir):
+        if not sub.is_dir(): continue
+        for e in os.scandir(sub.path):
+            if e.name.endswith(".json"):
+                try: st_ = e.stat(); entries.append((st_.st_mtime, st_.st_size, e.path))
+                except OSError: continue
+    return entries
+
+
+def evict(cache_dir: str, max_entries: int) -> int:
+    """Remove as entradas usadas há mais tempo até sobrar no máximo `max_entries`."""
+    entries = _list_entries(cache_dir)
+    excess = len(entries) - max_entries
+    if excess <= 0: return 0
+    entries.sort()
+    removed = 0
+    for _, _, path in entries[:excess]:
+        try: os.remove(path); removed += 1
+        except OSError: pass
+    return removed
+
+
+def cache_clear(cache_dir: str) -> int:
+    removed = 0
+    for _, _, path in _list_entries(cache_dir):
+        try: os.remove(path); removed += 1
+        except OSError: pass
+    return removed
+
+
+def cache_stats(cache_dir: str) -> Dict[str, int]:
+    entries = _list_entries(cache_dir)
+    return {"entries": len(entries), "bytes": sum(e[1] for e in entries)}
@@ -0,0 +1,61 @@
+# cache_llm.py — Cache de respostas do Groq (roteiros, personagens, prompts)
+# Chave: modelo + versão do template de prompt + temperatura + hash das mensagens.
+# Um acerto no cache não chama a API (zero tokens, sem latência).
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from cache_disco import make_key, cache_get, cache_set, cache_clear, cache_stats
+
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "llm_cache")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_TTL_SECONDS = None  # Leituras se repetem entre anos litúrgicos: sem expiração por padrão
+LLM_STATS_TTL_SECONDS = 60  # A barra lateral pede as estatísticas a cada rerun; a varredura do diretório não
+
+# Modos expostos na interface
+CACHE_MODE_USE = "Usar cache"
+CACHE_MODE_BYPASS = "Ignorar cache"
+CACHE_MODE_REGENERATE = "Regenerar (sobrescrever)"
+CACHE_MODES = [CACHE_MODE_USE, CACHE_MODE_BYPASS, CACHE_MODE_REGENERATE]
+
+
+def llm_cache_key(model: str, prompt_version: str, temperature: float, messages: List[Dict[str, str]], **params) -> str:
+    return make_key("groq", model, prompt_version, round(float(temperature), 3), messages, params)
+
+
+def cached_chat_completion(client_factory: Callable, *, model: str, messages: List[Dict[str, str]], temperature: float,
+                           prompt_version: str, mode: str = CACHE_MODE_USE,
+                           validate: Optional[Callable[[str], bool]] = None, **params) -> Optional[str]:
+    """
+    Executa `chat.completions.create` com cache em disco e retorna o conteúdo da resposta.
+    `client_factory` só é chamado em caso de falta no cache.
+    - CACHE_MODE_BYPASS: não lê nem grava o cache.
+    - CACHE_MODE_REGENERATE: ignora a entrada existente e grava a nova resposta.
+    `validate` evita gravar respostas que o chamador não consegue interpretar.
+    """
+    key = llm_cache_key(model, prompt_version, temperature, messages, **params)
+    if mode == CACHE_MODE_USE:
+        hit = cache_get(LLM_CACHE_DIR, key, LLM_CACHE_TTL_SECONDS)
+        if hit is not None and (validate is None or validate(hit)): return hit
+
+    resp = client_factory().chat.completions.create(model=model, messages=messages, temperature=temperature, **params)
+    content = resp.choices[0].message.content
+    if content and mode != CACHE_MODE_BYPASS and (validate is None or validate(content)):
+        cache_set(LLM_CACHE_DIR, key, content, LLM_CACHE_MAX_ENTRIES, meta={"model": model, "prompt_version": prompt_version})
+    return content
+
+
+_stats_memo: Dict[str, Any] = {}
+
+
+def clear_llm_cache() -> int:
+    _stats_memo.clear()
+    return cache_clear(LLM_CACHE_DIR)
+
+
+def llm_cache_stats() -> Dict[str, int]:
+    """Contagem/tamanho do cache; o diretório é varrido no máximo uma vez a cada LLM_STATS_TTL_SECONDS por processo."""
+    now = time.monotonic()
+    if not _stats_memo or now - _stats_memo["at"] > LLM_STATS_TTL_SECONDS:
+        _stats_memo.update(at=now, stats=cache_stats(LLM_CACHE_DIR))
+    return _stats_memo["stats"]
@@ -0,0 +1,142 @@
+# drive_download.py — Download do Google Drive em blocos (Range), direto para o disco
+# Memória de pico = um bloco por conexão. Retoma downloads interrompidos (arquivo .part +
+# mapa de blocos concluídos) e, para arquivos grandes, baixa faixas de bytes em paralelo.
+import os
+import json
+import time
+import random
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional, Set
+
+import httplib2
+
+DRIVE_CHUNK_SIZE = int(os.getenv("DRIVE_CHUNK_SIZE", str(8 * 1024 * 1024)))
+DRIVE_PARALLEL = int(os.getenv("DRIVE_PARALLEL", "4"))
+DRIVE_PARALLEL_MIN_BYTES = 64 * 1024 * 1024  # Abaixo disso uma conexão só já satura
+DRIVE_MAX_RETRIES = 4
+DRIVE_TIMEOUT = 120
+DRIVE_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+ProgressFn = Callable[[int, int], None]
+
+_local = threading.local()
+
+
+def _thread_http(base_http):
+    """httplib2 não é thread-safe: cada thread usa sua própria conexão com as mesmas credenciais."""
+    creds = getattr(base_http, "credentials", None)
+    if creds is None: return base_http
+    http = getattr(_local, "http", None)
+    if http is None or getattr(_local, "creds", None) is not creds:
+        import google_auth_httplib2
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=DRIVE_TIMEOUT))
+        _local.http, _local.creds = http, creds
+    return http
+
+
+def _fetch_range(request, start: int, end: int) -> bytes:
+    """GET com Range (inclusive), com backoff exponencial em erros transitórios."""
+    for attempt in range(DRIVE_MAX_RETRIES + 1):
+        try:
+            resp, content = _thread_http(request.http).request(request.uri, method="GET", headers={"Range": f"bytes={start}-{end}"})
+        except (OSError, httplib2.HttpLib2Error) as e:
+            err = e
+        else:
+            status = int(resp.status)
+            if status == 206 or (status == 200 and start == 0): return content[: end - start + 1]
+            err = IOError(f"Drive HTTP {status}")
+            if status not in DRIVE_RETRY_STATUS: raise err
+        if attempt == DRIVE_MAX_RETRIES: raise err
+        time.sleep(min(30.0, 1.5 ** attempt) + random.uniform(0, 0.5))
+
+
+def file_size(service, file_id: str) -> Optional[int]:
+    req = service.files().get(fileId=file_id, fields="size")
+    meta = req.execute(http=_thread_http(req.http), num_retries=DRIVE_MAX_RETRIES)
+    return int(meta["size"]) if meta.get("size") else None
+
+
+def _load_done(state_path: str, chunk_size: int, size: int) -> Set[int]:
+    try:
+        with open(state_path, "r") as f: st_ = json.load(f)
+        if st_.get("chunk_size") == chunk_size and st_.get("size") == size: return set(st_.get("done", []))
+    except Exception: pass
+    return set()
+
+
+def _save_done(state_path: str, chunk_size: int, size: int, done: Set[int]):
+    tmp = state_path + ".tmp"
+    with open(tmp, "w") as f: json.dump({"chunk_size": chunk_size, "size": size, "done": sorted(done)}, f)
+    os.replace(tmp, state_path)
+
+
+def download_to_file(service, file_id: str, dest: str, chunk_size: int = DRIVE_CHUNK_SIZE,
+                     parallel: Optional[int] = None, progress: Optional[ProgressFn] = None, size: Optional[int] = None) -> str:
+    """
+    Baixa `file_id` para `dest` em blocos de `chunk_size`. Um `dest` completo com o mesmo tamanho
+    do Drive é reaproveitado; um `.part` interrompido é retomado dos blocos que faltam.
+    `progress(bytes_baixados, total)` é chamado na thread de quem chamou (seguro para o Streamlit).
+    `size`: tamanho já conhecido (ex.: da listagem); evita usar o `service` compartilhado fora da thread dele.
+    """
+    request = service.files().get_media(fileId=file_id)  # Só monta a requisição; os blocos usam _thread_http
+    if size is None: size = file_size(service, file_id)
+    if size is None:  # Sem tamanho (ex.: formatos nativos do Google): stream sequencial simples
+        from googleapiclient.http import MediaIoBaseDownload
+        request.http = _thread_http(request.http)
+        with open(dest, "wb") as fh:
+            dl, done = MediaIoBaseDownload(fh, request, chunksize=chunk_size), False
+            while not done:
+                status, done = dl.next_chunk(num_retries=DRIVE_MAX_RETRIES)
+                if progress and status: progress(status.resumable_progress, status.total_size or 0)
+        return dest
+    if os.path.exists(dest) and os.path.getsize(dest) == size:
+        if progress: progress(size, size)
+        return dest
+
+    part, state_path = dest + ".part", dest + ".part.json"
+    n_chunks = max(1, -(-size // chunk_size))
+    done = _load_done(state_path, chunk_size, size) if os.path.exists(part) else set()
+    mode = "r+b" if os.path.exists(part) else "w+b"
+    with open(part, mode) as fh: fh.truncate(size)  # Pré-aloca: cada bloco escreve no seu offset
+
+    workers = parallel if parallel is not None else (DRIVE_PARALLEL if size >= DRIVE_PARALLEL_MIN_BYTES else 1)
+    pending = [i for i in range(n_chunks) if i not in done]
+    got = sum(min(chunk_size, size - i * chunk_size) for i in done)
+    if progress: progress(got, size)
+
+    def _one(idx: int) -> int:
+        start = idx * chunk_size
+        end = min(size, start + chunk_size) - 1
+        data = _fetch_range(request, start, end)
+        if len(data) != end - start + 1: raise IOError(f"Bloco {idx} incompleto ({len(data)} bytes)")
+        with open(part, "r+b") as fh:
+            fh.seek(start); fh.write(data)
+        return len(data)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        futures = {ex.submit(_one, i): i for i in pending}
+        try:
+            for fut in as_completed(futures):
+                got += fut.result()
+                done.add(futures[fut])
+                _save_done(state_path, chunk_size, size, done)
+                if progress: progress(got, size)
+        except Exception:
+            for f in futures: f.cancel()
+            raise
+
+    os.replace(part, dest)
+    try: os.remove(state_path)
+    except OSError: pass
+    return dest
+
+
+def download_bytes(service, file_id: str, chunk_size: int = DRIVE_CHUNK_SIZE) -> bytes:
+    """Arquivos pequenos (JSON de job): mesmos blocos com Range, acumulados em memória."""
+    from googleapiclient.http import MediaIoBaseDownload
+    buf = BytesIO()
+    dl, done = MediaIoBaseDownload(buf, service.files().get_media(fileId=file_id), chunksize=chunk_size), False
+    while not done: _, done = dl.next_chunk(num_retries=DRIVE_MAX_RETRIES)
+    return buf.getvalue()
@@ -16,23 +16,19 @@ import streamlit as st
 from PIL import Image, ImageDraw, ImageFont
 
 # --- Imports de IA ---
-try:
-    import whisper
-except ImportError:
-    whisper = None
+# Registro de modelos Whisper compartilhado pelo processo (carregado uma vez)
+from transcricao import ASR_BACKENDS, DEFAULT_BACKEND, WHISPER_WORKERS, available_backends, model_key, warm_up_models, models_status, extract_pcm, transcribe_cached, clear_transcript_cache, transcript_cache_stats
+from alinhamento import align_roteiro_to_segments, roteiro_words, blocks_to_srt, get_full_roteiro_text, has_block_audio, has_tts_timings, get_job_block_timeline
+from drive_download import download_to_file, file_size
+from legendas_lote import batch_state, legendado_job_id, start_batch
+from workspaces import current_session_workspace, job_dir, reserve, WorkspaceQuotaError
+from legenda_render import GAS_SCRIPT_URL, MONETIZA_DRIVE_FOLDER_VIDEOS, CONFIG_FILE, SAVED_FONT_FILE, FONT_DEFAULT, FONT_CUSTOM, load_style_settings, resolve_font, build_soft_sub_cmd, full_burn_cmd, incremental_burn, ensure_preview_proxy, proxy_path, build_force_style, render_style_frames, preview_times
 
 # --- API Imports ---
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
-# --- CONFIGURAÇÃO ---
-GAS_SCRIPT_URL = "https://script.google.com/macros/s/AKfycbx5DZ52ohxKPl6Lh0DnkhHJejuPBx1Ud6B10Ag_xfnJVzGpE83n7gHdUHnk4yAgrpuidw/exec"
-MONETIZA_DRIVE_FOLDER_VIDEOS = "Monetiza_Studio_Videos_Finais" 
-MONETIZA_DRIVE_FOLDER_LEGENDADOS = "Monetiza_Studio_Videos_Legendados" 
-CONFIG_FILE = "legendas_config.json"
-SAVED_FONT_FILE = "saved_custom_font.ttf"
-
 os.environ.setdefault("IMAGEIO_FFMPEG_EXE", "/usr/bin/ffmpeg")
 
 # =========================
@@ -47,22 +43,6 @@ st.set_page_config(
 # =========================
 # Persistência de Estilos
 # =========================
-def load_config():
-    default = {
-        "f_size": 60, 
-        "margin_v": 250, 
-        "color": "#FFFF00", 
-        "border": "#000000",
-        "font_style": "Padrão (Arial)"
-    }
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                saved = json.load(f)
-                default.update(saved)
-        except: pass
-    return default
-
 def save_config(settings):
     try:
         with open(CONFIG_FILE, "w") as f: json.dump(settings, f)
@@ -79,14 +59,6 @@ def delete_font_file():
     if os.path.exists(SAVED_FONT_FILE): os.remove(SAVED_FONT_FILE); return True
     return False
 
-def resolve_font(choice):
-    """Resolve o caminho da fonte para o FFmpeg."""
-    if choice == "Upload Personalizada" and os.path.exists(SAVED_FONT_FILE):
-        # Retorna o caminho absoluto do arquivo para o FFmpeg
-        return os.path.abspath(SAVED_FONT_FILE) 
-    # Para fontes de sistema (Arial), o nome geralmente é suficiente
-    return choice 
-
 # =========================
 # Utils & Helpers
 # =========================
@@ -108,122 +80,44 @@ def format_timestamp(seconds):
     secs = int(seconds % 60)
     return f"{hours:02}:{minutes:02}:{secs:02},{millis:03}"
 
-def hex_to_ass_color(hex_color):
-    h = hex_color.lstrip('#')
-    if len(h) != 6: return "&HFFFFFF&"
-    # ASS usa formato BGR em hexadecimal
-    return f"&H00{h[4:6]}{h[2:4]}{h[0:2]}"
-
-def get_full_roteiro_text(roteiro_data: Dict[str, Any]) -> str:
-    """Extrai e formata o texto completo do roteiro JSON, ignorando marcações."""
-    if not roteiro_data or 'roteiro' not in roteiro_data:
-        return ""
-        
-    full_text = ""
-    roteiro = roteiro_data.get('roteiro', {})
-    
-    # Adiciona os blocos principais
-    if 'hook' in roteiro and 'text' in roteiro['hook']:
-        full_text += "--- HOOK ---\n" + roteiro['hook']['text'] + "\n\n"
-    if 'leitura' in roteiro and 'text' in roteiro['leitura']:
-        full_text += "--- LEITURA ---\n" + roteiro['leitura']['text'] + "\n\n"
-    if 'reflexao' in roteiro and 'text' in roteiro['reflexao']:
-        full_text += "--- REFLEXÃO ---\n" + roteiro['reflexao']['text'] + "\n\n"
-    if 'aplicacao' in roteiro and 'text' in roteiro['aplicacao']:
-        full_text += "--- APLICAÇÃO ---\n" + roteiro['aplicacao']['text'] + "\n\n"
-    if 'oracao' in roteiro and 'text' in roteiro['oracao']:
-        full_text += "--- ORAÇÃO ---\n" + roteiro['oracao']['text'] + "\n\n"
-    
-    return full_text.strip()
-
-
 # =========================
-# LÓGICA DE GERAÇÃO DE SRT PERFEITO (REVISADA PARA BLOCOS CURTOS)
+# LÓGICA DE GERAÇÃO DE SRT PERFEITO (ALINHAMENTO FORÇADO POR PALAVRA)
 # =========================
 def generate_perfect_srt(segments: List[Dict[str, Any]], full_roteiro_text: str) -> str:
     """
-    Usa o texto perfeito do roteiro e mapeia-o para os segmentos de tempo (timing)
-    gerados pelo Whisper, dividindo o resultado em blocos de até 4 palavras.
+    Alinha as palavras do roteiro perfeito às palavras reconhecidas pelo Whisper
+    (timestamps por palavra) e gera o SRT em blocos de até 4 palavras.
     """
-    # 1. Limpa o texto perfeito
-    clean_text = re.sub(r'--- [A-ZÁÉÕÇ ]+ ---\n', '', full_roteiro_text).strip()
-    clean_text = re.sub(r'\s+', ' ', clean_text)
-    words = clean_text.split()
-    
-    if not clean_text or not segments or not words:
+    if not roteiro_words(full_roteiro_text) or not segments:
         st.warning("Texto perfeito ou segmentos do Whisper vazios.")
         return ""
+    srt_content = align_roteiro_to_segments(segments, full_roteiro_text, max_words=4)
+    if not srt_content: st.warning("Whisper não conseguiu transcrever palavras.")
+    return srt_content
 
-    # 2. Concatena todo o texto transcrito pelo Whisper para cálculo de proporção
-    total_whisper_chars = sum(len(seg.get('text', '')) for seg in segments)
-    if total_whisper_chars == 0:
-        st.warning("Whisper não conseguiu transcrever caracteres.")
-        return ""
-
-    total_perfect_words = len(words)
-    srt_content = ""
-    current_word_index = 0
-    subtitle_index = 1
-    
-    # Itera sobre os segmentos do Whisper para obter os TIMINGS
-    for seg in segments:
-        whisper_text_len = len(seg.get('text', '').strip())
-        
-        # Heurística: Quantas palavras do texto perfeito devem ser alocadas para este segmento de tempo?
-        word_count_estimate = round((whisper_text_len / total_whisper_chars) * total_perfect_words)
-        
-        # Garante que haja pelo menos 1 palavra por segmento de tempo
-        word_count_estimate = max(1, word_count_estimate)
-        
-        # Usa o timing do segmento Whisper como duração máxima
-        start_time = seg['start']
-        end_time = seg['end']
-        duration = end_time - start_time
-        
-        # Divide o texto do segmento em blocos de no máximo o estimado
-        words_in_segment = words[current_word_index : current_word_index + word_count_estimate]
-        
-        if not words_in_segment:
-            break # Fim das palavras
-            
-        words_processed_in_seg = 0
-        
-        while words_processed_in_seg < len(words_in_segment):
-            # Define o tamanho do bloco (máximo 4 palavras)
-            block_size = min(4, len(words_in_segment) - words_processed_in_seg)
-            block_words = words_in_segment[words_processed_in_seg : words_processed_in_seg + block_size]
-            text_to_use = " ".join(block_words)
-            
-            # Cálculo de Timing para o Sub-bloco
-            # Distribui o tempo do segmento Whisper proporcionalmente ao número de palavras
-            
-            # Se for o primeiro bloco, começa no start_time
-            block_start = start_time if words_processed_in_seg == 0 else block_end 
-            
-            # Estimativa de duração do bloco (distribui o tempo restante)
-            remaining_words = len(words_in_segment) - words_processed_in_seg
-            estimated_block_duration = duration * (block_size / remaining_words) if remaining_words > 0 else 0
-            
-            block_end = min(end_time, block_start + estimated_block_duration)
-            
-            # Formatação SRT
-            if text_to_use and block_end > block_start:
-                start_str = format_timestamp(block_start)
-                end_str = format_timestamp(block_end)
-                
-                # A legenda agora é uma única linha e curta
-                srt_content += f"{subtitle_index}\n{start_str} --> {end_str}\n{text_to_use}\n\n"
-                subtitle_index += 1
-            
-            words_processed_in_seg += block_size
-        
-        # Atualiza o índice global de palavras
-        current_word_index += words_processed_in_seg
-        
-        if current_word_index >= total_perfect_words:
-            break
+# =========================
+# Saída: legenda queimada (re-encode) ou faixa de legenda (remux)
+# =========================
+OUTPUT_BURN = "Queimar na imagem"
+OUTPUT_SOFT = "Faixa de legenda (sem re-encode)"
+OUTPUT_MODES = [OUTPUT_BURN, OUTPUT_SOFT]
 
-    return srt_content
+def show_preview(video_path: str, on_demand: bool = False, subtitles: Optional[str] = None):
+    """
+    st.video com o proxy leve (gerado uma vez); cai para o arquivo original se o FFmpeg falhar.
+    `on_demand`: a saída muda a cada render, então o proxy só é gerado quando o usuário pede.
+    `subtitles`: SRT exibido pelo player (o proxy não leva a faixa mov_text da saída sem re-encode).
+    """
+    proxy = proxy_path(video_path)
+    fresh = os.path.exists(proxy) and os.path.getmtime(proxy) >= os.path.getmtime(video_path)
+    if not fresh and on_demand and not st.button("🎞️ Gerar prévia", key=f"preview_{video_path}"): return
+    try:
+        if not fresh:
+            with st.spinner("Gerando prévia leve..."): preview = ensure_preview_proxy(video_path)
+        else: preview = proxy
+    except Exception: preview = video_path
+    if subtitles: st.video(preview, subtitles=subtitles)
+    else: st.video(preview)
 
 # =========================
 # Google Drive Service
@@ -278,12 +172,13 @@ def list_videos_ready(service):
     except Exception as e: st.error(f"Erro inesperado ao listar vídeos: {e}"); return []
     return videos
 
-# NOVO: Função para download
+# Download em blocos direto para o disco (progresso, retomada e faixas paralelas)
 def download_video(service, file_id, filename):
     if not service: return None
-    request = service.files().get_media(fileId=file_id)
-    with open(filename, "wb") as f:
-        f.write(request.execute())
+    bar = st.progress(0, text="Baixando vídeo...")
+    def _progress(got, total):
+        if total: bar.progress(min(1.0, got / total), text=f"Baixando vídeo... {got / 1024 ** 2:.1f} / {total / 1024 ** 2:.1f} MB")
+    download_to_file(service, file_id, filename, progress=_progress)
     return filename
 
 # =========================
@@ -303,24 +198,23 @@ def get_job_roteiro(job_id: str) -> Optional[Dict[str, Any]]:
 # =========================
 # Whisper Transcription
 # =========================
-def transcribe_audio(video_path, model_size="tiny"):
-    """Transcreve áudio e retorna conteúdo SRT e segmentos."""
-    if whisper is None: st.error("Biblioteca 'whisper' não instalada."); return None, None
+def transcribe_audio(video_path, model_size="tiny", use_cache=True, backend=DEFAULT_BACKEND):
+    """Transcreve áudio e retorna conteúdo SRT e segmentos (reaproveita o cache pelo hash do áudio)."""
+    if backend not in available_backends(): st.error(f"Backend de ASR '{backend}' não instalado."); return None, None
     try:
-        audio_path = "temp_audio.wav"; st.info("Extraindo áudio...")
-        # Adicionado -loglevel error para reduzir a saída do FFmpeg
-        run_cmd(["ffmpeg", "-y", "-i", video_path, "-vn", "-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1", audio_path])
-        st.info(f"Carregando modelo Whisper ({model_size})...")
-        model = whisper.load_model(model_size, device="cpu"); st.info("Transcrevendo...")
-        result = model.transcribe(audio_path, language="pt"); segments = result['segments']
+        st.info("Extraindo áudio...")
+        # PCM 16 kHz direto da stdout do ffmpeg: sem arquivo fixo compartilhado entre sessões
+        audio = extract_pcm(video_path)
+        st.info(f"Transcrevendo ({len(audio) / 16000:.0f}s de áudio, até {WHISPER_WORKERS} processos em paralelo)...")
+        segments, from_cache = transcribe_cached(audio, model_size, language="pt", word_timestamps=True, use_cache=use_cache, backend=backend)
+        if from_cache: st.info("⚡ Transcrição recuperada do cache.")
         
         srt_content = "";
         for i, seg in enumerate(segments):
             start = format_timestamp(seg['start']); end = format_timestamp(seg['end']); text = seg['text'].strip()
             # Esta seção não é usada para a geração final, mas é o fallback
             srt_content += f"{i+1}\n{start} --> {end}\n{text}\n\n"
-            
-        if os.path.exists(audio_path): os.remove(audio_path)
+
         return srt_content, segments
     except Exception as e:
         st.error(f"Erro Transcrição: {e}"); return None, None
@@ -328,11 +222,11 @@ def transcribe_audio(video_path, model_size="tiny"):
 # =========================
 # Upload Final
 # =========================
-def upload_legendado_to_gas(video_path, original_name):
+def upload_legendado_to_gas(video_path, original_name, source_id=None):
     try:
         with open(video_path, "rb") as f: video_bytes = f.read()
         video_b64 = base64.b64encode(video_bytes).decode('utf-8')
-        payload = {"action": "upload_video", "job_id": "LEGENDADO_" + str(int(time.time())), "video_data": video_b64, "filename": f"LEGENDADO_{original_name}", "meta_data": {"status": "LEGENDADO", "processed_at": datetime.now().isoformat()}}
+        payload = {"action": "upload_video", "job_id": legendado_job_id(source_id, original_name), "video_data": video_b64, "filename": f"LEGENDADO_{original_name}", "meta_data": {"status": "LEGENDADO", "processed_at": datetime.now().isoformat()}}
         response = requests.post(GAS_SCRIPT_URL, json=payload, timeout=300)
         if response.status_code == 200: 
             res = response.json()
@@ -340,6 +234,28 @@ def upload_legendado_to_gas(video_path, original_name):
         return False, f"HTTP {response.status_code}"
     except Exception as e: return False, str(e)
 
+# =========================
+# Lote em segundo plano
+# =========================
+def show_batch(lote):
+    total, done = lote["total"], lote["done"]
+    label = f"Lote: {done}/{total}" if total else "Lote: procurando vídeos pendentes..."
+    if lote["error"]: state, label = "error", f"Erro no lote: {lote['error']}"
+    elif lote["running"]: state = "running"
+    else: state, label = "complete", f"{sum(1 for r in lote['results'] if r['ok'])}/{total or 0} vídeos legendados."
+    with st.status(label, state=state, expanded=lote["running"]):
+        if total: st.progress(done / total)
+        for m in lote["log"][-12:]: st.write(m)
+    for r in lote["results"]:
+        if not r["ok"]: st.caption(f"❌ {r['name']}: {r['error']}")
+
+@st.fragment(run_every=2)
+def show_batch_live():
+    """Enquanto o lote roda só este trecho se atualiza; o editor continua livre."""
+    lote = batch_state()
+    show_batch(lote)
+    if not lote["running"]: st.rerun()  # Terminou: volta ao painel estático (sem refresh)
+
 # =========================
 # Interface Principal
 # =========================
@@ -352,12 +268,16 @@ def main():
     if "video_id" not in st.session_state: st.session_state.video_id = None
     if "video_name" not in st.session_state: st.session_state.video_name = ""
     if "final_video_path" not in st.session_state: st.session_state.final_video_path = None
+    if "final_subs_path" not in st.session_state: st.session_state.final_subs_path = None  # SRT da saída em faixa (prévia)
     if "drive_connected_via_secrets" not in st.session_state: st.session_state.drive_connected_via_secrets = False
     if "job_id" not in st.session_state: st.session_state.job_id = None
     if "roteiro_data" not in st.session_state: st.session_state.roteiro_data = None
-    if "overlay_settings" not in st.session_state: st.session_state["overlay_settings"] = load_config()
+    if "last_burn" not in st.session_state: st.session_state.last_burn = None
+    if "overlay_settings" not in st.session_state: st.session_state["overlay_settings"] = load_style_settings()
 
     sets = st.session_state["overlay_settings"]
+    sid, _ = current_session_workspace()  # Pasta isolada desta sessão (cotas + limpeza ao encerrar)
+    warm_up_models()  # Pré-carrega o Whisper em background (uma vez por processo)
     
     # --- BARRA LATERAL: FONTES E CONFIGURAÇÃO ---
     st.sidebar.header("📂 Fonte do Arquivo")
@@ -367,7 +287,7 @@ def main():
     st.sidebar.header("🅰️ Configuração de Fonte")
     
     # Verificação se a fonte personalizada está selecionada
-    is_custom_font_selected = sets.get("font_style") == "Upload Personalizada"
+    is_custom_font_selected = sets.get("font_style") == FONT_CUSTOM
     
     font_up = st.sidebar.file_uploader("Upload de Fonte (.ttf)", type=["ttf"])
     if font_up:
@@ -383,10 +303,16 @@ def main():
             st.sidebar.info("Fonte removida.")
             # Se a fonte removida estava selecionada, reverter para Padrão
             if is_custom_font_selected:
-                sets["font_style"] = "Padrão (Arial)"
+                sets["font_style"] = FONT_DEFAULT
                 save_config(sets)
             st.rerun()
 
+    st.sidebar.markdown("---")
+    tc = transcript_cache_stats()
+    st.sidebar.caption(f"Cache de transcrição: {tc['entries']} itens ({tc['bytes'] / 1024 ** 2:.1f} MB)")
+    if st.sidebar.button("Limpar Cache de Transcrição"):
+        clear_transcript_cache(); st.rerun()
+
     # --- OPÇÃO 1: GOOGLE DRIVE ---
     if source_option == "Google Drive":
         st.sidebar.markdown("---"); st.sidebar.caption("Conexão com Drive")
@@ -417,8 +343,9 @@ def main():
                     extracted_job_id = match.group(1) if match else None
 
                     with st.status("Baixando...", expanded=True) as status:
-                        local_path = f"temp_{vid_id}.mp4"
-                        # CORREÇÃO: Chama a função download_video
+                        local_path = os.path.join(job_dir(sid, f"video_{vid_id}"), "original.mp4")
+                        try: reserve(sid, (file_size(drive_service, vid_id) or 0) / 1024 ** 2, keep=[st.session_state.current_video_path, st.session_state.final_video_path])
+                        except WorkspaceQuotaError as e: status.update(label=str(e), state="error"); st.stop()
                         download_video(drive_service, vid_id, local_path) 
                         
                         st.session_state.current_video_path = local_path; st.session_state.video_id = vid_id; st.session_state.video_name = sel_vid; st.session_state.srt_content = ""; st.session_state.final_video_path = None
@@ -430,6 +357,16 @@ def main():
                             st.session_state.job_id = None; st.session_state.roteiro_data = None; st.warning("Job ID não encontrado no nome do arquivo.")
 
                         status.update(label="Pronto!", state="complete"); st.rerun()
+            # --- LOTE: todos os vídeos prontos sem versão legendada ---
+            with st.sidebar.expander("🗂️ Legendar Todos (Lote)"):
+                lote_mode = st.radio("Saída do lote", ["burn", "soft"], format_func=lambda m: OUTPUT_BURN if m == "burn" else OUTPUT_SOFT, key="lote_mode")
+                lote_whisper = st.checkbox("Refinar com Whisper", value=False, key="lote_whisper")
+                lote = batch_state()
+                if st.button("▶️ Processar Pendentes", disabled=bool(lote and lote["running"])):
+                    start_batch(drive_service, lote_mode, lote_whisper); st.rerun()
+                lote = batch_state()
+                if lote and lote["running"]: show_batch_live()
+                elif lote: show_batch(lote)
         else: st.sidebar.error("Drive não conectado. Configure secrets ou faça upload.")
 
     # --- OPÇÃO 2: UPLOAD LOCAL ---
@@ -438,7 +375,9 @@ def main():
         if uploaded_video:
             if st.session_state.video_name != uploaded_video.name:
                 with st.status("Processando upload...", expanded=True) as status:
-                    local_path = f"temp_local_{int(time.time())}.mp4"
+                    local_path = os.path.join(job_dir(sid, f"upload_{int(time.time())}"), "original.mp4")
+                    try: reserve(sid, uploaded_video.size / 1024 ** 2, keep=[st.session_state.current_video_path, st.session_state.final_video_path])
+                    except WorkspaceQuotaError as e: status.update(label=str(e), state="error"); st.stop()
                     with open(local_path, "wb") as f: f.write(uploaded_video.getbuffer())
                     st.session_state.current_video_path = local_path; st.session_state.video_id = "local_upload"; st.session_state.video_name = uploaded_video.name; st.session_state.srt_content = ""; st.session_state.final_video_path = None; st.session_state.job_id = None; st.session_state.roteiro_data = None
                     status.update(label="Vídeo carregado!", state="complete"); st.rerun()
@@ -448,22 +387,62 @@ def main():
     if st.session_state.current_video_path and os.path.exists(st.session_state.current_video_path):
         c1, c2 = st.columns([1, 1])
         with c1:
-            st.subheader("📺 Original"); st.video(st.session_state.current_video_path)
+            st.subheader("📺 Original"); show_preview(st.session_state.current_video_path)
             st.divider(); st.subheader("Ferramentas de Transcrição")
             c_ia1, c_ia2 = st.columns([1,1])
-            with c_ia1: mod = st.selectbox("Modelo IA", ["tiny", "base"], help="Tiny é mais rápido.")
+            with c_ia1:
+                backends = available_backends() or [DEFAULT_BACKEND]
+                backend = st.selectbox("Motor de ASR", backends, index=backends.index(DEFAULT_BACKEND) if DEFAULT_BACKEND in backends else 0,
+                                       format_func=lambda b: ASR_BACKENDS[b]["label"], help="int8 roda modelos maiores com a latência do tiny em fp32.")
+                mod = st.selectbox("Modelo IA", ASR_BACKENDS[backend]["sizes"], help="Tiny é mais rápido.")
+                ms = models_status()
+                key = model_key(mod, backend)
+                info = ms["loaded"].get(key)
+                if info:
+                    mem = f"{info['params_mb']} MB de pesos" if info.get("params_mb") else f"+{info.get('rss_delta_mb')} MB de RAM"
+                    st.caption(f"✅ Em memória ({mem}, carregado em {info['load_s']}s)")
+                elif key in ms["loading"]: st.caption("⏳ Pré-carregando em background...")
+                elif key in ms["errors"]: st.caption(f"⚠️ Pré-carga falhou ({ms['errors'][key]}); nova tentativa no primeiro uso.")
+                else: st.caption("💤 Será carregado no primeiro uso.")
+                run = ms["runs"].get(key)
+                if run and run.get("rtf") is not None:
+                    extra = f", {run['worker_rss_mb']:.0f} MB por worker" if run.get("worker_rss_mb") else ""
+                    st.caption(f"⏱️ RTF {run['rtf']:.2f} ({run['audio_s']:.0f}s de áudio em {run['wall_s']:.1f}s, {run['workers']} processo(s){extra})")
+                if ms["rss_mb"]: st.caption(f"Memória do processo: {ms['rss_mb']:.0f} MB")
+                use_cache = st.checkbox("Usar cache de transcrição", value=True, help="Mesmo áudio + modelo reaproveita o resultado anterior.")
             
             with c_ia2:
                 st.write("")
                 
                 if st.session_state.roteiro_data:
+                    # TIMING SEM WHISPER: duração conhecida do áudio de cada bloco
+                    if has_block_audio(st.session_state.roteiro_data):
+                        if has_tts_timings(st.session_state.roteiro_data):
+                            st.caption("🎯 Tempo de cada palavra registrado pelo TTS: sem Whisper.")
+                            refine = False
+                        else: refine = st.checkbox("Refinar com Whisper", value=False, help="Ajusta as palavras reconhecidas; as demais mantêm o timing dos blocos.")
+                        if st.button("⚡ Timing pelos Blocos", type="primary"):
+                            with st.status("Calculando timing pelos áudios dos blocos...", expanded=True) as status:
+                                timeline = get_job_block_timeline(st.session_state.roteiro_data)
+                                segments = None
+                                if refine:
+                                    _, segments = transcribe_audio(st.session_state.current_video_path, mod, use_cache, backend)
+                                    if not segments: st.warning("Whisper falhou; usando apenas o timing dos blocos.")
+                                srt_content = blocks_to_srt(timeline, segments, max_words=4)
+                                if srt_content:
+                                    st.session_state.srt_content = srt_content
+                                    status.update(label="SRT gerado pelos blocos!", state="complete")
+                                    st.rerun()
+                                else:
+                                    status.update(label="Assets de áudio sem duração legível.", state="error")
+
                     # GERAÇÃO PERFEITA
-                    if st.button("✨ Gerar Timing (Whisper)", type="primary"):
+                    if st.button("✨ Gerar Timing (Whisper)", type="secondary" if has_block_audio(st.session_state.roteiro_data) else "primary"):
                         full_text = get_full_roteiro_text(st.session_state.roteiro_data)
                         if not full_text: st.error("Roteiro vazio. Use o Fallback."); st.stop()
                         
                         with st.status("1. Transcrevendo áudio para TIMING...", expanded=True) as status:
-                            srt_dummy, segments = transcribe_audio(st.session_state.current_video_path, mod)
+                            srt_dummy, segments = transcribe_audio(st.session_state.current_video_path, mod, use_cache, backend)
                         
                         if segments:
                             with st.status("2. Mapeando Texto Perfeito para o Timing em Blocos Curtos...", expanded=True) as status:
@@ -479,7 +458,7 @@ def main():
                     # Botão de fallback
                     if st.button("Transcrever Áudio (Fallback)"):
                         with st.status("Transcrevendo...", expanded=True) as status:
-                            srt, _ = transcribe_audio(st.session_state.current_video_path, mod)
+                            srt, _ = transcribe_audio(st.session_state.current_video_path, mod, use_cache, backend)
                             if srt: 
                                 st.session_state.srt_content = srt
                                 status.update(label="Transcrição Gerada!", state="complete")
@@ -491,7 +470,7 @@ def main():
                 else: # Upload local ou Job ID não encontrado
                     if st.button("✨ Gerar Legendas"):
                         with st.status("Transcrevendo...", expanded=True) as status:
-                            srt, _ = transcribe_audio(st.session_state.current_video_path, mod)
+                            srt, _ = transcribe_audio(st.session_state.current_video_path, mod, use_cache, backend)
                             if srt: 
                                 st.session_state.srt_content = srt
                                 status.update(label="Transcrição Gerada!", state="complete")
@@ -522,7 +501,7 @@ def main():
                 col_s1, col_s2, col_s3 = st.columns(3)
                 with col_s1:
                     # Permite selecionar a fonte
-                    sets["font_style"] = st.selectbox("Fonte", ["Padrão (Arial)", "Upload Personalizada"], index=0 if sets.get("font_style") == "Padrão (Arial)" or not os.path.exists(SAVED_FONT_FILE) else 1)
+                    sets["font_style"] = st.selectbox("Fonte", [FONT_DEFAULT, FONT_CUSTOM], index=0 if sets.get("font_style") == FONT_DEFAULT or not os.path.exists(SAVED_FONT_FILE) else 1)
                     sets["f_size"] = st.slider("Tamanho", 10, 100, sets.get("f_size", 60))
                 with col_s2:
                     # Ajuste a Margem V. para centralizar melhor a única linha
@@ -534,33 +513,71 @@ def main():
                 
                 if st.button("💾 Salvar Estilos"):
                     if save_config(sets): st.success("Estilos salvos!")
+
+                # --- PRÉVIA DE ESTILO (poucos quadros, mesmo force_style e SRT do render) ---
+                c_pv1, c_pv2 = st.columns([2, 1])
+                with c_pv1:
+                    pv_times = st.text_input("Instantes da prévia (s)", ", ".join(f"{t:g}" for t in preview_times(st.session_state.srt_content)))
+                with c_pv2:
+                    st.write("")
+                    do_preview = st.button("👁️ Prévia do Estilo")
+                if do_preview:
+                    try: times = [float(x) for x in re.split(r"[,;\s]+", pv_times.strip()) if x]
+                    except ValueError: times = []
+                    if not times: st.warning("Informe instantes em segundos, separados por vírgula.")
+                    else:
+                        srt_path = os.path.join(os.path.dirname(st.session_state.current_video_path), "previa.srt")
+                        with open(srt_path, "w", encoding="utf-8") as f: f.write(st.session_state.srt_content)
+                        try:
+                            frames = render_style_frames(st.session_state.current_video_path, srt_path, build_force_style(resolve_font(sets["font_style"]), sets), times[:6])
+                            cols = st.columns(len(frames))
+                            for col, (t, png) in zip(cols, frames): col.image(png, caption=f"{t:g}s", use_container_width=True)
+                        except subprocess.CalledProcessError as e: st.error(f"Erro FFmpeg: {e.stderr.decode(errors='ignore')}")
                 
                 # --- RENDERIZAÇÃO ---
+                out_mode = st.radio("Saída", OUTPUT_MODES, horizontal=True, help="Faixa de legenda: copia vídeo e áudio sem re-encode (segundos, sem perda). Queimar: para plataformas que não exibem faixas de legenda.")
+                incremental = st.checkbox("Re-queimar só os trechos alterados", value=True, disabled=out_mode != OUTPUT_BURN or not st.session_state.last_burn,
+                                          help="Depois do primeiro render, correções re-encodam apenas os GOPs das legendas editadas.")
                 if st.button("🔥 Renderizar Final", type="primary"):
                     with st.status("Renderizando...") as status:
-                        srt_path = "temp.srt"
+                        # Tudo na pasta do vídeo dentro da sessão: nada de nomes fixos compartilhados
+                        work = os.path.dirname(st.session_state.current_video_path)
+                        srt_path = os.path.join(work, "legendas.srt")
                         with open(srt_path, "w", encoding="utf-8") as f: 
                             f.write(st.session_state.srt_content)
-                        
-                        font_path = resolve_font(sets["font_style"])
-                        
-                        # CORREÇÃO DA FONTE: Se for upload personalizada, usa o caminho completo
-                        if sets["font_style"] == "Upload Personalizada" and os.path.exists(font_path):
-                            font_name_for_style = font_path # Usa o caminho absoluto
+                        out_vid = os.path.join(work, "legendado.mp4")
+
+                        if out_mode == OUTPUT_SOFT:
+                            try:
+                                run_cmd(build_soft_sub_cmd(st.session_state.current_video_path, srt_path, out_vid))
+                                st.session_state.final_video_path = out_vid; st.session_state.last_burn = None  # Sobrescreveu a saída queimada
+                                st.session_state.final_subs_path = srt_path
+                                status.update(label="Legenda embutida como faixa!", state="complete")
+                            except: status.update(label="Erro!", state="error")
                         else:
-                            font_name_for_style = font_path # Usa o nome (e.g., "Padrão (Arial)")
-
-                        ass_c = hex_to_ass_color(sets["color"]); ass_b = hex_to_ass_color(sets["border"])
-                        
-                        # Outline ajustado para 2 (borda mais fina)
-                        style = f"Fontname={font_name_for_style},FontSize={sets['f_size']},PrimaryColour={ass_c},OutlineColour={ass_b},BackColour=&H80000000,BorderStyle=1,Outline=2,Shadow=0,Alignment=2,MarginV={sets['margin_v']}"
-                        
-                        out_vid = f"legendado_{st.session_state.video_id}.mp4"
-                        cmd = ["ffmpeg", "-y", "-i", st.session_state.current_video_path, "-vf", f"subtitles={srt_path}:force_style='{style}'", "-c:a", "copy", "-c:v", "libx264", "-preset", "fast", "-crf", "23", out_vid]
-                        
-                        try:
-                            run_cmd(cmd); st.session_state.final_video_path = out_vid; status.update(label="Sucesso!", state="complete")
-                        except: status.update(label="Erro!", state="error")
+                            style = build_force_style(resolve_font(sets["font_style"]), sets)
+                            st.session_state.final_subs_path = None
+
+                            src = st.session_state.current_video_path
+                            last = st.session_state.last_burn
+                            # Mesma fonte e mesmo estilo: re-encoda só os GOPs das legendas alteradas
+                            if incremental and last and last["source"] == src and last["style"] == style and os.path.exists(last["out"]):
+                                try:
+                                    stats = incremental_burn(src, last["out"], last["srt"], st.session_state.srt_content, srt_path, style, out_vid, work)
+                                    if stats is not None:
+                                        st.session_state.last_burn = {"source": src, "style": style, "srt": st.session_state.srt_content, "out": out_vid}
+                                        st.session_state.final_video_path = out_vid
+                                        status.update(label=f"Atualizado! Re-encodados {stats['reencoded_s']:.1f}s de {stats['duration_s']:.0f}s ({len(stats['ranges'])} trecho(s)).", state="complete")
+                                        out_vid = None
+                                    else: st.info("Muitas alterações: fazendo o render completo.")
+                                except Exception as e: st.warning(f"Re-render incremental falhou ({e}); fazendo o render completo.")
+
+                            if out_vid:
+                                try:
+                                    run_cmd(full_burn_cmd(src, srt_path, style, out_vid)); st.session_state.final_video_path = out_vid
+                                    st.session_state.last_burn = {"source": src, "style": style, "srt": st.session_state.srt_content, "out": out_vid}
+                                    status.update(label="Sucesso!", state="complete")
+                                except: status.update(label="Erro!", state="error")
             else:
                 if st.session_state.roteiro_data: st.info("O roteiro foi carregado! Use 'Gerar Timing (Whisper)' para gerar o SRT perfeito.")
                 else: st.info("Gere as legendas para começar a edição.")
@@ -568,12 +585,16 @@ def main():
         if st.session_state.final_video_path and os.path.exists(st.session_state.final_video_path):
             st.divider(); st.success("Finalizado!")
             c_fin1, c_fin2 = st.columns([1.5, 1])
-            with c_fin1: st.video(st.session_state.final_video_path)
+            with c_fin1:
+                subs = st.session_state.final_subs_path
+                if subs and os.path.exists(subs):  # Faixa de legenda: vídeo = original, cujo proxy já existe
+                    show_preview(st.session_state.current_video_path, subtitles=subs)
+                else: show_preview(st.session_state.final_video_path, on_demand=True)
             with c_fin2:
                 with open(st.session_state.final_video_path, "rb") as f: st.download_button("💾 Baixar MP4", f, f"legendado_{st.session_state.video_name}", mime="video/mp4")
                 if st.button("☁️ Enviar p/ Drive"):
                     with st.spinner("Enviando..."):
-                        ok, msg = upload_legendado_to_gas(st.session_state.final_video_path, st.session_state.video_name)
+                        ok, msg = upload_legendado_to_gas(st.session_state.final_video_path, st.session_state.video_name, st.session_state.video_id)
                         if ok: st.success("Enviado!")
                         else: st.error(f"Erro: {msg}")
 
@@ -0,0 +1,164 @@
+# fontes.py — Medida e quebra de texto pela largura real dos glifos
+# Tabela de avanço por (fonte, tamanho) montada uma vez e cacheada: medir uma linha vira uma
+# consulta vetorizada no NumPy, sem reabrir a fonte nem chamar o FreeType a cada preview/render.
+# A quebra é gulosa (como o textwrap) ou ótima (linhas equilibradas, mínimo da soma das sobras²).
+# Fontes enviadas pelo usuário ficam gravadas uma vez por hash do conteúdo (caminho estável).
+import os
+import hashlib
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import ImageFont
+
+FONT_STORE_DIR = os.getenv("FONT_STORE_DIR", "fontes_upload")
+TABLE_SIZE = 0x250  # Latin-1 + Latin Extended-A/B: todo o português; o resto é medido sob demanda
+FONT_CACHE_SIZE = 64
+WRAP_GREEDY = "greedy"
+WRAP_OPTIMAL = "optimal"
+
+
+_registry_lock = threading.Lock()
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+# =========================
+# Registro de fontes por conteúdo
+# =========================
+def register_font_bytes(data: bytes, suffix: str = ".ttf") -> str:
+    """Grava a fonte em FONT_STORE_DIR/<sha256>.ttf só na primeira vez; o mesmo conteúdo dá sempre o mesmo caminho."""
+    path = os.path.abspath(os.path.join(FONT_STORE_DIR, hashlib.sha256(data).hexdigest()[:24] + suffix))
+    if os.path.exists(path): return path
+    with _registry_lock:
+        if not os.path.exists(path):
+            os.makedirs(FONT_STORE_DIR, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f: f.write(data)
+            os.replace(tmp, path)
+    return path
+
+
+def register_font_file(path: str) -> Optional[str]:
+    """Fonte salva num caminho fixo (reescrita a cada upload): resolve para o caminho do conteúdo atual."""
+    try: st_ = os.stat(path)
+    except OSError: return None
+    key = (os.path.abspath(path), st_.st_mtime_ns, st_.st_size)
+    if key not in _file_hashes:
+        with open(path, "rb") as f: _file_hashes[key] = register_font_bytes(f.read(), os.path.splitext(path)[1] or ".ttf")
+    return _file_hashes[key]
+
+
+def register_upload(upload: Any) -> Optional[str]:
+    """UploadedFile/BytesIO do Streamlit -> caminho estável (sem NamedTemporaryFile por chamada)."""
+    if upload is None: return None
+    data = upload.getvalue()
+    return register_font_bytes(data, os.path.splitext(getattr(upload, "name", "") or "")[1].lower() or ".ttf") if data else None
+
+
+# =========================
+# Medida
+# =========================
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def load_font(font_path: Optional[str], size: int):
+    """ImageFont em LRU por (caminho, tamanho); fonte padrão do Pillow se o arquivo não abrir.
+    Caminhos do registro mudam com o conteúdo, então a entrada nunca fica desatualizada."""
+    if font_path:
+        try: return ImageFont.truetype(font_path, size)
+        except Exception: pass
+    try: return ImageFont.load_default(size)
+    except TypeError: return ImageFont.load_default()  # Pillow < 10.1 (sem tamanho)
+
+
+def _measure(font, ch: str) -> float:
+    try: return float(font.getlength(ch))
+    except Exception: return float(font.getsize(ch)[0]) if hasattr(font, "getsize") else 0.0
+
+
+@lru_cache(maxsize=FONT_CACHE_SIZE)
+def advance_table(font_path: Optional[str], size: int) -> Tuple[object, np.ndarray, Dict[int, float]]:
+    """(fonte, avanço de cada código < TABLE_SIZE, avanços medidos sob demanda fora da tabela)."""
+    font = load_font(font_path, size)
+    return font, np.array([_measure(font, chr(c)) for c in range(TABLE_SIZE)], dtype=np.float32), {}
+
+
+_extra_lock = threading.Lock()
+
+
+def _widths(font_path: Optional[str], size: int, codes: np.ndarray) -> np.ndarray:
+    font, table, extra = advance_table(font_path, size)
+    out = np.zeros(len(codes), dtype=np.float32)
+    inside = codes < TABLE_SIZE
+    out[inside] = table[codes[inside]]
+    for i in np.flatnonzero(~inside):
+        c = int(codes[i])
+        if c not in extra:
+            with _extra_lock: extra.setdefault(c, _measure(font, chr(c)))
+        out[i] = extra[c]
+    return out
+
+
+def _codes(text: str) -> np.ndarray:
+    return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def text_width(text: str, font_path: Optional[str], size: int) -> float:
+    """Largura em pixels (soma dos avanços; sem kerning, diferença de poucos px numa linha)."""
+    if not text: return 0.0
+    return float(_widths(font_path, size, _codes(text)).sum())
+
+
+def word_widths(words: List[str], font_path: Optional[str], size: int) -> Tuple[np.ndarray, float]:
+    """Largura de cada palavra (uma única consulta para o texto todo) e a largura do espaço."""
+    space = float(_widths(font_path, size, _codes(" "))[0])
+    if not words: return np.zeros(0, dtype=np.float32), space
+    cum = np.concatenate(([0.0], np.cumsum(_widths(font_path, size, _codes("".join(words))), dtype=np.float64)))
+    lens = np.array([len(w) for w in words])
+    ends = np.cumsum(lens)
+    return (cum[ends] - cum[ends - lens]).astype(np.float32), space
+
+
+def _greedy(widths: np.ndarray, space: float, max_width: float) -> List[int]:
+    """Índices de início de cada linha."""
+    starts, cur = [0], 0.0
+    for i, w in enumerate(widths):
+        if i > starts[-1] and cur + space + w > max_width:
+            starts.append(i); cur = w
+        else: cur = w if i == starts[-1] else cur + space + w
+    return starts
+
+
+def _optimal(widths: np.ndarray, space: float, max_width: float) -> List[int]:
+    """Programação dinâmica: mínimo da soma das sobras² (a última linha não paga sobra)."""
+    n = len(widths)
+    cum = np.concatenate(([0.0], np.cumsum(widths + space, dtype=np.float64)))
+    cost = np.full(n + 1, np.inf); cost[n] = 0.0
+    nxt = np.full(n + 1, n, dtype=np.int64)
+    for i in range(n - 1, -1, -1):
+        line = cum[i + 1:] - cum[i] - space  # largura das linhas i..j para todo j
+        fit = np.flatnonzero(line <= max_width)
+        js = fit if len(fit) else np.array([0])  # Palavra maior que a linha: fica sozinha
+        slack = (max_width - line[js]) ** 2
+        slack[js + i + 1 == n] = 0.0
+        total = slack + cost[js + i + 1]
+        k = int(np.argmin(total))
+        cost[i], nxt[i] = total[k], js[k] + i + 1
+    starts, i = [], 0
+    while i < n: starts.append(i); i = int(nxt[i])
+    return starts
+
+
+def wrap_lines(text: str, font_path: Optional[str], size: int, max_width: float, mode: str = WRAP_GREEDY) -> List[str]:
+    """Quebra em linhas que cabem em `max_width` px. Quebras de linha do texto são mantidas."""
+    lines = []
+    for para in (text or "").split("\n"):
+        words = para.split()
+        if not words: continue
+        widths, space = word_widths(words, font_path, size)
+        starts = (_optimal if mode == WRAP_OPTIMAL else _greedy)(widths, space, max_width) + [len(words)]
+        lines.extend(" ".join(words[a:b]) for a, b in zip(starts, starts[1:]))
+    return lines
+
+
+def wrap_text(text: str, font_path: Optional[str], size: int, max_width: float, mode: str = WRAP_GREEDY) -> str:
+    return "\n".join(wrap_lines(text, font_path, size, max_width, mode))
@@ -1,6 +1,5 @@
 import streamlit as st
-import os
-import json
+import banco_dados as db
 
 # Configuração da Página Inicial
 st.set_page_config(
@@ -63,25 +62,16 @@ st.markdown("""
 st.markdown('<h1 class="main-header">Monetiza Studio</h1>', unsafe_allow_html=True)
 st.markdown('<p class="sub-header">Central de Automação de Vídeos Litúrgicos</p>', unsafe_allow_html=True)
 
-# Métricas Rápidas (Lendo dos arquivos JSON da raiz)
+# Métricas Rápidas (Lendo do banco SQLite compartilhado)
 col_m1, col_m2 = st.columns(2)
 
 total_chars = 0
 last_history = "Nenhum"
 
-if os.path.exists("characters_db.json"):
-    try:
-        with open("characters_db.json", "r") as f:
-            chars = json.load(f)
-            total_chars = len(chars) + 2 # +2 fixos
-    except: pass
-
-if os.path.exists("history_db.json"):
-    try:
-        with open("history_db.json", "r") as f:
-            hist = json.load(f)
-            if hist: last_history = hist[-1]
-    except: pass
+try:
+    total_chars = db.count_characters() + 2 # +2 fixos
+    last_history = db.last_history() or "Nenhum"
+except: pass
 
 with col_m1:
     st.metric("Personagens no Banco", total_chars)
@@ -0,0 +1,331 @@
+# legenda_render.py — Queima de legendas com FFmpeg (render completo e re-render incremental)
+# Corrigir uma legenda não deve re-encodar o vídeo inteiro: só os GOPs que cobrem as legendas
+# alteradas são re-encodados a partir do original e emendados na saída anterior com stream copy.
+import os
+import re
+import json
+import bisect
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+X264_ARGS = ["-c:v", "libx264", "-preset", "fast", "-crf", "23"]
+MAX_INCREMENTAL_FRACTION = 0.5  # Acima disso um render completo sai mais barato que emendar pedaços
+# Proxy de pré-visualização: o navegador recebe um MP4 leve, o render usa sempre o original
+PROXY_MAX_SIDE = 640
+PROXY_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "30", "-maxrate", "700k", "-bufsize", "1400k",
+              "-c:a", "aac", "-b:a", "64k", "-ac", "1", "-movflags", "+faststart"]
+
+Cue = Tuple[float, float, str]
+
+# Configuração compartilhada pelo editor (editor_legendas.py) e pelo lote (legendas_lote.py)
+GAS_SCRIPT_URL = "https://script.google.com/macros/s/AKfycbx5DZ52ohxKPl6Lh0DnkhHJejuPBx1Ud6B10Ag_xfnJVzGpE83n7gHdUHnk4yAgrpuidw/exec"
+MONETIZA_DRIVE_FOLDER_VIDEOS = "Monetiza_Studio_Videos_Finais"
+MONETIZA_DRIVE_FOLDER_LEGENDADOS = "Monetiza_Studio_Videos_Legendados"
+CONFIG_FILE = "legendas_config.json"
+SAVED_FONT_FILE = "saved_custom_font.ttf"
+FONT_DEFAULT = "Padrão (Arial)"
+FONT_CUSTOM = "Upload Personalizada"
+DEFAULT_STYLE = {"f_size": 60, "margin_v": 250, "color": "#FFFF00", "border": "#000000", "font_style": FONT_DEFAULT}
+
+
+# =========================
+# SRT
+# =========================
+def srt_time(ts: str) -> float:
+    h, m, rest = ts.strip().replace(".", ",").split(":")
+    s, ms = (rest.split(",") + ["0"])[:2]
+    return int(h) * 3600 + int(m) * 60 + int(s) + int(ms.ljust(3, "0")[:3]) / 1000.0
+
+
+def parse_srt(text: str) -> List[Cue]:
+    cues = []
+    for block in re.split(r"\n\s*\n", (text or "").replace("\r", "").strip()):
+        lines = block.split("\n")
+        idx = next((i for i, l in enumerate(lines) if "-->" in l), None)
+        if idx is None: continue
+        try:
+            a, b = lines[idx].split("-->")
+            cues.append((srt_time(a), srt_time(b.split()[0]), "\n".join(lines[idx + 1:]).strip()))
+        except (ValueError, IndexError): continue
+    return cues
+
+
+def merge_ranges(ranges: List[Tuple[float, float]], gap: float = 0.0) -> List[Tuple[float, float]]:
+    out: List[Tuple[float, float]] = []
+    for a, b in sorted(ranges):
+        if out and a <= out[-1][1] + gap: out[-1] = (out[-1][0], max(out[-1][1], b))
+        else: out.append((a, b))
+    return out
+
+
+def changed_ranges(old_srt: str, new_srt: str) -> List[Tuple[float, float]]:
+    """Intervalos de tempo cujo conteúdo de legenda difere entre os dois SRTs (cues removidas ou novas)."""
+    old, new = set(parse_srt(old_srt)), set(parse_srt(new_srt))
+    return merge_ranges([(a, b) for a, b, _ in old.symmetric_difference(new)])
+
+
+# =========================
+# Probe
+# =========================
+def probe_duration(path: str) -> float:
+    r = subprocess.run(["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", path],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return float(r.stdout.decode().strip())
+
+
+def probe_keyframes(path: str) -> List[float]:
+    """Tempos dos keyframes do vídeo, lidos dos pacotes (sem decodificar)."""
+    r = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    kfs = set()
+    for line in r.stdout.decode().splitlines():
+        parts = line.split(",")
+        if len(parts) >= 2 and "K" in parts[1]:
+            try: kfs.add(round(float(parts[0]), 6))
+            except ValueError: continue
+    return sorted(kfs)
+
+
+def probe_timescale(path: str) -> Optional[int]:
+    r = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=time_base", "-of", "csv=p=0", path],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    m = re.search(r"1/(\d+)", r.stdout.decode())
+    return int(m.group(1)) if m else None
+
+
+def gop_ranges(ranges: List[Tuple[float, float]], keyframes: List[float], duration: float) -> List[Tuple[float, float]]:
+    """Expande cada intervalo até os keyframes que o envolvem (início no keyframe anterior, fim no seguinte)."""
+    if not keyframes: return [(0.0, duration)] if ranges else []
+    out = []
+    for a, b in ranges:
+        i = max(0, bisect.bisect_right(keyframes, a) - 1)
+        j = bisect.bisect_right(keyframes, b)
+        out.append((keyframes[i], keyframes[j] if j < len(keyframes) else duration))
+    return merge_ranges(out)
+
+
+# =========================
+# Proxy de pré-visualização
+# =========================
+def proxy_path(src: str) -> str:
+    base, _ = os.path.splitext(src)
+    return f"{base}.preview.mp4"
+
+
+def ensure_preview_proxy(src: str) -> str:
+    """Gera (uma vez por versão do arquivo) o proxy em baixa resolução com faststart ao lado do original."""
+    dst = proxy_path(src)
+    if os.path.exists(dst) and os.path.getmtime(dst) >= os.path.getmtime(src): return dst
+    scale = f"scale='if(gt(iw,ih),min({PROXY_MAX_SIDE},iw),-2)':'if(gt(iw,ih),-2,min({PROXY_MAX_SIDE},ih))'"
+    tmp = f"{dst}.tmp.mp4"
+    _run(["ffmpeg", "-y", "-i", src, "-vf", scale, *PROXY_ARGS, tmp])
+    os.replace(tmp, dst)
+    return dst
+
+
+# =========================
+# Estilo (force_style do libass) — o mesmo para a prévia e o render final
+# =========================
+def hex_to_ass_color(hex_color):
+    h = hex_color.lstrip('#')
+    if len(h) != 6: return "&HFFFFFF&"
+    # ASS usa formato BGR em hexadecimal
+    return f"&H00{h[4:6]}{h[2:4]}{h[0:2]}"
+
+
+def load_style_settings() -> Dict[str, Any]:
+    """Estilo salvo pelo editor em CONFIG_FILE sobre os padrões (arquivo ausente ou inválido: só os padrões)."""
+    sets = dict(DEFAULT_STYLE)
+    if os.path.exists(CONFIG_FILE):
+        try:
+            with open(CONFIG_FILE, "r") as f: sets.update(json.load(f))
+        except Exception: pass
+    return sets
+
+
+def resolve_font(choice: str) -> str:
+    """Fonte enviada: caminho absoluto do arquivo salvo; fontes do sistema (Arial): o nome basta ao FFmpeg."""
+    if choice == FONT_CUSTOM and os.path.exists(SAVED_FONT_FILE): return os.path.abspath(SAVED_FONT_FILE)
+    return choice
+
+
+def saved_force_style() -> str:
+    sets = load_style_settings()
+    return build_force_style(resolve_font(sets["font_style"]), sets)
+
+
+def build_force_style(font_name: str, sets: Dict[str, Any]) -> str:
+    ass_c = hex_to_ass_color(sets["color"]); ass_b = hex_to_ass_color(sets["border"])
+    # Outline ajustado para 2 (borda mais fina)
+    return f"Fontname={font_name},FontSize={sets['f_size']},PrimaryColour={ass_c},OutlineColour={ass_b},BackColour=&H80000000,BorderStyle=1,Outline=2,Shadow=0,Alignment=2,MarginV={sets['margin_v']}"
+
+
+# =========================
+# Render
+# =========================
+def filter_escape(value: str) -> str:
+    """
+    Valor de opção dentro de um -vf: o FFmpeg remove um nível de escape no parser do filtergraph
+    ([],; e aspas) e outro no parser de opções (: e aspas). Caminhos com : ' , \\ passam intactos.
+    """
+    value = re.sub(r"([\\':])", r"\\\1", value)
+    return re.sub(r"([\\'\[\],;])", r"\\\1", value)
+
+
+def subtitles_filter(srt_path: str, style: str) -> str:
+    return f"subtitles=filename={filter_escape(srt_path)}:force_style={filter_escape(style)}"
+
+
+def full_burn_cmd(src: str, srt_path: str, style: str, out_path: str) -> List[str]:
+    return ["ffmpeg", "-y", "-i", src, "-vf", subtitles_filter(srt_path, style), "-c:a", "copy", *X264_ARGS, out_path]
+
+
+def build_soft_sub_cmd(video_path: str, sub_path: str, out_path: str, language: str = "por") -> List[str]:
+    """Remux com a legenda como faixa mov_text: vídeo e áudio copiados, sem perda e em segundos."""
+    return ["ffmpeg", "-y", "-i", video_path, "-i", sub_path, "-map", "0:v", "-map", "0:a?", "-map", "1:0",
+            "-c:v", "copy", "-c:a", "copy", "-c:s", "mov_text", "-metadata:s:s:0", f"language={language}",
+            "-disposition:s:0", "default", "-movflags", "+faststart", out_path]
+
+
+def _run(cmd: List[str]):
+    subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def incremental_burn(src: str, prev_out: str, old_srt: str, new_srt: str, srt_path: str, style: str,
+                     out_path: str, work_dir: str) -> Optional[Dict[str, Any]]:
+    """
+    Re-encoda só os trechos (alinhados a GOP da saída anterior) que cobrem legendas alteradas e emenda
+    com stream copy. Retorna estatísticas, ou None quando não compensa (o chamador faz o render completo).
+    Lança CalledProcessError se algum passo do FFmpeg falhar.
+    """
+    duration = probe_duration(prev_out)
+    spans = gop_ranges(changed_ranges(old_srt, new_srt), probe_keyframes(prev_out), duration)
+    if not spans: return {"ranges": [], "reencoded_s": 0.0, "duration_s": duration}
+    reencoded = sum(b - a for a, b in spans)
+    if reencoded > duration * MAX_INCREMENTAL_FRACTION: return None
+
+    timescale = probe_timescale(prev_out)
+    ts_args = ["-video_track_timescale", str(timescale)] if timescale else []
+    entries, cursor = [], 0.0
+    for n, (a, b) in enumerate(spans):
+        if a > cursor: entries.append((prev_out, cursor, a))
+        seg = os.path.join(work_dir, f"reburn_{n}.mp4")
+        # Filtros recebem tempo relativo ao -ss: desloca para a linha do tempo original só para a legenda
+        vf = f"setpts=PTS+{a:.6f}/TB,{subtitles_filter(srt_path, style)},setpts=PTS-STARTPTS"
+        _run(["ffmpeg", "-y", "-ss", f"{a:.6f}", "-t", f"{b - a:.6f}", "-i", src, "-an", "-vf", vf, *X264_ARGS, *ts_args, seg])
+        entries.append((seg, None, None)); cursor = b
+    if cursor < duration: entries.append((prev_out, cursor, None))
+
+    lst = os.path.join(work_dir, "reburn_list.txt")
+    with open(lst, "w", encoding="utf-8") as f:
+        for path, inpoint, outpoint in entries:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+            if inpoint: f.write(f"inpoint {inpoint:.6f}\n")
+            if outpoint is not None: f.write(f"outpoint {outpoint:.6f}\n")
+    # Vídeo emendado + áudio original copiado (a saída anterior também só copiava o áudio)
+    tmp_out = os.path.join(work_dir, "reburn_out.mp4")
+    _run(["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", lst, "-i", src, "-map", "0:v", "-map", "1:a?",
+          "-c", "copy", "-movflags", "+faststart", tmp_out])
+    os.replace(tmp_out, out_path)
+    for n in range(len(spans)):
+        try: os.remove(os.path.join(work_dir, f"reburn_{n}.mp4"))
+        except OSError: pass
+    return {"ranges": spans, "reencoded_s": round(reencoded, 2), "duration_s": round(duration, 2)}
+
+
+# =========================
+# Prévia de estilo: um quadro por instante, sem decodificar o vídeo inteiro
+# =========================
+def render_style_frame(src: str, srt_path: str, style: str, t: float) -> bytes:
+    """PNG do quadro em `t` com a legenda queimada. -ss antes do -i busca direto no keyframe;
+    -copyts mantém o tempo absoluto para o filtro de legenda casar com o SRT."""
+    r = subprocess.run(["ffmpeg", "-v", "error", "-ss", f"{t:.3f}", "-copyts", "-i", src, "-vf", subtitles_filter(srt_path, style),
+                        "-frames:v", "1", "-f", "image2pipe", "-c:v", "png", "pipe:1"],
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
+    return r.stdout
+
+
+def render_style_frames(src: str, srt_path: str, style: str, times: List[float]) -> List[Tuple[float, bytes]]:
+    with ThreadPoolExecutor(max_workers=max(1, min(4, len(times)))) as ex:
+        return list(zip(times, ex.map(lambda t: render_style_frame(src, srt_path, style, t), times)))
+
+
+def preview_times(srt_text: str, n: int = 3) -> List[float]:
+    """Meio da primeira, da do meio e da última legenda (bons candidatos para conferir o estilo)."""
+    cues = parse_srt(srt_text)
+    if not cues: return [1.0]
+    picks = sorted({0, len(cues) // 2, len(cues) - 1})[:n]
+    return [round((cues[i][0] + cues[i][1]) / 2, 2) for i in picks]
+
+
+# =========================
+# ASS (libass) com karaoke \k — legenda temporizada queimada no mesmo encode do bloco
+# =========================
+def ass_timestamp(t: float) -> str:
+    cs = int(round(max(0.0, t) * 100))
+    h, cs = divmod(cs, 360000); m, cs = divmod(cs, 6000); s, cs = divmod(cs, 100)
+    return f"{h}:{m:02}:{s:02}.{cs:02}"
+
+
+def _ass_escape(text: str) -> str:
+    return text.replace("\\", "/").replace("{", "(").replace("}", ")").replace("\n", " ")
+
+
+def font_family_name(font_path: Optional[str], default: str = "Sans") -> str:
+    """Nome da família (o libass procura por nome dentro do fontsdir, não pelo arquivo)."""
+    if not font_path: return default
+    try:
+        from fontes import load_font
+        return load_font(font_path, 12).getname()[0] or default
+    except Exception: return default
+
+
+def _line_breaks(words: List[str], wrap: Optional[Callable[[str], str]]) -> Set[int]:
+    """Índices (na cue) das palavras que começam uma nova linha, segundo a função de quebra da página."""
+    if not wrap or len(words) < 2: return set()
+    lines = [l.split() for l in wrap(" ".join(words)).split("\n") if l.strip()]
+    if sum(len(l) for l in lines) != len(words): return set()  # Quebrou no meio de palavra: deixa o libass quebrar
+    breaks, n = set(), 0
+    for l in lines[:-1]:
+        n += len(l); breaks.add(n)
+    return breaks
+
+
+def build_ass(cues: List[Dict[str, Any]], words: List[str], timings: List[Tuple[float, float]], width: int, height: int,
+              font_name: str, font_size: int, color: str, outline_color: str, margin_v: int, karaoke: bool = False,
+              highlight: str = "#FFFF00", box: bool = False, wrap: Optional[Callable[[str], str]] = None) -> str:
+    """
+    Legendas em blocos curtos (cues de alinhamento.build_cues). Com `karaoke`, cada palavra recebe
+    um \\k com a duração até a próxima: a cor passa de `color` (SecondaryColour) para `highlight`.
+    """
+    primary = hex_to_ass_color(highlight if karaoke else color)
+    secondary = hex_to_ass_color(color)
+    outline = "&H99000000" if box else hex_to_ass_color(outline_color)
+    border_style, outline_w = (3, 8) if box else (1, 2)
+    out = [
+        "[Script Info]", "ScriptType: v4.00+", f"PlayResX: {width}", f"PlayResY: {height}", "WrapStyle: 0", "ScaledBorderAndShadow: yes", "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        f"Style: Default,{font_name},{font_size},{primary},{secondary},{outline},&H80000000,0,0,0,0,100,100,0,0,{border_style},{outline_w},0,2,50,50,{margin_v},1",
+        "", "[Events]", "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for c in cues:
+        idx = c["words"]
+        breaks = _line_breaks([words[i] for i in idx], wrap)
+        parts = []
+        for k, i in enumerate(idx):
+            sep = "\\N" if k in breaks else (" " if k else "")
+            token = _ass_escape(words[i])
+            if karaoke:
+                nxt = timings[idx[k + 1]][0] if k + 1 < len(idx) else c["end"]
+                start = c["start"] if k == 0 else timings[i][0]
+                token = f"{{\\k{max(1, int(round((nxt - start) * 100)))}}}{token}"
+            parts.append(sep + token)
+        out.append(f"Dialogue: 0,{ass_timestamp(c['start'])},{ass_timestamp(c['end'])},Default,,0,0,0,,{''.join(parts)}")
+    return "\n".join(out) + "\n"
+
+
+def ass_filter(ass_path: str, fonts_dir: Optional[str] = None) -> str:
+    f = f"ass=filename={filter_escape(ass_path)}"
+    return f + (f":fontsdir={filter_escape(fonts_dir)}" if fonts_dir else "")
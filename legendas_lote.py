@@ -0,0 +1,242 @@
+# legendas_lote.py — Legendagem em lote (sem interface) de todos os vídeos prontos no Drive
+# Procura `video_final_*` em Monetiza_Studio_Videos_Finais sem o LEGENDADO_ correspondente e,
+# para cada um: baixa, busca o roteiro do job, gera o SRT alinhado, queima/embute e envia.
+# As etapas rodam em pipeline: enquanto um vídeo transcreve, outros baixam, encodam ou sobem.
+#
+#   python legendas_lote.py --credentials conta_servico.json [--mode burn|soft] [--whisper] [--limit N]
+import os
+import re
+import time
+import base64
+import hashlib
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import requests
+
+from alinhamento import align_roteiro_to_segments, blocks_to_srt, get_full_roteiro_text, get_job_block_timeline, has_block_audio, has_word_timings
+from drive_download import download_to_file
+from legenda_render import GAS_SCRIPT_URL, MONETIZA_DRIVE_FOLDER_LEGENDADOS, MONETIZA_DRIVE_FOLDER_VIDEOS, build_soft_sub_cmd, full_burn_cmd, saved_force_style
+from transcricao import CPU_COUNT, DEFAULT_BACKEND, extract_pcm, transcribe_cached
+from workspaces import job_dir, keep_alive, remove_dir, reserve, session_dir
+
+BATCH_SESSION = "lote"  # Pasta de trabalho própria em workspaces/sessions/lote
+
+# Concorrência por etapa (a transcrição já paraleliza por dentro com o pool de processos)
+STAGE_LIMITS = {"download": 2, "align": 1, "encode": max(1, CPU_COUNT // 4), "upload": 2}
+
+LogFn = Callable[[str], None]
+_inflight_lock = threading.Lock()
+_batch_lock = threading.Lock()
+_batch_state: Optional[Dict[str, Any]] = None  # Lote em andamento no processo (um por vez: todos leem a mesma fila)
+
+
+# =========================
+# Drive / GAS (sem Streamlit)
+# =========================
+def build_drive_service(credentials_file: str):
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+    creds = service_account.Credentials.from_service_account_file(credentials_file, scopes=['https://www.googleapis.com/auth/drive'])
+    return build('drive', 'v3', credentials=creds)
+
+
+def _own_service(service):
+    """Mesmas credenciais, conexão própria: o lote em segundo plano não divide o httplib2 da página."""
+    creds = getattr(getattr(service, "_http", None), "credentials", None)
+    if creds is None: return service
+    from googleapiclient.discovery import build
+    return build('drive', 'v3', credentials=creds)
+
+
+def _folder_id(service, name: str) -> Optional[str]:
+    q = f"name = '{name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
+    folders = service.files().list(q=q, fields="files(id)").execute().get('files', [])
+    return folders[0]['id'] if folders else None
+
+
+def _list_all(service, q: str, fields: str) -> List[Dict[str, Any]]:
+    out, token = [], None
+    while True:
+        resp = service.files().list(q=q, fields=f"nextPageToken, files({fields})", pageSize=200, pageToken=token, orderBy="createdTime").execute()
+        out.extend(resp.get('files', []))
+        token = resp.get('nextPageToken')
+        if not token: return out
+
+
+def list_pending_videos(service) -> List[Dict[str, Any]]:
+    """`video_final_*` ainda sem `LEGENDADO_<nome>` na pasta de legendados (mais antigos primeiro)."""
+    src = _folder_id(service, MONETIZA_DRIVE_FOLDER_VIDEOS)
+    if not src: raise RuntimeError(f"Pasta '{MONETIZA_DRIVE_FOLDER_VIDEOS}' não encontrada para a conta de serviço.")
+    videos = _list_all(service, f"mimeType = 'video/mp4' and name contains 'video_final_' and '{src}' in parents and trashed = false", "id, name, size, createdTime")
+    done = set()
+    dst = _folder_id(service, MONETIZA_DRIVE_FOLDER_LEGENDADOS)
+    if dst:
+        done = {f['name'] for f in _list_all(service, f"name contains 'LEGENDADO_' and '{dst}' in parents and trashed = false", "name")}
+    return [v for v in videos if f"LEGENDADO_{v['name']}" not in done]
+
+
+def get_job_roteiro(job_id: str) -> Optional[Dict[str, Any]]:
+    """JSON do job via GAS (doGet). None se o GAS responder erro."""
+    response = requests.get(f"{GAS_SCRIPT_URL}?action=get_job&job_id={job_id}", timeout=60)
+    response.raise_for_status()
+    data = response.json()
+    return None if data.get('status') == 'error' else data
+
+
+def legendado_job_id(source_id: Optional[str], original_name: str) -> str:
+    """Id do upload pelo arquivo de origem (id do Drive; sem ele, hash do nome): uploads simultâneos não colidem e reenviar o mesmo vídeo mantém o id."""
+    if source_id and source_id != "local_upload": return f"LEGENDADO_{source_id}"
+    return "LEGENDADO_" + hashlib.sha1(original_name.encode("utf-8")).hexdigest()[:16]
+
+
+def upload_legendado(video_path: str, original_name: str, source_id: Optional[str] = None) -> str:
+    """Mesmo protocolo do editor (upload_video no GAS). Retorna o file_id ou lança RuntimeError."""
+    with open(video_path, "rb") as f: video_b64 = base64.b64encode(f.read()).decode('utf-8')
+    payload = {"action": "upload_video", "job_id": legendado_job_id(source_id, original_name), "video_data": video_b64, "filename": f"LEGENDADO_{original_name}", "meta_data": {"status": "LEGENDADO", "processed_at": datetime.now().isoformat(), "origin": "lote"}}
+    response = requests.post(GAS_SCRIPT_URL, json=payload, timeout=600)
+    if response.status_code != 200: raise RuntimeError(f"HTTP {response.status_code}")
+    res = response.json()
+    if res.get("status") != "success": raise RuntimeError(res.get("message") or "upload recusado")
+    return res.get("file_id")
+
+
+# =========================
+# FFmpeg
+# =========================
+def _ffmpeg(cmd: List[str]):
+    r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if r.returncode != 0: raise RuntimeError(f"FFmpeg: {r.stderr.decode(errors='ignore')[-500:]}")
+
+
+# =========================
+# Pipeline
+# =========================
+def process_video(service, video: Dict[str, Any], limits: Dict[str, threading.Semaphore], mode: str = "burn",
+                  use_whisper: bool = False, model_size: str = "base", backend: str = DEFAULT_BACKEND,
+                  style: Optional[str] = None, log: LogFn = print, inflight: Optional[Set[str]] = None) -> Dict[str, Any]:
+    """
+    Um vídeo do início ao fim; cada etapa respeita o limite de concorrência dela.
+    `inflight`: pastas dos vídeos em andamento (compartilhado), protegidas do despejo de cota.
+    """
+    name, vid = video['name'], video['id']
+    work = job_dir(BATCH_SESSION, f"video_{vid}")
+    inflight = inflight if inflight is not None else set()
+    with _inflight_lock: inflight.add(work)
+    src, srt_path, out = os.path.join(work, "original.mp4"), os.path.join(work, "legendas.srt"), os.path.join(work, "legendado.mp4")
+    t0 = time.time()
+    try:
+        match = re.search(r'(JOB-[a-zA-Z0-9-]+)', name)
+        if not match: raise RuntimeError("Job ID não encontrado no nome do arquivo.")
+        with limits["download"]:
+            with _inflight_lock: busy = list(inflight)
+            size = int(video['size']) if video.get('size') else None
+            reserve(BATCH_SESSION, (size or 0) / 1024 ** 2, keep=busy)
+            download_to_file(service, vid, src, size=size)  # Tamanho da listagem: o worker não chama o service compartilhado
+            roteiro = get_job_roteiro(match.group(1))
+        if not roteiro: raise RuntimeError("Roteiro do job não encontrado no GAS.")
+        log(f"⬇️ {name}: baixado")
+
+        with limits["align"]:
+            segments, timeline = None, get_job_block_timeline(roteiro) if has_block_audio(roteiro) else None
+            if timeline is None or (use_whisper and not has_word_timings(timeline)):  # Tempos do TTS válidos dispensam o Whisper
+                segments, _ = transcribe_cached(extract_pcm(src), model_size, language="pt", word_timestamps=True, backend=backend)
+            if timeline is not None:
+                srt = blocks_to_srt(timeline, segments)
+            else:
+                srt = align_roteiro_to_segments(segments or [], get_full_roteiro_text(roteiro), max_words=4)
+        if not srt: raise RuntimeError("Não foi possível gerar o SRT.")
+        with open(srt_path, "w", encoding="utf-8") as f: f.write(srt)
+        log(f"📝 {name}: legendas alinhadas")
+
+        with limits["encode"]:
+            _ffmpeg(build_soft_sub_cmd(src, srt_path, out) if mode == "soft" else full_burn_cmd(src, srt_path, style or saved_force_style(), out))
+        log(f"🔥 {name}: renderizado")
+
+        with limits["upload"]:
+            file_id = upload_legendado(out, name, vid)
+        log(f"☁️ {name}: enviado")
+        return {"name": name, "ok": True, "file_id": file_id, "seconds": round(time.time() - t0, 1)}
+    except Exception as e:
+        log(f"❌ {name}: {e}")
+        return {"name": name, "ok": False, "error": str(e), "seconds": round(time.time() - t0, 1)}
+    finally:
+        with _inflight_lock: inflight.discard(work)
+        remove_dir(work)
+
+
+def run_batch(service, mode: str = "burn", use_whisper: bool = False, model_size: str = "base", backend: str = DEFAULT_BACKEND,
+              limit: Optional[int] = None, log: LogFn = print,
+              progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Processa todos os pendentes em pipeline. `log` pode ser chamado de threads de trabalho;
+    `progress(feitos, total, resultado)` é chamado na thread de quem chamou (seguro para o Streamlit);
+    a primeira chamada, com resultado None, só informa o total.
+    """
+    pending = list_pending_videos(service)
+    if limit: pending = pending[:limit]
+    log(f"🔎 {len(pending)} vídeo(s) pendente(s)")
+    if progress: progress(0, len(pending), None)
+    if not pending: return []
+    limits = {k: threading.Semaphore(v) for k, v in STAGE_LIMITS.items()}
+    style = saved_force_style()  # Mesmo estilo salvo pelo editor
+    results, inflight = [], set()
+    session_dir(BATCH_SESSION, headless=True)  # Não é sessão do Streamlit: a limpeza só usa o heartbeat
+    with keep_alive(BATCH_SESSION), ThreadPoolExecutor(max_workers=min(len(pending), sum(STAGE_LIMITS.values()))) as ex:
+        futures = [ex.submit(process_video, service, v, limits, mode, use_whisper, model_size, backend, style, log, inflight) for v in pending]
+        for fut in as_completed(futures):
+            results.append(fut.result())
+            if progress: progress(len(results), len(pending), results[-1])
+    return results
+
+
+def start_batch(service, mode: str = "burn", use_whisper: bool = False, model_size: str = "base",
+                backend: str = DEFAULT_BACKEND, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    run_batch numa thread de fundo; a página só lê o estado retornado a cada refresh.
+    Um lote por processo: com um já rodando (desta ou de outra sessão), devolve o estado dele.
+    Estado: running, log (linhas), done/total, results, error.
+    """
+    global _batch_state
+    with _batch_lock:
+        if _batch_state and _batch_state["running"]: return _batch_state
+        state = _batch_state = {"running": True, "log": [], "done": 0, "total": None, "results": [], "error": None}
+
+    def _progress(done, total, r):
+        state["done"], state["total"] = done, total
+        if r: state["results"].append(r)
+
+    def _run():
+        try:
+            run_batch(_own_service(service), mode, use_whisper, model_size, backend, limit, log=state["log"].append, progress=_progress)
+        except Exception as e: state["error"] = str(e)
+        finally: state["running"] = False
+
+    threading.Thread(target=_run, name="legendas-lote", daemon=True).start()
+    return state
+
+
+def batch_state() -> Optional[Dict[str, Any]]:
+    """Último lote iniciado neste processo (rodando ou concluído), ou None."""
+    return _batch_state
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Legenda em lote os vídeos prontos do Drive.")
+    ap.add_argument("--credentials", default=os.getenv("GOOGLE_APPLICATION_CREDENTIALS"), help="JSON da conta de serviço")
+    ap.add_argument("--mode", choices=["burn", "soft"], default="burn", help="burn: queima na imagem; soft: faixa mov_text sem re-encode")
+    ap.add_argument("--whisper", action="store_true", help="Refina o timing dos blocos com o Whisper")
+    ap.add_argument("--model", default="base")
+    ap.add_argument("--backend", default=DEFAULT_BACKEND)
+    ap.add_argument("--limit", type=int, default=None)
+    args = ap.parse_args()
+    if not args.credentials: ap.error("informe --credentials ou GOOGLE_APPLICATION_CREDENTIALS")
+
+    t0 = time.time()
+    res = run_batch(build_drive_service(args.credentials), args.mode, args.whisper, args.model, args.backend, args.limit)
+    ok = sum(1 for r in res if r["ok"])
+    print(f"\n{ok}/{len(res)} vídeos legendados em {time.time() - t0:.0f}s")
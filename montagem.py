@@ -3,7 +3,6 @@ import os
 import re
 import json
 import time
-import tempfile
 import traceback
 import subprocess
 from io import BytesIO
@@ -13,7 +12,7 @@ import base64
 import shutil as _shutil
 
 import requests
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import streamlit as st
 
 # --- API Imports ---
@@ -21,6 +20,10 @@ from google.oauth2 import service_account
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from drive_download import download_bytes
+from fontes import load_font, register_font_file, register_upload, text_width
+from workspaces import current_session_workspace, scratch_dir, remove_dir, reserve, estimate_render_mb, WorkspaceQuotaError
+
 # --- CONFIGURAÇÃO ---
 FRONTEND_AI_STUDIO_URL = "https://ai.studio/apps/drive/1gfrdHffzH67cCcZBJWPe6JfE1ZEttn6u"
 # URL DO SEU SCRIPT GAS (ATUALIZE SE NECESSÁRIO)
@@ -134,9 +137,7 @@ def find_file_in_drive_folder(service, file_name: str, folder_name: str) -> Opti
     except: return None
 
 def download_file_content(service, file_id: str) -> Optional[str]:
-    try:
-        request = service.files().get_media(fileId=file_id)
-        return request.execute().decode('utf-8')
+    try: return download_bytes(service, file_id).decode('utf-8')
     except: return None
 
 def list_recent_jobs(limit: int = 15) -> List[Dict]:
@@ -333,13 +334,9 @@ def get_audio_duration(path):
 
 def resolve_font(choice, upload):
     if choice == "Upload Personalizada" and upload:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".ttf") as tmp:
-            tmp.write(upload.getvalue())
-            return tmp.name
-    if choice == "Upload Personalizada" and os.path.exists(SAVED_FONT_FILE):
-        return SAVED_FONT_FILE
-    if choice == "Alegreya Sans Black" and os.path.exists(SAVED_FONT_FILE):
-         return SAVED_FONT_FILE
+        return register_upload(upload)  # Caminho por hash do conteúdo: gravado uma vez só
+    if choice in ("Upload Personalizada", "Alegreya Sans Black") and os.path.exists(SAVED_FONT_FILE):
+        return register_font_file(SAVED_FONT_FILE)  # Muda de caminho quando a fonte salva é trocada
     sys_fonts = {
         "Padrão (Sans)": ["arial.ttf", "DejaVuSans.ttf"], 
         "Serif": ["times.ttf"], 
@@ -356,19 +353,25 @@ def get_main_title(ref_text: str) -> str:
     if "salmo" in ref: return "SALMO"
     return "EVANGELHO" 
 
-def criar_preview(w, h, texts, upload):
+PREVIEW_CACHE_ENTRIES = 32
+
+@st.cache_data(max_entries=PREVIEW_CACHE_ENTRIES, show_spinner=False)
+def _render_preview(w, h, texts):
+    """PNG do preview; `texts` já traz o caminho da fonte (por conteúdo), então a entrada inteira é a chave."""
     img = Image.new("RGB", (w, h), "black")
     draw = ImageDraw.Draw(img)
     for t in texts:
         if not t["text"]: continue
-        try: font = ImageFont.truetype(resolve_font(t["font_style"], upload), t["size"])
-        except: font = ImageFont.load_default()
-        try: length = draw.textlength(t["text"], font=font)
-        except: length = len(t["text"]) * t["size"] * 0.5
-        x = (w - length) / 2
+        font_path = t["font_path"]
+        font = load_font(font_path, t["size"])
+        x = (w - text_width(t["text"], font_path, t["size"])) / 2
         draw.text((x, t["y"]), t["text"], fill=t["color"], font=font, stroke_width=2, stroke_fill="black")
-    bio = BytesIO(); img.save(bio, "PNG"); bio.seek(0)
-    return bio
+    bio = BytesIO(); img.save(bio, "PNG")
+    return bio.getvalue()
+
+def criar_preview(w, h, texts, upload):
+    texts = [dict(t, font_path=resolve_font(t["font_style"], upload)) for t in texts]
+    return BytesIO(_render_preview(w, h, texts))
 
 def san(txt): return txt.replace(":", "\\:").replace("'", "") if txt else ""
 
@@ -380,8 +383,14 @@ def auto_load_and_process_job(job_id: str):
             try: _shutil.rmtree(st.session_state["temp_assets_dir"])
             except: pass
         
-        temp_assets_dir = tempfile.mkdtemp()
+        sid, _ = current_session_workspace()
         payload = load_job_from_drive(job_id)
+        if payload:  # Assets chegam em base64 (~4/3 do tamanho gravado)
+            try: reserve(sid, sum(len(a.get("data_b64") or "") for a in payload.get("assets", []) or []) * 0.75 / 1024 ** 2, keep=[st.session_state.get("render_dir")])
+            except WorkspaceQuotaError as e:
+                st.session_state["temp_assets_dir"] = None
+                status_box.update(label=f"❌ {e}", state="error"); return
+        temp_assets_dir = scratch_dir(sid, f"job_{job_id}_")
         
         if payload and process_job_payload(payload, temp_assets_dir):
             st.session_state.update({"job_loaded_from_drive": True, "temp_assets_dir": temp_assets_dir, "current_job_id_loaded": job_id})
@@ -574,13 +583,21 @@ with tab3:
     music_vol = st.slider("Volume Música", 0.0, 1.0, load_config().get("music_vol", 0.15))
 
     if st.button("RENDERIZAR VÍDEO FINAL", type="primary"):
+        tmp = None
         render_prog = st.progress(0, text="Iniciando Renderização...")
         eta_placeholder = st.empty()
         start_time = time.time()
         
         with st.status("Renderizando...", expanded=True) as s:
             try:
-                tmp = tempfile.mkdtemp()
+                # Pasta de render nova dentro da sessão; a anterior (e o vídeo dela, ainda usado pelo
+                # "Enviar ao Drive") só é descartada quando este render terminar com sucesso
+                sid, _ = current_session_workspace()
+                prev_dir = st.session_state.get("render_dir")
+                total_dur = sum(get_audio_duration(st.session_state["generated_audios_blocks"][b]) for b in ["hook", "leitura", "reflexao", "aplicacao", "oracao"]
+                                if st.session_state["generated_audios_blocks"].get(b) and st.session_state["generated_images_blocks"].get(b))
+                reserve(sid, estimate_render_mb(total_dur), keep=[st.session_state.get("temp_assets_dir"), prev_dir])
+                tmp = scratch_dir(sid, "render_")
                 clips = []
                 res = get_resolution_params(res_choice)
                 w, h = res["w"], res["h"]
@@ -672,6 +689,8 @@ with tab3:
                 with open(final_absolute_path, "rb") as f:
                     st.session_state["video_final_bytes"] = BytesIO(f.read())
                     st.session_state["video_final_path"] = final_absolute_path
+                st.session_state["render_dir"], tmp = tmp, None
+                if prev_dir != st.session_state["render_dir"]: remove_dir(prev_dir)
                 
                 render_prog.progress(100, text="Finalizado!")
                 eta_placeholder.empty()
@@ -681,6 +700,7 @@ with tab3:
                 st.error(f"Erro render: {e}")
                 st.error(traceback.format_exc())
                 s.update(label="Erro", state="error")
+            finally: remove_dir(tmp)  # Só sobra se o render falhou; o vídeo anterior continua válido
 
     if st.session_state["video_final_bytes"]:
         c1, c2 = st.columns(2)
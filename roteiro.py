@@ -4,15 +4,32 @@ import json
 import os
 import re
 import calendar
+import time
+import random
+import hashlib
+import uuid
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import date, timedelta, datetime
 from groq import Groq
+import banco_dados as db
+from cache_llm import cached_chat_completion, clear_llm_cache, llm_cache_stats, CACHE_MODES, CACHE_MODE_USE
 
 # ==========================================
 # CONFIGURAÇÕES
 # ==========================================
 st.set_page_config(page_title="Roteirista Litúrgico Híbrido", layout="wide")
-CHARACTERS_FILE = "characters_db.json"
-HISTORY_FILE = "history_db.json"
+GROQ_MODEL = "llama-3.3-70b-versatile"
+# Versões dos templates de prompt (altere ao mudar o texto para invalidar o cache do LLM)
+PROMPT_VERSION_SCRIPT = "roteiro-v1"
+PROMPT_VERSION_CHAR = "personagens-lote-v1"
+# Envio ao GAS
+GAS_MAX_WORKERS = 4
+GAS_TIMEOUT = (10, 90)  # (conexão, leitura) em segundos
+GAS_MAX_RETRIES = 4
+GAS_BACKOFF_BASE = 1.5
+GAS_RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+GAS_BATCH_SIZE = 20
 STYLE_SUFFIX = ". Style: Cinematic Realistic, 1080p resolution, highly detailed, masterpiece, cinematic lighting, detailed texture, photography style."
 
 FIXED_CHARACTERS = {
@@ -23,30 +40,14 @@ FIXED_CHARACTERS = {
 # ==========================================
 # PERSISTÊNCIA
 # ==========================================
-def load_json(file_path):
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, "r", encoding="utf-8") as f: return json.load(f)
-        except: return {} if "char" in file_path else []
-    return {} if "char" in file_path else []
-
-def save_json(file_path, data):
-    with open(file_path, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False, indent=2)
-
 def load_characters():
     all_chars = FIXED_CHARACTERS.copy()
-    all_chars.update(load_json(CHARACTERS_FILE))
+    all_chars.update(db.get_characters())
     return all_chars
 
-def save_characters(data): save_json(CHARACTERS_FILE, data)
-def load_history(): return load_json(HISTORY_FILE)
+def save_characters(data): db.upsert_characters(data)
 
-def update_history_bulk(dates):
-    hist = load_history()
-    updated = False
-    for d in dates:
-        if d not in hist: hist.append(d); updated = True
-    if updated: hist.sort(); save_json(HISTORY_FILE, hist)
+def update_history_bulk(dates): db.add_history(dates)
 
 # ==========================================
 # FONTES DE DADOS (APIS APENAS)
@@ -56,6 +57,13 @@ def get_groq_client():
     if not api_key: st.error("❌ Configure GROQ_API_KEY."); st.stop()
     return Groq(api_key=api_key)
 
+def llm_cache_mode():
+    return st.session_state.get("llm_cache_mode", CACHE_MODE_USE)
+
+def _is_json(content):
+    try: json.loads(content); return True
+    except: return False
+
 def fetch_liturgia(date_obj):
     # 1. PRINCIPAL: Vercel
     try:
@@ -105,19 +113,65 @@ def fetch_liturgia(date_obj):
     # 3. FALHA TOTAL (Retorna None para ativar manual)
     return None
 
-def send_to_gas(payload):
+def get_gas_url():
     gas_url = st.secrets.get("GAS_SCRIPT_URL") or os.getenv("GAS_SCRIPT_URL")
-    if not gas_url: st.error("❌ Configure GAS_SCRIPT_URL."); return None
-    try:
-        r = requests.post(f"{gas_url}?action=generate_job", json=payload)
-        return r.json() if r.status_code == 200 else None
-    except: return None
+    if not gas_url: st.error("❌ Configure GAS_SCRIPT_URL.")
+    return gas_url
+
+def job_idempotency_key(payload, scope=""):
+    """
+    Chave estável do job: conteúdo + `scope` (lote, data e tipo da leitura; nonce só em reenvio confirmado).
+    Repetições após timeout, novos cliques em Enviar e outras sessões reutilizam a mesma chave e não duplicam
+    o job; só um reenvio confirmado pelo usuário ("Confirmar duplicidade") traz nonce e chega ao GAS como job novo.
+    """
+    body = {k: v for k, v in payload.items() if k != "idempotency_key"}
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True) + "\x00" + scope
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+def _post_gas_with_retry(url, body):
+    """POST com timeout e backoff exponencial (com jitter). Não usa st.* (roda em threads)."""
+    for attempt in range(GAS_MAX_RETRIES + 1):
+        try:
+            r = requests.post(url, json=body, timeout=GAS_TIMEOUT)
+            if r.status_code == 200:
+                data = r.json()
+                if isinstance(data, dict) and data.get('status') == 'error': return None
+                return data
+            if r.status_code not in GAS_RETRY_STATUS: return None
+        except (requests.Timeout, requests.ConnectionError, ValueError): pass
+        except Exception: return None
+        if attempt < GAS_MAX_RETRIES: time.sleep(GAS_BACKOFF_BASE * (2 ** attempt) + random.uniform(0, GAS_BACKOFF_BASE))
+    return None
+
+def send_to_gas(payload, gas_url):
+    key = payload.setdefault("idempotency_key", job_idempotency_key(payload))
+    return _post_gas_with_retry(f"{gas_url}?action=generate_job&idempotency_key={key}", payload)
+
+def send_jobs_concurrently(payloads, gas_url, max_workers=GAS_MAX_WORKERS):
+    """Envia jobs em paralelo (limitado). Gera (índice, resposta ou None) conforme concluem."""
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as ex:
+        futs = {ex.submit(send_to_gas, p, gas_url): i for i, p in enumerate(payloads)}
+        for f in as_completed(futs): yield futs[f], f.result()
+
+def send_jobs_batched(payloads, gas_url, batch_size=GAS_BATCH_SIZE):
+    """
+    Modo lote: vários jobs por requisição (action=generate_jobs_batch).
+    Espera {"results": [{"idempotency_key": ..., ...}]}; jobs sem resposta caem no envio individual.
+    """
+    for p in payloads: p.setdefault("idempotency_key", job_idempotency_key(p))
+    for start in range(0, len(payloads), batch_size):
+        chunk = payloads[start:start + batch_size]
+        data = _post_gas_with_retry(f"{gas_url}?action=generate_jobs_batch", {"jobs": chunk})
+        results = data.get('results', []) if isinstance(data, dict) else (data if isinstance(data, list) else [])
+        by_key = {r.get('idempotency_key'): r for r in results if isinstance(r, dict) and r.get('status') != 'error'}
+        for i, p in enumerate(chunk):
+            res = by_key.get(p['idempotency_key'])
+            yield start + i, (res if res is not None else send_to_gas(p, gas_url))
 
 # ==========================================
 # LÓGICA IA (GROQ)
 # ==========================================
 def generate_script_and_identify_chars(reading_text, reading_type):
-    client = get_groq_client()
     regras = "Texto LIMPO."
     if "1ª" in reading_type: regras = "1. INÍCIO: 'Leitura do Livro...'. 2. FIM: 'Palavra do Senhor!'."
     if "2ª" in reading_type: regras = "1. INÍCIO: 'Leitura da Carta...'. 2. FIM: 'Palavra do Senhor!'."
@@ -133,15 +187,40 @@ def generate_script_and_identify_chars(reading_text, reading_type):
     5. oracao (15-20s): Inicie "Vamos orar". FIM "Amém!".
     EXTRA: Identifique PERSONAGENS (exceto Jesus/Deus). SAÍDA JSON: {{"roteiro": {{...}}, "personagens_identificados": [...]}}"""
     try:
-        chat = client.chat.completions.create(messages=[{"role": "system", "content": prompt}, {"role": "user", "content": f"Texto:\n{reading_text}"}], model="llama-3.3-70b-versatile", response_format={"type": "json_object"}, temperature=0.7)
-        return json.loads(chat.choices[0].message.content)
+        content = cached_chat_completion(get_groq_client, messages=[{"role": "system", "content": prompt}, {"role": "user", "content": f"Texto:\n{reading_text}"}], model=GROQ_MODEL, response_format={"type": "json_object"}, temperature=0.7, prompt_version=PROMPT_VERSION_SCRIPT, mode=llm_cache_mode(), validate=_is_json)
+        return json.loads(content)
     except: return None
 
-def generate_character_description(name):
+CHAR_TITLES = {"sao", "santo", "santa", "sto", "sta", "s", "apostolo", "profeta", "o", "a", "os", "as"}
+
+def normalize_char_name(name):
+    """Normaliza nomes para deduplicação ("São Pedro" == "Pedro" == "pedro")."""
+    if isinstance(name, dict): name = name.get('nome') or name.get('name') or ""
+    base = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode().lower()
+    words = [w for w in re.split(r"[^a-z0-9]+", base) if w and w not in CHAR_TITLES]
+    return " ".join(words)
+
+def char_display_name(name):
+    if isinstance(name, dict): name = name.get('nome') or name.get('name') or ""
+    return str(name).strip()
+
+def generate_character_descriptions(names):
+    """Descreve vários personagens em UMA chamada JSON. Retorna {nome: descrição}."""
+    if not names: return {}
+    names = sorted(set(names))  # Ordem estável = chave de cache estável
+    prompt = """Para CADA personagem bíblico da lista, escreva uma descrição visual detalhada (rosto, roupas, idade). ~300 chars. Realista.
+    SAÍDA JSON: {"personagens": {"Nome exatamente como na lista": "descrição", ...}}"""
+    out = {}
     try:
-        chat = get_groq_client().chat.completions.create(messages=[{"role": "user", "content": f"Descrição visual detalhada personagem bíblico: {name}. Rosto, roupas. ~300 chars. Realista."}], model="llama-3.3-70b-versatile", temperature=0.7)
-        return chat.choices[0].message.content.strip()
-    except: return "Sem descrição."
+        content = cached_chat_completion(get_groq_client, messages=[{"role": "system", "content": prompt}, {"role": "user", "content": json.dumps(names, ensure_ascii=False)}], model=GROQ_MODEL, response_format={"type": "json_object"}, temperature=0.7, prompt_version=PROMPT_VERSION_CHAR, mode=llm_cache_mode(), validate=_is_json)
+        data = json.loads(content)
+        descs = data.get("personagens", data) if isinstance(data, dict) else {}
+        by_norm = {normalize_char_name(k): v for k, v in descs.items() if isinstance(v, str)}
+        for n in names:
+            d = descs.get(n) if isinstance(descs.get(n), str) else by_norm.get(normalize_char_name(n))
+            if d: out[n] = d.strip()
+    except: pass
+    return {n: out.get(n, "Sem descrição.") for n in names}
 
 # --- FUNÇÃO AUXILIAR PARA CORRIGIR O ERRO ---
 def safe_get_text(data):
@@ -177,9 +256,10 @@ def extract(obj):
     if "content_psalm" in obj: return f"{obj.get('response', '')}\n" + ("\n".join(obj["content_psalm"]) if isinstance(obj["content_psalm"], list) else str(obj["content_psalm"]))
     return clean_text(obj.get("text") or obj.get("texto"))
 
-def render_calendar(history):
+def render_calendar():
     today = date.today()
     cal = calendar.monthcalendar(today.year, today.month)
+    history = db.history_between(f"{today.year}-{today.month:02d}-01", f"{today.year}-{today.month:02d}-31")
     html = f"<div style='font-size:12px; font-family:monospace; text-align:center; border:1px solid #ddd; padding:5px; border-radius:5px; background:white;'><strong>{calendar.month_name[today.month]}</strong><div style='display:grid; grid-template-columns:repeat(7, 1fr); gap:2px;'>"
     for week in cal:
         for day in week:
@@ -194,18 +274,52 @@ def render_calendar(history):
 # ==========================================
 # PROCESSAMENTO CENTRAL (SINGLE & MASS)
 # ==========================================
+def restore_batch(mode_key, batch_id):
+    """Reconstrói o estado da sessão a partir do checkpoint salvo no banco."""
+    state = db.batch_state(batch_id)
+    if state is None: return False
+    daily, scripts = [], []
+    for it in state["items"]:
+        d_show = datetime.strptime(it['d_iso'], "%Y-%m-%d").strftime("%d/%m/%Y")
+        meta = {"type": it['type'], "text": it['text'], "ref": it['ref'], "d_show": d_show, "d_iso": it['d_iso']}
+        daily.append(meta)
+        if it['step'] >= db.STEP_SCRIPTED and it['roteiro'] is not None:
+            scripts.append({"meta": meta, "roteiro": it['roteiro'], "chars": it['chars'], "prompts": it['prompts'], "sent": it['step'] >= db.STEP_SENT})
+    st.session_state[f"{mode_key}_daily"] = daily
+    st.session_state[f"{mode_key}_scripts"] = scripts
+    st.session_state[f"{mode_key}_missing"] = [datetime.strptime(d, "%Y-%m-%d").date() for d in state["missing"]]
+    st.session_state[f"{mode_key}_batch"] = batch_id
+    return True
+
 def run_process_dashboard(mode_key, dt_ini, dt_fim):
     k_daily = f"{mode_key}_daily"
     k_scripts = f"{mode_key}_scripts"
     k_missing = f"{mode_key}_missing"
+    k_batch = f"{mode_key}_batch"
 
+    if k_daily not in st.session_state:
+        # Sessão nova (reconexão/reinício): retoma o último lote salvo deste modo
+        last = db.batch_latest(mode_key)
+        if last and restore_batch(mode_key, last): st.info(f"♻️ Lote retomado do checkpoint ({last.split(':', 1)[1].replace(':', ' → ')}).")
     if k_daily not in st.session_state: st.session_state[k_daily] = []
     if k_scripts not in st.session_state: st.session_state[k_scripts] = []
     if k_missing not in st.session_state: st.session_state[k_missing] = []
+    if k_batch not in st.session_state: st.session_state[k_batch] = None
+    batch_id = st.session_state[k_batch]
 
     # 1. BUSCA
-    if st.button("🔎 Buscar Leituras", key=f"btn_fetch_{mode_key}"):
+    c_fetch, c_reset = st.columns([3, 1])
+    with c_reset:
+        if batch_id and st.button("🔁 Recomeçar Lote", key=f"btn_reset_{mode_key}", help="Descarta o checkpoint e começa do zero."):
+            db.batch_reset(batch_id)
+            for k in (k_daily, k_scripts, k_missing): st.session_state[k] = []
+            st.session_state[k_batch] = None
+            st.rerun()
+    if c_fetch.button("🔎 Buscar Leituras", key=f"btn_fetch_{mode_key}"):
         if dt_fim < dt_ini: st.error("Data final < inicial"); return
+        batch_id = f"{mode_key}:{dt_ini.isoformat()}:{dt_fim.isoformat()}"
+        db.batch_start(batch_id, mode_key, dt_ini.isoformat(), dt_fim.isoformat())
+        st.session_state[k_batch] = batch_id
         st.session_state[k_daily] = []
         st.session_state[k_scripts] = []
         st.session_state[k_missing] = []
@@ -214,9 +328,16 @@ def run_process_dashboard(mode_key, dt_ini, dt_fim):
             curr = dt_ini
             while curr <= dt_fim:
                 st.write(f"🗓️ {curr.strftime('%d/%m')}")
-                data = fetch_liturgia(curr)
                 day_readings = []
                 has_gospel = False
+                stored = db.get_readings(curr.strftime("%Y-%m-%d"))
+                data = None
+                if any(x['type'] == "Evangelho" for x in stored):
+                    # Leitura já buscada antes: vem do banco, sem chamada de rede
+                    day_readings = [{**x, "d_show": curr.strftime("%d/%m/%Y")} for x in stored]
+                    has_gospel = True
+                else:
+                    data = fetch_liturgia(curr)
                 
                 if data:
                     rds = data.get('readings') or data.get('today', {}).get('readings', {}) or data
@@ -284,12 +405,18 @@ def run_process_dashboard(mode_key, dt_ini, dt_fim):
                     if ev: day_readings.append(ev); has_gospel = True
 
                 if has_gospel:
+                    if data: db.save_readings(day_readings)
+                    db.batch_mark(batch_id, day_readings, db.STEP_FETCHED)
+                    db.batch_set_missing(batch_id, [curr.strftime("%Y-%m-%d")], resolved=True)
                     st.session_state[k_daily].extend(day_readings)
                 else:
                     st.warning(f"⚠️ {curr.strftime('%d/%m')}: Dados insuficientes. Fila manual.")
+                    db.batch_set_missing(batch_id, [curr.strftime("%Y-%m-%d")])
                     st.session_state[k_missing].append(curr)
                 
                 curr += timedelta(days=1)
+            # Recarrega do checkpoint: roteiros/envios já concluídos deste lote são preservados
+            restore_batch(mode_key, batch_id)
             status.update(label="Busca finalizada!", state="complete")
 
     # 2. FILA MANUAL
@@ -310,6 +437,12 @@ def run_process_dashboard(mode_key, dt_ini, dt_fim):
                 if tsl: st.session_state[k_daily].append({"type": "Salmo", "text": tsl, "ref": rsl or "Salmo", "d_show": ds, "d_iso": di})
                 if t2: st.session_state[k_daily].append({"type": "2ª Leitura", "text": t2, "ref": r2 or "2ª Leitura", "d_show": ds, "d_iso": di})
                 if tev: st.session_state[k_daily].append({"type": "Evangelho", "text": tev, "ref": rev or "Evangelho", "d_show": ds, "d_iso": di})
+                if tev:
+                    day_readings = [x for x in st.session_state[k_daily] if x['d_iso'] == di]
+                    db.save_readings(day_readings, source="manual")
+                    if batch_id:
+                        db.batch_mark(batch_id, day_readings, db.STEP_FETCHED)
+                        db.batch_set_missing(batch_id, [di], resolved=True)
                 st.session_state[k_missing].pop(0); st.rerun()
 
     # 3. LISTAGEM & GERAÇÃO
@@ -320,34 +453,57 @@ def run_process_dashboard(mode_key, dt_ini, dt_fim):
         with st.expander("Ver Detalhes"):
             for i in st.session_state[k_daily]: st.text(f"{i['d_show']} | {i['type']} | {i['ref']}")
 
-        if st.button("✨ Gerar Roteiros", key=f"btn_gen_{mode_key}"):
-            st.session_state[k_scripts] = []
+        done = {(s['meta']['d_iso'], s['meta']['type']) for s in st.session_state[k_scripts]}
+        pending = [r for r in st.session_state[k_daily] if (r['d_iso'], r['type']) not in done]
+        if done and not pending: st.caption(f"✅ Todos os {len(done)} roteiros já gerados (checkpoint).")
+        if pending and st.button(f"✨ Gerar Roteiros ({len(pending)} pendentes)", key=f"btn_gen_{mode_key}"):
             char_db = load_characters()
+            known = {normalize_char_name(n): n for n in char_db}
+            new_chars = {}  # nome normalizado -> nome exibido (coletados no lote inteiro)
+            # Personagens de roteiros retomados que ainda não foram descritos
+            for s in st.session_state[k_scripts]:
+                for c in s['chars']:
+                    if c not in char_db: new_chars.setdefault(normalize_char_name(c), c)
             prog = st.progress(0)
-            for i, r in enumerate(st.session_state[k_daily]):
+            for i, r in enumerate(pending):
                 res = generate_script_and_identify_chars(r['text'], r['type'])
                 if res:
-                    chars = res.get('personagens_identificados', [])
-                    for c in chars:
-                        if c not in char_db: char_db[c] = generate_character_description(c)
-                    save_characters(char_db)
+                    chars = []
+                    for c in res.get('personagens_identificados', []):
+                        key = normalize_char_name(c)
+                        if not key: continue
+                        canon = known.get(key) or new_chars.setdefault(key, char_display_name(c))
+                        if canon not in chars: chars.append(canon)
                     st.session_state[k_scripts].append({"meta": r, "roteiro": res.get('roteiro', {}), "chars": chars})
-                prog.progress((i+1)/len(st.session_state[k_daily]))
+                    # Checkpoint por item: uma queda no meio não perde o que já foi pago
+                    db.save_script(r, res.get('roteiro', {}), chars)
+                    if batch_id: db.batch_mark(batch_id, [r], db.STEP_SCRIPTED)
+                prog.progress((i+1)/len(pending))
+            st.session_state[k_scripts].sort(key=lambda x: x['meta']['d_iso'])
+            if new_chars:
+                with st.spinner(f"Descrevendo {len(new_chars)} novos personagens..."):
+                    save_characters(generate_character_descriptions(list(new_chars.values())))
             st.rerun()
 
     # 4. PREVIEW & ENVIO
     if st.session_state[k_scripts]:
         st.divider(); st.write("🚀 **Envio**")
-        hist = load_history()
         dates = sorted(list(set([s['meta']['d_iso'] for s in st.session_state[k_scripts]])))
-        dups = [d for d in dates if d in hist]
+        sent_before = db.history_contains(dates)
+        dups = [d for d in dates if d in sent_before]
         
         if dups: st.warning(f"⚠️ Já enviados: {dups}")
         force = st.checkbox("Confirmar duplicidade", key=f"chk_{mode_key}") if dups else True
+        k_nonce = f"{mode_key}_resend_nonce"  # Um nonce por confirmação: repetir o clique após falha não duplica de novo
+        if dups and force: st.session_state.setdefault(k_nonce, uuid.uuid4().hex[:12])
+        else: st.session_state.pop(k_nonce, None)
 
+        char_db = load_characters()
+        n_sent = sum(1 for s in st.session_state[k_scripts] if s.get('sent'))
+        if n_sent: st.info(f"♻️ {n_sent}/{len(st.session_state[k_scripts])} já enviados neste lote (serão pulados).")
         for s in st.session_state[k_scripts]:
             m, r = s['meta'], s['roteiro']
-            prompts = build_prompts(r, s['chars'], load_characters(), STYLE_SUFFIX)
+            prompts = s.get('prompts') or build_prompts(r, s['chars'], char_db, STYLE_SUFFIX)
             
             # Helper seguro para display
             def get_disp(k):
@@ -355,7 +511,7 @@ def run_process_dashboard(mode_key, dt_ini, dt_fim):
                 if isinstance(val, dict): return val.get('text', '')
                 return str(val) if val else ''
 
-            with st.expander(f"✅ {m['d_show']} - {m['type']} ({m['ref']})"):
+            with st.expander(f"{'📤' if s.get('sent') else '✅'} {m['d_show']} - {m['type']} ({m['ref']})"):
                 st.subheader("📝 Texto do Roteiro")
                 st.markdown(f"**🎣 Hook:** {safe_get_text(r.get('hook'))}")
                 st.text_area("📖 Leitura", safe_get_text(r.get('leitura')), height=150, key=f"l_{m['ref']}_{mode_key}")
@@ -387,12 +543,22 @@ def run_process_dashboard(mode_key, dt_ini, dt_fim):
                     st.caption("5. Oração")
                     st.code(prompts.get('oracao', '---'), language="text")
 
-        if st.button("🚀 Enviar Lote", disabled=not force, key=f"snd_{mode_key}"):
-            prog = st.progress(0); sent = set(); cnt=0
+        c_par, c_bat = st.columns(2)
+        with c_par: n_workers = st.slider("Envios paralelos", 1, 8, GAS_MAX_WORKERS, key=f"par_{mode_key}")
+        with c_bat: batch_mode = st.checkbox("Modo lote (vários jobs por requisição)", key=f"batchmode_{mode_key}", help="Requer suporte a action=generate_jobs_batch no GAS.")
+
+        if st.button("🚀 Enviar Lote", disabled=not force or n_sent == len(st.session_state[k_scripts]), key=f"snd_{mode_key}"):
+            gas_url = get_gas_url()
+            if not gas_url: return
+            prog = st.progress(0); cnt=0
             char_db = load_characters()
-            for i, s in enumerate(st.session_state[k_scripts]):
+            to_send, payloads = [], []
+            for idx, s in enumerate(st.session_state[k_scripts]):
+                if s.get('sent'): continue
                 m, r = s['meta'], s['roteiro']
-                prompts = build_prompts(r, s['chars'], char_db, STYLE_SUFFIX)
+                prompts = s.get('prompts') or build_prompts(r, s['chars'], char_db, STYLE_SUFFIX)
+                s['prompts'] = prompts
+                if batch_id: db.batch_mark(batch_id, [m], db.STEP_PROMPTED, prompts=prompts)
                 
                 # Garante que o texto enviado seja string
                 def safe_txt(k):
@@ -405,10 +571,27 @@ def run_process_dashboard(mode_key, dt_ini, dt_fim):
                     "roteiro": {k: {"text": safe_txt(k), "prompt": prompts.get(k,'')} for k in ["hook", "leitura", "reflexao", "aplicacao", "oracao"]},
                     "assets": []
                 }
-                if send_to_gas(pld): cnt+=1; sent.add(m['d_iso'])
-                prog.progress((i+1)/len(st.session_state[k_scripts]))
-            
-            if cnt>0: update_history_bulk(list(sent)); st.balloons(); st.success(f"{cnt} enviados!"); st.rerun()
+                nonce = st.session_state.get(k_nonce, "") if m['d_iso'] in sent_before else ""
+                pld["idempotency_key"] = job_idempotency_key(pld, f"{batch_id or ''}:{m['d_iso']}:{m['type']}:{nonce}")
+                to_send.append(s); payloads.append(pld)
+
+            # Respostas chegam fora de ordem; checkpoint e progresso rodam na thread principal
+            sender = send_jobs_batched(payloads, gas_url) if batch_mode else send_jobs_concurrently(payloads, gas_url, n_workers)
+            for done_n, (i, job) in enumerate(sender, 1):
+                s = to_send[i]
+                if job:
+                    cnt+=1; s['sent'] = True
+                    if batch_id: db.batch_mark(batch_id, [s['meta']], db.STEP_SENT, job=job)
+                prog.progress(done_n/len(payloads))
+
+            # Histórico: apenas datas com TODOS os roteiros enviados com sucesso
+            by_date = {}
+            for s in st.session_state[k_scripts]: by_date.setdefault(s['meta']['d_iso'], []).append(bool(s.get('sent')))
+            ok_dates = [d for d, flags in by_date.items() if all(flags)]
+            failed = len(payloads) - cnt
+            if ok_dates: update_history_bulk(ok_dates)
+            if cnt>0 and not failed: st.balloons(); st.success(f"{cnt} enviados!"); st.rerun()
+            elif cnt>0: st.warning(f"{cnt} enviados, {failed} falharam. Clique em Enviar novamente para repetir só as falhas.")
             else: st.error("Falha.")
 
 # ==========================================
@@ -416,12 +599,16 @@ def run_process_dashboard(mode_key, dt_ini, dt_fim):
 # ==========================================
 def main():
     st.sidebar.title("⚙️ Config")
-    history = load_history()
-    render_calendar(history)
+    render_calendar()
     st.sidebar.markdown("---")
     if st.sidebar.button("Limpar Histórico"):
-        if os.path.exists(HISTORY_FILE): os.remove(HISTORY_FILE); st.rerun()
+        db.clear_history(); st.rerun()
     if st.sidebar.button("Limpar Cache"): st.session_state.clear(); st.rerun()
+    st.sidebar.markdown("---")
+    st.sidebar.radio("Cache IA (Groq)", CACHE_MODES, key="llm_cache_mode", help="Respostas repetidas vêm do disco, sem custo de tokens.")
+    stats = llm_cache_stats()
+    st.sidebar.caption(f"💾 {stats['entries']} respostas em cache ({stats['bytes'] // 1024} KB)")
+    if st.sidebar.button("Limpar Cache IA"): clear_llm_cache(); st.rerun()
 
     tab1, tab2, tab3 = st.tabs(["📅 Roteiro Único", "📚 Roteiros em Massa", "👥 Personagens"])
 
@@ -443,8 +630,8 @@ def main():
         for n, d in char_db.items():
             with st.expander(n):
                 new_d = st.text_area("Desc", d, key=f"ed_{n}")
-                if st.button("Salvar", key=f"sv_{n}"): char_db[n]=new_d; save_characters(char_db); st.rerun()
+                if st.button("Salvar", key=f"sv_{n}"): save_characters({n: new_d}); st.rerun()
         n = st.text_input("Novo"); d = st.text_area("Desc")
-        if st.button("Criar") and n: char_db[n]=d; save_characters(char_db); st.rerun()
+        if st.button("Criar") and n: save_characters({n: d}); st.rerun()
 
 if __name__ == "__main__": main()
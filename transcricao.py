@@ -0,0 +1,407 @@
+# transcricao.py — Modelos Whisper compartilhados pelo processo (todas as sessões e reruns)
+# O Streamlit reexecuta as páginas a cada interação; este módulo é importado uma vez por
+# processo, então o registro abaixo sobrevive a reruns e é compartilhado entre sessões.
+# Backends locais em CPU: openai-whisper (fp32) e faster-whisper (CTranslate2, int8).
+# Rodar `python transcricao.py video.mp4` mede RTF e memória de cada backend/modelo instalado.
+import os
+import time
+import logging
+import hashlib
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from cache_disco import make_key, cache_get, cache_set, cache_clear, cache_stats
+
+try:
+    import whisper
+except ImportError:
+    whisper = None
+
+try:
+    from faster_whisper import WhisperModel
+except ImportError:
+    WhisperModel = None
+
+BACKEND_OPENAI = "openai-whisper"
+BACKEND_FASTER = "faster-whisper"
+# Pasta local com os pesos; com ASR_OFFLINE=1 o faster-whisper não tenta baixar nada
+ASR_MODELS_DIR = os.getenv("ASR_MODELS_DIR") or None
+ASR_OFFLINE = os.getenv("ASR_OFFLINE", "0") == "1"
+
+_registry_lock = threading.Lock()
+_models: Dict[str, Any] = {}
+_model_info: Dict[str, Dict[str, float]] = {}
+_load_locks: Dict[str, threading.Lock] = {}
+_infer_locks: Dict[str, threading.Lock] = {}
+_run_stats: Dict[str, Dict[str, float]] = {}
+_warmup_started = False
+_warmup_errors: Dict[str, str] = {}  # "backend:tamanho" -> mensagem da última falha de pré-carga
+
+log = logging.getLogger(__name__)
+
+# Transcrição em paralelo: áudio longo é cortado em silêncios e cada trecho vai para um processo
+SAMPLE_RATE = 16000
+CPU_COUNT = os.cpu_count() or 1
+WHISPER_WORKERS = int(os.getenv("WHISPER_WORKERS", str(max(1, min(4, CPU_COUNT // 2)))))
+CHUNK_TARGET_S = 45.0      # Tamanho alvo de cada trecho
+CHUNK_SEARCH_S = 10.0      # Janela (±) para procurar o silêncio mais próximo do corte
+MIN_PARALLEL_S = 75.0      # Abaixo disso o custo de subir os workers não compensa
+VAD_FRAME_S = 0.03
+VAD_SMOOTH_FRAMES = 10     # ~300 ms: o corte cai no meio de uma pausa, não entre sílabas
+_pools: Dict[Tuple[str, str, int], ProcessPoolExecutor] = {}
+# Áudios acima deste tamanho de PCM (s16le, ~115 MB por hora) vão para um buffer mapeado em disco
+PCM_MEMMAP_MIN_MB = float(os.getenv("PCM_MEMMAP_MIN_MB", "256"))
+PCM_READ_CHUNK = 1 << 20
+
+# Cache de transcrições em disco: sobrevive a reinícios e é compartilhado entre sessões
+TRANSCRIPT_CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", "transcricao_cache")
+TRANSCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("TRANSCRIPT_CACHE_MAX_ENTRIES", "500"))
+
+
+def _lock_for(table: Dict[str, threading.Lock], key: str) -> threading.Lock:
+    with _registry_lock:
+        if key not in table: table[key] = threading.Lock()
+        return table[key]
+
+
+def process_rss_mb() -> Optional[float]:
+    """Memória residente do processo (MB)."""
+    try:
+        with open("/proc/self/statm") as f: pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except Exception:
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        except Exception: return None
+
+
+# =========================
+# Backends de ASR (interface: load(tamanho, threads) -> modelo; run(modelo, pcm, idioma, palavras) -> segmentos)
+# =========================
+def _load_openai(model_size: str, threads: Optional[int] = None):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    return whisper.load_model(model_size, device="cpu", download_root=ASR_MODELS_DIR)
+
+
+def _run_openai(model, audio: np.ndarray, language: str, word_timestamps: bool) -> List[Dict[str, Any]]:
+    return model.transcribe(audio, language=language, word_timestamps=word_timestamps, fp16=False)["segments"]
+
+
+def _params_openai(model) -> float:
+    return sum(p.numel() * p.element_size() for p in model.parameters()) / 1024 ** 2
+
+
+def _load_faster(model_size: str, threads: Optional[int] = None):
+    return WhisperModel(model_size, device="cpu", compute_type="int8", cpu_threads=threads or 0,
+                        download_root=ASR_MODELS_DIR, local_files_only=ASR_OFFLINE)
+
+
+def _run_faster(model, audio: np.ndarray, language: str, word_timestamps: bool) -> List[Dict[str, Any]]:
+    segments, _ = model.transcribe(audio, language=language, word_timestamps=word_timestamps, beam_size=5)
+    out = []
+    for seg in segments:  # Gerador: a decodificação acontece durante a iteração
+        item = {"id": len(out), "start": seg.start, "end": seg.end, "text": seg.text}
+        if seg.words:
+            item["words"] = [{"word": w.word, "start": w.start, "end": w.end, "probability": w.probability} for w in seg.words]
+        out.append(item)
+    return out
+
+
+ASR_BACKENDS: Dict[str, Dict[str, Any]] = {
+    BACKEND_FASTER: {"label": "faster-whisper (int8)", "sizes": ["tiny", "base", "small"], "available": WhisperModel is not None,
+                     "load": _load_faster, "run": _run_faster, "params_mb": None},
+    BACKEND_OPENAI: {"label": "openai-whisper (fp32)", "sizes": ["tiny", "base"], "available": whisper is not None,
+                     "load": _load_openai, "run": _run_openai, "params_mb": _params_openai},
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name, b in ASR_BACKENDS.items() if b["available"]]
+
+
+DEFAULT_BACKEND = os.getenv("ASR_BACKEND") or next(iter(available_backends()), BACKEND_OPENAI)
+# Modelos pré-carregados em background na inicialização (ex.: "tiny,base"; vazio desativa)
+WHISPER_WARMUP = [m for m in os.getenv("WHISPER_WARMUP", "tiny").split(",") if m.strip()]
+
+
+def model_key(model_size: str, backend: str = DEFAULT_BACKEND) -> str:
+    return f"{backend}:{model_size}"
+
+
+def get_whisper_model(model_size: str = "tiny", backend: str = DEFAULT_BACKEND):
+    """Carrega o modelo uma única vez por processo; chamadas concorrentes esperam o mesmo carregamento."""
+    spec = ASR_BACKENDS.get(backend)
+    if not spec or not spec["available"]: raise RuntimeError(f"Backend de ASR '{backend}' não instalado.")
+    key = model_key(model_size, backend)
+    model = _models.get(key)
+    if model is not None: return model
+    with _lock_for(_load_locks, key):
+        model = _models.get(key)
+        if model is not None: return model
+        t0, rss0 = time.time(), process_rss_mb()
+        model = spec["load"](model_size)
+        rss1 = process_rss_mb()
+        _model_info[key] = {
+            "load_s": round(time.time() - t0, 2),
+            "params_mb": round(spec["params_mb"](model), 1) if spec["params_mb"] else None,
+            "rss_delta_mb": round(rss1 - rss0, 1) if rss0 is not None and rss1 is not None else None,
+        }
+        _models[key] = model
+        return model
+
+
+def model_inference_lock(model_size: str, backend: str = DEFAULT_BACKEND) -> threading.Lock:
+    """O Whisper instala hooks de kv-cache no modelo durante a decodificação: uma inferência por vez por modelo."""
+    return _lock_for(_infer_locks, model_key(model_size, backend))
+
+
+def warm_up_models(sizes: Iterable[str] = WHISPER_WARMUP, background: bool = True, backend: str = DEFAULT_BACKEND):
+    """Pré-carrega os modelos (uma vez por processo), opcionalmente em uma thread daemon."""
+    global _warmup_started
+    with _registry_lock:
+        if _warmup_started or backend not in available_backends(): return
+        _warmup_started = True
+    sizes = [s.strip() for s in sizes if s.strip() in ASR_BACKENDS[backend]["sizes"]]
+
+    def _run():
+        for s in sizes:
+            key = model_key(s, backend)
+            try:
+                get_whisper_model(s, backend)
+                _warmup_errors.pop(key, None)
+            except Exception as e:
+                _warmup_errors[key] = str(e)
+                log.warning("Falha no warm-up do ASR (%s): %s", key, e)
+
+    if background: threading.Thread(target=_run, name="whisper-warmup", daemon=True).start()
+    else: _run()
+
+
+def models_status() -> Dict[str, Any]:
+    """Modelos carregados, em carregamento, falhas de pré-carga e memória usada (para exibir na interface)."""
+    loading = [s for s, lk in list(_load_locks.items()) if lk.locked() and s not in _models]
+    return {"loaded": dict(_model_info), "loading": loading, "errors": dict(_warmup_errors), "runs": dict(_run_stats), "rss_mb": process_rss_mb()}
+
+
+# =========================
+# Transcrição em trechos paralelos
+# =========================
+def extract_pcm(media_path: str, sr: int = SAMPLE_RATE, memmap_min_mb: Optional[float] = PCM_MEMMAP_MIN_MB) -> np.ndarray:
+    """
+    Decodifica o áudio com o ffmpeg direto para memória (s16le mono pela stdout, sem arquivo
+    intermediário). Retorna float32 em [-1, 1]; acima de `memmap_min_mb` devolve um int16
+    mapeado em um arquivo temporário anônimo (convertido por trecho em `as_float32`).
+    """
+    cmd = ["ffmpeg", "-nostdin", "-v", "error", "-i", media_path, "-vn", "-ac", "1", "-ar", str(sr), "-f", "s16le", "pipe:1"]
+    limit = int(memmap_min_mb * 1024 ** 2) if memmap_min_mb else None
+    buf, spill = bytearray(), None
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while True:
+            block = proc.stdout.read(PCM_READ_CHUNK)
+            if not block: break
+            if spill is not None: spill.write(block); continue
+            buf += block
+            if limit and len(buf) > limit:
+                spill = tempfile.TemporaryFile(prefix="pcm_"); spill.write(buf); buf = bytearray()
+        err = proc.stderr.read().decode(errors="ignore")
+        if proc.wait() != 0: raise RuntimeError(f"ffmpeg falhou ao extrair áudio: {err.strip()}")
+    finally:
+        if proc.poll() is None: proc.kill()
+
+    if spill is None:
+        n = len(buf) // 2
+        return np.frombuffer(buf, dtype=np.int16, count=n).astype(np.float32) / 32768.0
+    spill.flush()
+    n = spill.tell() // 2
+    return np.memmap(spill, dtype=np.int16, mode="r", shape=(n,))
+
+
+def as_float32(audio: np.ndarray) -> np.ndarray:
+    if audio.dtype == np.int16: return np.asarray(audio, dtype=np.float32) / 32768.0
+    return np.ascontiguousarray(audio, dtype=np.float32)
+
+
+def frame_energy(audio: np.ndarray, sr: int = SAMPLE_RATE, frame_s: float = VAD_FRAME_S) -> np.ndarray:
+    """Energia RMS por quadro, suavizada por média móvel (VAD por energia, barato)."""
+    hop = max(1, int(sr * frame_s))
+    n = len(audio) // hop
+    if n == 0: return np.zeros(0, dtype=np.float32)
+    rms = np.empty(n, dtype=np.float32)
+    step = max(1, (SAMPLE_RATE * 60) // hop)  # Blocos de ~1 min: não duplica um memmap inteiro em float
+    for i in range(0, n, step):
+        j = min(n, i + step)
+        rms[i:j] = np.sqrt(np.mean(as_float32(audio[i * hop:j * hop]).reshape(j - i, hop) ** 2, axis=1))
+    k = min(VAD_SMOOTH_FRAMES, n)
+    return np.convolve(rms, np.ones(k) / k, mode="same")
+
+
+def split_on_silence(audio: np.ndarray, sr: int = SAMPLE_RATE, target_s: float = CHUNK_TARGET_S,
+                     search_s: float = CHUNK_SEARCH_S) -> List[Tuple[int, int]]:
+    """Cortes (amostra inicial, final) perto de cada `target_s`, no quadro mais silencioso da janela."""
+    total = len(audio)
+    if total <= int((target_s + search_s) * sr): return [(0, total)]
+    energy = frame_energy(audio, sr)
+    hop = int(sr * VAD_FRAME_S)
+    bounds, start = [], 0
+    while total - start > int((target_s + search_s) * sr):
+        lo = (start + int((target_s - search_s) * sr)) // hop
+        hi = min(len(energy), (start + int((target_s + search_s) * sr)) // hop)
+        cut = (lo + int(np.argmin(energy[lo:hi]))) * hop if hi > lo else start + int(target_s * sr)
+        bounds.append((start, cut)); start = cut
+    bounds.append((start, total))
+    return bounds
+
+
+def _offset_segments(segments: List[Dict[str, Any]], offset: float) -> List[Dict[str, Any]]:
+    out = []
+    for seg in segments:
+        seg = dict(seg, start=seg["start"] + offset, end=seg["end"] + offset)
+        if seg.get("words"):
+            seg["words"] = [dict(w, start=w["start"] + offset, end=w["end"] + offset) for w in seg["words"]]
+        seg.pop("tokens", None)  # Não precisa atravessar o pickle de volta
+        out.append(seg)
+    return out
+
+
+# Estado de cada processo worker (um modelo por processo, threads limitadas)
+_worker_backend = None
+_worker_model = None
+
+
+def _worker_init(backend: str, model_size: str, threads: int):
+    global _worker_backend, _worker_model
+    _worker_backend = backend
+    _worker_model = ASR_BACKENDS[backend]["load"](model_size, max(1, threads))
+
+
+def _worker_transcribe(chunk: np.ndarray, offset: float, language: str, word_timestamps: bool) -> Tuple[List[Dict[str, Any]], Optional[float]]:
+    segments = ASR_BACKENDS[_worker_backend]["run"](_worker_model, chunk, language, word_timestamps)
+    return _offset_segments(segments, offset), process_rss_mb()
+
+
+def _get_pool(backend: str, model_size: str, workers: int) -> ProcessPoolExecutor:
+    """Pool persistente por (backend, modelo, workers): os processos carregam o modelo uma vez só."""
+    key = (backend, model_size, workers)
+    with _registry_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_worker_init, initargs=(backend, model_size, CPU_COUNT // workers))
+            _pools[key] = pool
+        return pool
+
+
+def transcribe_pcm(audio: np.ndarray, model_size: str = "tiny", language: str = "pt", word_timestamps: bool = True,
+                   workers: Optional[int] = None, backend: str = DEFAULT_BACKEND) -> List[Dict[str, Any]]:
+    """
+    Transcreve PCM float32 16 kHz. Áudios longos são cortados em silêncios e os trechos
+    transcritos em processos paralelos; os segmentos voltam com o tempo já corrigido.
+    Registra o fator de tempo real (RTF = tempo de parede / duração do áudio) por modelo.
+    """
+    workers = WHISPER_WORKERS if workers is None else workers
+    bounds = split_on_silence(audio) if len(audio) >= MIN_PARALLEL_S * SAMPLE_RATE else [(0, len(audio))]
+    t0 = time.time()
+    if workers <= 1 or len(bounds) == 1:
+        model = get_whisper_model(model_size, backend)
+        with model_inference_lock(model_size, backend):
+            segments = ASR_BACKENDS[backend]["run"](model, as_float32(audio), language, word_timestamps)
+        workers, worker_rss = 1, None
+    else:
+        workers = min(workers, len(bounds))
+        pool = _get_pool(backend, model_size, workers)
+        futures = [pool.submit(_worker_transcribe, as_float32(audio[a:b]), a / SAMPLE_RATE, language, word_timestamps) for a, b in bounds]
+        results = [fut.result() for fut in futures]
+        segments = [seg for segs, _ in results for seg in segs]
+        for i, seg in enumerate(segments): seg["id"] = i
+        worker_rss = max((rss for _, rss in results if rss), default=None)
+
+    audio_s = len(audio) / SAMPLE_RATE
+    wall_s = time.time() - t0
+    _run_stats[model_key(model_size, backend)] = {
+        "audio_s": round(audio_s, 1), "wall_s": round(wall_s, 2), "rtf": round(wall_s / audio_s, 3) if audio_s else None,
+        "workers": workers, "worker_rss_mb": round(worker_rss, 1) if worker_rss else None,
+    }
+    return segments
+
+
+# =========================
+# Cache por impressão digital do áudio
+# =========================
+def audio_fingerprint(audio: np.ndarray) -> str:
+    """sha256 do PCM decodificado (int16), em blocos: independe do contêiner/nome do vídeo."""
+    h = hashlib.sha256()
+    step = SAMPLE_RATE * 60
+    for i in range(0, len(audio), step):
+        block = audio[i:i + step]
+        if block.dtype != np.int16: block = np.clip(np.round(block * 32768.0), -32768, 32767).astype(np.int16)
+        h.update(np.ascontiguousarray(block).tobytes())
+    return h.hexdigest()
+
+
+def _plain_segments(segments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Só o que o editor usa, com tipos nativos (o Whisper devolve escalares NumPy em alguns campos)."""
+    out = []
+    for seg in segments:
+        item = {"id": int(seg.get("id", len(out))), "start": float(seg["start"]), "end": float(seg["end"]), "text": str(seg.get("text", ""))}
+        if seg.get("words"):
+            item["words"] = [{"word": str(w["word"]), "start": float(w["start"]), "end": float(w["end"]),
+                              "probability": float(w.get("probability", 0.0))} for w in seg["words"]]
+        out.append(item)
+    return out
+
+
+def transcribe_cached(audio: np.ndarray, model_size: str = "tiny", language: str = "pt", word_timestamps: bool = True,
+                      use_cache: bool = True, backend: str = DEFAULT_BACKEND) -> Tuple[List[Dict[str, Any]], bool]:
+    """`transcribe_pcm` com cache em disco. Retorna (segmentos, veio_do_cache)."""
+    key = make_key("whisper", audio_fingerprint(audio), backend, model_size, language, word_timestamps)
+    if use_cache:
+        hit = cache_get(TRANSCRIPT_CACHE_DIR, key)
+        if hit is not None: return hit, True
+    segments = _plain_segments(transcribe_pcm(audio, model_size, language, word_timestamps, backend=backend))
+    if segments:
+        cache_set(TRANSCRIPT_CACHE_DIR, key, segments, TRANSCRIPT_CACHE_MAX_ENTRIES,
+                  meta={"backend": backend, "model": model_size, "language": language, "duration_s": round(len(audio) / SAMPLE_RATE, 1)})
+    return segments, False
+
+
+def clear_transcript_cache() -> int: return cache_clear(TRANSCRIPT_CACHE_DIR)
+def transcript_cache_stats() -> Dict[str, int]: return cache_stats(TRANSCRIPT_CACHE_DIR)
+
+
+# =========================
+# Benchmark: python transcricao.py video.mp4 [backend ...]
+# =========================
+def benchmark(media_path: str, backends: Optional[List[str]] = None, language: str = "pt") -> List[Dict[str, Any]]:
+    """Transcreve o mesmo áudio com cada backend/modelo em um único fluxo e mede RTF e memória."""
+    audio = as_float32(extract_pcm(media_path))
+    rows = []
+    for backend in backends or available_backends():
+        for size in ASR_BACKENDS[backend]["sizes"]:
+            try:
+                get_whisper_model(size, backend)
+                segments = transcribe_pcm(audio, size, language, word_timestamps=True, workers=1, backend=backend)
+            except Exception as e:
+                rows.append({"model": model_key(size, backend), "error": str(e)}); continue
+            key = model_key(size, backend)
+            rows.append({"model": key, **_model_info[key], **_run_stats[key],
+                         "words": sum(len(s.get("words") or []) for s in segments), "rss_mb": round(process_rss_mb() or 0, 1)})
+    return rows
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) < 2: sys.exit("uso: python transcricao.py <audio/video> [backend ...]")
+    for row in benchmark(sys.argv[1], sys.argv[2:] or None):
+        if "error" in row: print(f"{row['model']:<22} erro: {row['error']}"); continue
+        print(f"{row['model']:<22} RTF {row['rtf']:.3f}  carga {row['load_s']:.1f}s  +RSS {row['rss_delta_mb']} MB  "
+              f"pesos {row['params_mb']} MB  palavras {row['words']}")
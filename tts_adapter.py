@@ -0,0 +1,180 @@
+# tts_adapter.py — Síntese de voz com o tempo de cada palavra registrado junto com o áudio
+# edge-tts emite WordBoundary e o Google Cloud TTS devolve as marcas SSML (<mark/>) durante a
+# síntese: as legendas saem desses tempos, sem passar o áudio pelo Whisper. O gTTS não tem
+# marcas; nele o tempo é medido por frase (MP3 de cada trecho) e distribuído por sílabas.
+import json
+import base64
+import asyncio
+from html import escape
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from alinhamento import align_word_timings, mp3_duration, split_sentences, timing_from_blocks
+
+try:
+    import edge_tts
+except ImportError:
+    edge_tts = None
+
+try:
+    from google.cloud import texttospeech_v1beta1 as gtts_cloud  # enable_time_pointing só existe na v1beta1
+except ImportError:
+    gtts_cloud = None
+
+ENGINE_GTTS = "gtts"
+ENGINE_EDGE = "edge"
+ENGINE_GOOGLE = "google"
+
+TTS_ENGINES: Dict[str, Dict[str, Any]] = {
+    ENGINE_GTTS: {"label": "gTTS (grátis, tempo estimado por frase)", "voices": ["pt"], "exact": False},
+    ENGINE_EDGE: {"label": "Edge TTS (tempo exato por palavra)", "voices": ["pt-BR-FranciscaNeural", "pt-BR-AntonioNeural", "pt-BR-ThalitaNeural"], "exact": True},
+    ENGINE_GOOGLE: {"label": "Google Cloud TTS (marcas SSML)", "voices": ["pt-BR-Wavenet-B", "pt-BR-Wavenet-A", "pt-BR-Neural2-B", "pt-BR-Neural2-A"], "exact": True},
+}
+GOOGLE_MAX_SSML_BYTES = 4800  # A API recusa entradas acima de 5000 bytes (tags <mark/> incluídas)
+TIMINGS_ASSET = "timings"  # Tipo do asset do job com os tempos por palavra (contrato em timings_asset)
+
+WordTimings = List[Dict[str, Any]]
+
+
+def available_engines() -> List[str]:
+    ok = {ENGINE_GTTS: True, ENGINE_EDGE: edge_tts is not None, ENGINE_GOOGLE: gtts_cloud is not None}
+    return [k for k in TTS_ENGINES if ok[k]]
+
+
+def _run_async(coro):
+    """asyncio.run fora de loop; dentro de um loop já rodando (ex.: Tornado), numa thread própria."""
+    try: asyncio.get_running_loop()
+    except RuntimeError: return asyncio.run(coro)
+    with ThreadPoolExecutor(max_workers=1) as ex: return ex.submit(asyncio.run, coro).result()
+
+
+# =========================
+# Motores
+# =========================
+def _gtts_bytes(text: str) -> bytes:
+    from gtts import gTTS  # type: ignore
+    fp = BytesIO()
+    gTTS(text=text, lang="pt", slow=False).write_to_fp(fp)
+    return fp.getvalue()
+
+
+def _synth_gtts(text: str, voice: Optional[str]) -> Tuple[bytes, WordTimings]:
+    """Frase a frase (em paralelo); quadros MP3 concatenados formam um stream válido."""
+    frases = split_sentences(text)
+    with ThreadPoolExecutor(max_workers=min(4, len(frases))) as ex: partes = list(ex.map(_gtts_bytes, frases))
+    words, timings = timing_from_blocks([{"text": f, "duration": mp3_duration(p)} for f, p in zip(frases, partes)])
+    return b"".join(partes), [{"word": w, "start": s, "end": e} for w, (s, e) in zip(words, timings)]
+
+
+async def _edge_stream(text: str, voice: str) -> Tuple[bytes, WordTimings]:
+    try: com = edge_tts.Communicate(text, voice, boundary="WordBoundary")  # edge-tts >= 7 emite SentenceBoundary por padrão
+    except TypeError: com = edge_tts.Communicate(text, voice)
+    audio, words = bytearray(), []
+    async for chunk in com.stream():
+        if chunk["type"] == "audio": audio.extend(chunk["data"])
+        elif chunk["type"] == "WordBoundary":  # offset/duration em unidades de 100 ns
+            start = chunk["offset"] / 1e7
+            words.append({"word": chunk["text"], "start": start, "end": start + chunk["duration"] / 1e7})
+    return bytes(audio), words
+
+
+def _synth_edge(text: str, voice: Optional[str]) -> Tuple[bytes, WordTimings]:
+    """As fronteiras vêm sem pontuação (e números por extenso): o tempo é transferido para as palavras do roteiro."""
+    audio, boundaries = _run_async(_edge_stream(text, voice or TTS_ENGINES[ENGINE_EDGE]["voices"][0]))
+    tokens = text.split()
+    if not boundaries: return audio, []
+    return audio, [{"word": w, "start": s, "end": e} for w, (s, e) in zip(tokens, align_word_timings(tokens, boundaries))]
+
+
+def _ssml(tokens: List[str], first: int) -> str:
+    return "<speak>" + " ".join(f'<mark name="{first + i}"/>{escape(w)}' for i, w in enumerate(tokens)) + "</speak>"
+
+
+def _google_groups(text: str, tokens: List[str]) -> List[Tuple[int, int]]:
+    """Faixas [a, b) de palavras cujo SSML cabe num pedido: frases inteiras juntas; frase grande demais, por palavras."""
+    size = lambda a, b: len(_ssml(tokens[a:b], a).encode("utf-8"))
+    units, i = [], 0
+    for sent in split_sentences(text, max_chars=len(text) + 1):  # Sem corte dentro da frase: as palavras batem com `tokens`
+        n = len(sent.split()); units.append((i, i + n)); i += n
+    groups = []
+    for a, b in units:
+        if groups and size(groups[-1][0], b) <= GOOGLE_MAX_SSML_BYTES: groups[-1] = (groups[-1][0], b); continue
+        while size(a, b) > GOOGLE_MAX_SSML_BYTES:
+            k = a + 1
+            while k < b and size(a, k + 1) <= GOOGLE_MAX_SSML_BYTES: k += 1
+            groups.append((a, k)); a = k
+        if a < b: groups.append((a, b))
+    return groups
+
+
+def _synth_google(text: str, voice: Optional[str], creds_info: Optional[Dict[str, Any]] = None) -> Tuple[bytes, WordTimings]:
+    """
+    Uma <mark name="N"/> antes de cada palavra; o fim de uma palavra é a marca da seguinte.
+    Textos longos (a leitura) passam do limite de bytes da API: vão em grupos de frases, e as marcas
+    de cada grupo são deslocadas pela duração dos anteriores (quadros MP3 concatenados, como no gTTS).
+    """
+    tokens = text.split()
+    client_args = {}
+    if creds_info:
+        from google.oauth2 import service_account
+        client_args["credentials"] = service_account.Credentials.from_service_account_info(creds_info)
+    client = gtts_cloud.TextToSpeechClient(**client_args)
+    name = voice or TTS_ENGINES[ENGINE_GOOGLE]["voices"][0]
+
+    def _one(group: Tuple[int, int]) -> Tuple[bytes, List[Tuple[int, float]]]:
+        a, b = group
+        resp = client.synthesize_speech(request=gtts_cloud.SynthesizeSpeechRequest(
+            input=gtts_cloud.SynthesisInput(ssml=_ssml(tokens[a:b], a)),
+            voice=gtts_cloud.VoiceSelectionParams(language_code="-".join(name.split("-")[:2]), name=name),
+            audio_config=gtts_cloud.AudioConfig(audio_encoding=gtts_cloud.AudioEncoding.MP3),
+            enable_time_pointing=[gtts_cloud.SynthesizeSpeechRequest.TimepointType.SSML_MARK]))
+        return resp.audio_content, [(int(tp.mark_name), tp.time_seconds) for tp in resp.timepoints]
+
+    groups = _google_groups(text, tokens)
+    with ThreadPoolExecutor(max_workers=min(4, len(groups))) as ex: partes = list(ex.map(_one, groups))
+    marks, total = [], 0.0
+    for audio, group_marks in partes:
+        marks.extend((i, total + t) for i, t in group_marks)
+        total += mp3_duration(audio)
+    marks.sort()
+    words = [{"word": tokens[i], "start": t, "end": marks[k + 1][1] if k + 1 < len(marks) else max(t, total)} for k, (i, t) in enumerate(marks)]
+    if words and len(words) != len(tokens):  # Marca perdida: as palavras sem marca são interpoladas
+        words = [{"word": w, "start": s, "end": e} for w, (s, e) in zip(tokens, align_word_timings(tokens, words))]
+    return b"".join(a for a, _ in partes), words
+
+
+def synthesize(text: str, engine: str = ENGINE_GTTS, voice: Optional[str] = None,
+               creds_info: Optional[Dict[str, Any]] = None) -> Tuple[Optional[BytesIO], WordTimings]:
+    """
+    Áudio MP3 + [{"word", "start", "end"}] em segundos desde o início do áudio.
+    `creds_info`: conta de serviço (dict) para o Google Cloud; sem ela usa as credenciais padrão do ambiente.
+    """
+    if not text or not text.strip(): return None, []
+    if engine not in available_engines(): raise RuntimeError(f"Motor de voz indisponível: {engine}")
+    try:
+        if engine == ENGINE_EDGE: audio, words = _synth_edge(text, voice)
+        elif engine == ENGINE_GOOGLE: audio, words = _synth_google(text, voice, creds_info)
+        else: audio, words = _synth_gtts(text, voice)
+    except Exception as e: raise RuntimeError(f"Erro TTS ({engine}): {e}")
+    if not audio: raise RuntimeError(f"Erro TTS ({engine}): áudio vazio")
+    fp = BytesIO(audio); fp.seek(0)
+    return fp, words
+
+
+# =========================
+# Assets do job
+# =========================
+def timings_asset(block_id: str, words: WordTimings) -> Dict[str, Any]:
+    """
+    Asset que acompanha o áudio do bloco no payload do job (`assets` do JSON salvo no Drive/GAS).
+    Contrato (lido por alinhamento.parse_timings_asset; inválido = ignorado):
+      block_id: o mesmo do asset "audio" do bloco ("hook", "leitura", ...)
+      type:     "timings"
+      data_b64: base64 do JSON UTF-8 [{"word": str, "start": s, "end": s}, ...] na ordem das palavras
+                do roteiro, em segundos desde o início do áudio do bloco, start <= end e starts crescentes.
+    Quem monta os assets do job (página de Produção, fora deste repositório) deve enviar um por
+    áudio gerado com `synthesize`; sem ele editor e lote voltam à distribuição/Whisper.
+    """
+    data = json.dumps([{"word": w["word"], "start": round(w["start"], 3), "end": round(w["end"], 3)} for w in words], ensure_ascii=False)
+    return {"block_id": block_id, "type": TIMINGS_ASSET, "data_b64": base64.b64encode(data.encode("utf-8")).decode("ascii")}
@@ -0,0 +1,198 @@
+# workspaces.py — Pastas de trabalho isoladas por sessão (e por job dentro da sessão)
+# Substitui os nomes fixos no diretório corrente (temp.srt, temp_{vid}.mp4, legendado_{id}.mp4...)
+# e os tempfile.mkdtemp() que nunca eram apagados. Cotas de disco por sessão e global com despejo
+# LRU (arquivo menos acessado primeiro) e limpeza das sessões encerradas ou sem heartbeat.
+import os
+import time
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Iterable, List, Optional, Set, Tuple
+
+WORKSPACE_ROOT = os.getenv("MONETIZA_WORKSPACE", "workspaces")
+SESSION_QUOTA_MB = float(os.getenv("WORKSPACE_SESSION_QUOTA_MB", "4096"))
+GLOBAL_QUOTA_MB = float(os.getenv("WORKSPACE_GLOBAL_QUOTA_MB", "20480"))
+SESSION_TTL_S = float(os.getenv("WORKSPACE_SESSION_TTL_S", str(6 * 3600)))  # Sem heartbeat há mais que isso: apagada
+INACTIVE_GRACE_S = 15 * 60  # Sessão fechada no navegador: espera uma reconexão antes de apagar
+SWEEP_INTERVAL_S = 120
+HEARTBEAT_FILE = ".heartbeat"
+HEADLESS_FILE = ".headless"  # Sessão fora do Streamlit (lote/CLI): só expira pelo TTL do heartbeat
+HEARTBEAT_INTERVAL_S = 60
+RENDER_MB_PER_MIN = float(os.getenv("WORKSPACE_RENDER_MB_PER_MIN", "90"))  # Clipes + concat + final (~3x um H.264 720p)
+
+_sweep_lock = threading.Lock()
+_last_sweep = 0.0
+
+
+class WorkspaceQuotaError(RuntimeError):
+    pass
+
+
+def _sessions_root() -> str:
+    return os.path.join(WORKSPACE_ROOT, "sessions")
+
+
+def session_dir(session_id: str, headless: bool = False) -> str:
+    """Pasta da sessão (criada sob demanda) com heartbeat atualizado. `headless`: não é uma sessão do Streamlit."""
+    path = os.path.abspath(os.path.join(_sessions_root(), session_id))
+    os.makedirs(path, exist_ok=True)
+    if headless:
+        with open(os.path.join(path, HEADLESS_FILE), "a"): pass
+    hb = os.path.join(path, HEARTBEAT_FILE)
+    with open(hb, "a"): pass
+    os.utime(hb, None)
+    return path
+
+
+@contextmanager
+def keep_alive(session_id: str, interval: float = HEARTBEAT_INTERVAL_S):
+    """Atualiza o heartbeat numa thread enquanto o bloco roda (encode/transcrição longos não viram sessão ociosa)."""
+    stop = threading.Event()
+
+    def _beat():
+        while not stop.wait(interval): session_dir(session_id)
+
+    t = threading.Thread(target=_beat, name=f"heartbeat-{session_id}", daemon=True)
+    t.start()
+    try: yield session_dir(session_id)
+    finally: stop.set()
+
+
+def job_dir(session_id: str, name: str) -> str:
+    """Subpasta estável para um job/vídeo dentro da sessão (ex.: 'job_JOB-123', 'video_<id>')."""
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)[:120] or "job"
+    path = os.path.join(session_dir(session_id), safe)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def scratch_dir(session_id: str, prefix: str = "render_") -> str:
+    """Equivalente ao tempfile.mkdtemp(), mas dentro da sessão (some com ela ou no despejo)."""
+    return tempfile.mkdtemp(prefix=prefix, dir=session_dir(session_id))
+
+
+def remove_dir(path: Optional[str]):
+    if path and os.path.isdir(path): shutil.rmtree(path, ignore_errors=True)
+
+
+# =========================
+# Uso de disco e despejo LRU
+# =========================
+def _files(root: str) -> List[Tuple[float, int, str]]:
+    """(último acesso, tamanho, caminho) de todos os arquivos sob `root` (exceto os marcadores da sessão)."""
+    out = []
+    for dirpath, _, names in os.walk(root):
+        for n in names:
+            if n in (HEARTBEAT_FILE, HEADLESS_FILE): continue
+            p = os.path.join(dirpath, n)
+            try: st_ = os.stat(p)
+            except OSError: continue
+            out.append((max(st_.st_atime, st_.st_mtime), st_.st_size, p))
+    return out
+
+
+def usage_mb(root: Optional[str] = None) -> float:
+    root = root or WORKSPACE_ROOT
+    return sum(size for _, size, _ in _files(root)) / 1024 ** 2 if os.path.isdir(root) else 0.0
+
+
+def _kept(path: str, keep: Set[str]) -> bool:
+    """`keep` aceita arquivos e pastas (protege tudo que está dentro)."""
+    path = os.path.abspath(path)
+    return any(path == k or path.startswith(k + os.sep) for k in keep)
+
+
+def _evict(files: List[Tuple[float, int, str]], excess_bytes: int, keep: Set[str]) -> int:
+    freed = 0
+    for _, size, path in sorted(files):
+        if freed >= excess_bytes: break
+        if _kept(path, keep): continue
+        try: os.remove(path); freed += size
+        except OSError: continue
+    return freed
+
+
+def _idle_s(path: str) -> float:
+    try: return time.time() - os.path.getmtime(os.path.join(path, HEARTBEAT_FILE))
+    except OSError:
+        try: return time.time() - os.path.getmtime(path)
+        except OSError: return 0.0
+
+
+def _in_use(session_path: str) -> bool:
+    """Sessão de outra pessoa que ainda pode estar usando os arquivos: nunca é despejada."""
+    return _is_active_session(os.path.basename(session_path)) is True or _idle_s(session_path) < INACTIVE_GRACE_S
+
+
+def reserve(session_id: str, needed_mb: float = 0.0, keep: Iterable[str] = ()) -> None:
+    """
+    Garante espaço para `needed_mb` dentro das cotas, despejando primeiro os arquivos menos usados da
+    própria sessão e, para a cota global, também os de sessões ociosas (as ativas não são tocadas).
+    `keep` protege arquivos ou pastas em uso. Lança WorkspaceQuotaError se nem assim couber.
+    """
+    keep_abs = {os.path.abspath(p) for p in keep if p}
+    own_dir = session_dir(session_id)
+    own = _files(own_dir)
+    excess = sum(s for _, s, _ in own) + needed_mb * 1024 ** 2 - SESSION_QUOTA_MB * 1024 ** 2
+    if excess > 0 and _evict(own, int(excess), keep_abs) < excess:
+        raise WorkspaceQuotaError(f"Cota da sessão ({SESSION_QUOTA_MB:.0f} MB) esgotada.")
+    everything = _files(WORKSPACE_ROOT)
+    excess = sum(s for _, s, _ in everything) + needed_mb * 1024 ** 2 - GLOBAL_QUOTA_MB * 1024 ** 2
+    if excess <= 0: return
+    root = _sessions_root()
+    evictable = _files(own_dir)
+    if os.path.isdir(root):
+        for entry in os.scandir(root):
+            if entry.is_dir() and entry.path != own_dir and not _in_use(entry.path): evictable.extend(_files(entry.path))
+    if _evict(evictable, int(excess), keep_abs) < excess:
+        raise WorkspaceQuotaError(f"Disco de trabalho ({GLOBAL_QUOTA_MB:.0f} MB) esgotado.")
+
+
+def estimate_render_mb(duration_s: float, input_bytes: int = 0) -> float:
+    """Espaço a reservar antes de um render: entradas gravadas + clipes, concat e vídeo final."""
+    return input_bytes / 1024 ** 2 + max(0.0, duration_s) / 60 * RENDER_MB_PER_MIN
+
+
+# =========================
+# Limpeza de sessões encerradas
+# =========================
+def _is_active_session(session_id: str) -> Optional[bool]:
+    try:
+        from streamlit.runtime import Runtime
+        return Runtime.instance().is_active_session(session_id)
+    except Exception: return None  # Fora do Streamlit (CLI/lote): decide só pelo heartbeat
+
+
+def sweep(force: bool = False) -> int:
+    """Apaga sessões encerradas (após a carência) ou sem heartbeat há SESSION_TTL_S. No máximo a cada SWEEP_INTERVAL_S."""
+    global _last_sweep
+    with _sweep_lock:
+        if not force and time.time() - _last_sweep < SWEEP_INTERVAL_S: return 0
+        _last_sweep = time.time()
+    root = _sessions_root()
+    if not os.path.isdir(root): return 0
+    removed = 0
+    for entry in os.scandir(root):
+        if not entry.is_dir(): continue
+        idle = _idle_s(entry.path)
+        # Pastas do lote/CLI não são sessões do Streamlit (is_active_session seria sempre False): só o TTL vale
+        headless = os.path.exists(os.path.join(entry.path, HEADLESS_FILE))
+        active = None if headless else _is_active_session(entry.name)
+        if idle > SESSION_TTL_S or (active is False and idle > INACTIVE_GRACE_S):
+            shutil.rmtree(entry.path, ignore_errors=True); removed += 1
+    return removed
+
+
+def current_session_workspace() -> Tuple[str, str]:
+    """(id da sessão Streamlit, pasta da sessão). Também dispara a limpeza periódica."""
+    import streamlit as st
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        sid = get_script_run_ctx().session_id
+    except Exception:
+        import uuid
+        sid = st.session_state.setdefault("_workspace_session_id", uuid.uuid4().hex)
+    path = session_dir(sid)  # Heartbeat antes da limpeza: a sessão atual nunca é varrida
+    sweep()
+    return sid, path